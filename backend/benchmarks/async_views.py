@@ -0,0 +1,136 @@
+"""
+Concurrent throughput of the recipe read endpoints: WSGI vs ASGI.
+
+    cd backend && python benchmarks/async_views.py --requests 2000 --concurrency 50
+
+Runs in process (Django's test clients, no network) against the configured
+database (`DJANGO_SETTINGS_MODULE`, default `config.settings`), with a throwaway
+user & a few recipes that are deleted afterwards. Scenarios:
+
+- wsgi/drf:   the DRF viewsets, `concurrency` threads (a threaded WSGI server);
+- asgi/drf:   the DRF viewsets under ASGI (each request runs in a thread);
+- asgi/async: `recipe/async_views.py` on the event loop.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import close_old_connections  # noqa: E402
+from django.test import AsyncClient, Client, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from core.models import Ingredient, Recipe, Tag  # noqa: E402
+
+ENDPOINTS = {
+    'drf': ['recipe:recipe-list', 'recipe:tag-list', 'recipe:ingredient-list'],
+    'async': [
+        'recipe-async:recipe-list', 'recipe-async:tag-list', 'recipe-async:ingredient-list'
+    ],
+}
+
+
+def create_fixtures(recipes):
+    user = get_user_model().objects.create_user(
+        email=f'bench-{uuid.uuid4().hex[:8]}@example.com', password=uuid.uuid4().hex
+    )
+    tags = [Tag.objects.create(user=user, name=f'Tag {i}') for i in range(5)]
+    ingredients = [
+        Ingredient.objects.create(user=user, name=f'Ingredient {i}') for i in range(5)
+    ]
+    for i in range(recipes):
+        recipe = Recipe.objects.create(
+            user=user, title=f'Recipe {i}', time_minutes=10, cost=Decimal('5.00')
+        )
+        recipe.tags.set(tags[:i % 5 + 1])
+        recipe.ingredients.set(ingredients[:i % 5 + 1])
+    return user, Token.objects.create(user=user).key
+
+
+def get_urls(kind, count):
+    urls = [reverse(name) for name in ENDPOINTS[kind]]
+    return [urls[i % len(urls)] for i in range(count)]
+
+
+def run_wsgi(urls, headers, concurrency):
+    def fetch(url):
+        client = Client()
+        started = time.perf_counter()
+        res = client.get(url, headers=headers)
+        assert res.status_code == 200, res.status_code
+        close_old_connections()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(fetch, urls))
+
+
+def run_asgi(urls, headers, concurrency):
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                started = time.perf_counter()
+                res = await client.get(url, headers=headers)
+                assert res.status_code == 200, res.status_code
+                return time.perf_counter() - started
+
+        return await asyncio.gather(*(fetch(url) for url in urls))
+
+    return asyncio.run(main())
+
+
+def report(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f'{name:<12} {len(latencies) / elapsed:8.1f} req/s   '
+        f'median {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--recipes', type=int, default=20, help='Recipes of the user.')
+    args = parser.parse_args()
+
+    user, key = create_fixtures(args.recipes)
+    headers = {'Authorization': f'Token {key}'}
+    scenarios = [
+        ('wsgi/drf', run_wsgi, 'drf'),
+        ('asgi/drf', run_asgi, 'drf'),
+        ('asgi/async', run_asgi, 'async'),
+    ]
+    try:
+        for name, run, kind in scenarios:
+            urls = get_urls(kind, args.requests)
+            run(urls[:len(ENDPOINTS[kind])], headers, 1)  # warm up
+            started = time.perf_counter()
+            latencies = run(urls, headers, args.concurrency)
+            report(name, latencies, time.perf_counter() - started)
+    finally:
+        user.delete()
+
+
+if __name__ == '__main__':
+    with override_settings(ALLOWED_HOSTS=['testserver']):  # the test clients' host
+        main()
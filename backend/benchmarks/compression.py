@@ -0,0 +1,54 @@
+"""
+Compression ratio & CPU time of the response encodings, per level.
+
+    cd backend && python benchmarks/compression.py --recipes 1000
+
+Compresses a recipe list (as `ORJSONRenderer` renders it) with each encoding of
+`core.compression`, to pick `COMPRESSION_LEVELS`. No database needed.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from core import compression  # noqa: E402
+from core.renderers import ORJSONRenderer  # noqa: E402
+
+from renderers import make_recipes  # noqa: E402
+
+LEVELS = {'gzip': [1, 4, 6, 9], 'br': [1, 4, 6, 9, 11], 'zstd': [1, 3, 6, 12, 19]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=5)
+    args = parser.parse_args()
+
+    body = ORJSONRenderer().render(make_recipes(args.recipes))
+    print(f'{args.recipes} recipes: {len(body):,} bytes')
+    print(f"{'':<10}{'level':>6}{'time':>11}{'MB/s':>9}{'size':>12}{'ratio':>8}")
+    for encoding in compression.COMPRESSORS:
+        for level in LEVELS[encoding]:
+            def run():
+                return compression.COMPRESSORS[encoding](level).finish(body)
+
+            size = len(run())
+            seconds = min(timeit.repeat(run, repeat=args.repeat, number=args.number))
+            seconds /= args.number
+            print(
+                f'{encoding:<10}{level:>6}{seconds * 1000:>9.2f}ms'
+                f'{len(body) / seconds / 2**20:>9.0f}{size:>12,}{size / len(body):>8.3f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-request cost of the middleware, for an API request: full vs lean stack.
+
+    cd backend && python benchmarks/middleware.py --requests 5000
+
+Runs in process (Django's test client, no network, no database) against a
+trivial DRF view mounted under /api/, with & without the `BROWSER_MIDDLEWARE`
+(sessions, CSRF, auth, messages, clickjacking). The request carries session &
+CSRF cookies, like a browser that also visited the admin would send.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from rest_framework.decorators import (  # noqa: E402
+    api_view, authentication_classes, permission_classes,
+)
+from rest_framework.response import Response  # noqa: E402
+
+COOKIES = {'sessionid': 'x' * 32, 'csrftoken': 'y' * 32}
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([])
+def ping(request):
+    return Response({'ok': True})
+
+
+urlpatterns = [path('api/ping/', ping)]
+
+
+def measure(prefixes, args):
+    with override_settings(LEAN_MIDDLEWARE_PREFIXES=prefixes, ROOT_URLCONF=__name__):
+        client = Client()  # loads the middleware on its first request
+        client.cookies.load(COOKIES)
+        res = client.get('/api/ping/')
+        assert res.status_code == 200, res.status_code
+        timings = timeit.repeat(
+            lambda: client.get('/api/ping/'), repeat=args.repeat, number=args.requests
+        )
+    return min(timings) / args.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    full = measure([], args)
+    lean = measure(['/api/'], args)
+    print(f'full stack {full * 1e6:8.1f} µs/request')
+    print(f'lean stack {lean * 1e6:8.1f} µs/request')
+    print(f'saved      {(full - lean) * 1e6:8.1f} µs/request ({1 - lean / full:.0%})')
+
+
+if __name__ == '__main__':
+    with override_settings(ALLOWED_HOSTS=['testserver']):  # the test client's host
+        main()
@@ -0,0 +1,85 @@
+"""
+Render time & payload size of the API renderers, on a recipe list.
+
+    cd backend && python benchmarks/renderers.py --recipes 1000
+
+Compares DRF's `JSONRenderer` (stdlib json) with `core.renderers`' orjson &
+MessagePack renderers (& the matching parsers) on data shaped like the
+`RecipeSerializer` output. No database needed.
+"""
+import argparse
+import gzip
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from core.parsers import MessagePackParser, ORJSONParser  # noqa: E402
+from core.renderers import MessagePackRenderer, ORJSONRenderer  # noqa: E402
+
+CANDIDATES = [
+    ('json (stdlib)', JSONRenderer(), JSONParser()),
+    ('orjson', ORJSONRenderer(), ORJSONParser()),
+    ('msgpack', MessagePackRenderer(), MessagePackParser()),
+]
+
+
+def make_recipes(count):
+    """Like `RecipeSerializer(many=True).data`."""
+    return [
+        {
+            'id': i,
+            'title': f'Recipe number {i} with a longish title',
+            'time_minutes': 5 + i % 90,
+            'cost': f'{i % 50}.{i % 100:02d}',
+            'link': f'https://example.com/recipes/{i}/',
+            'tags': [{'id': t, 'name': f'Tag {t}'} for t in range(i % 4)],
+            'ingredients': [{'id': n, 'name': f'Ingredient {n}'} for n in range(i % 8)],
+            'image_width': 1600,
+            'image_height': 1200,
+            'image_color': '#a0b1c2',
+            'image_placeholder': 'data:image/webp;base64,UklGRiQAAABXRUJQVlA4IBgAAAAw',
+            'image_taken_at': '2024-05-01T12:30:15.123Z',
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(func, repeat, number):
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_recipes(args.recipes)
+    print(f'{args.recipes} recipes')
+    print(f"{'':<15}{'render':>10}{'parse':>10}{'size':>12}{'gzipped':>12}")
+    for name, renderer, parser_ in CANDIDATES:
+        body = renderer.render(data)
+        render_time = best_of(lambda: renderer.render(data), args.repeat, args.number)
+        parse_time = best_of(
+            lambda: parser_.parse(io.BytesIO(body)), args.repeat, args.number
+        )
+        print(
+            f'{name:<15}{render_time * 1000:>8.2f}ms{parse_time * 1000:>8.2f}ms'
+            f'{len(body):>12,}{len(gzip.compress(body)):>12,}'
+        )
+
+
+if __name__ == '__main__':
+    main()
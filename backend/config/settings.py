@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -56,13 +56,26 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.BrowserMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+    'core.middleware.HashingBusyMiddleware',
+]
+
+# Run by core.middleware.BrowserMiddleware (where they'd be in MIDDLEWARE), except for
+# the token authenticated APIs: no sessions, CSRF, ... needed there.
+BROWSER_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+LEAN_MIDDLEWARE_PREFIXES = ['/api/']
+
+# The admin looks for its middleware in MIDDLEWARE only; they're in BROWSER_MIDDLEWARE.
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
 
 ROOT_URLCONF = 'config.urls'
 
@@ -99,6 +112,81 @@ DATABASES = {
     }
 }
 
+# Read replicas (core/db_router.py): DB_REPLICA_HOSTS=host1,host2 adds the `replica_0`,
+# `replica_1` aliases, same credentials as the primary. Tests use the primary for them.
+DATABASE_REPLICAS = []
+for index, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv())):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+# A second connection to the primary, for the tests to route reads to
+# (core/tests/test_db_router.py). Unused unless listed in DATABASE_REPLICAS.
+DATABASES['replica_test'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# With replicas, the cache must be shared by the server processes (the primary pins are
+# kept there): e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache &
+# CACHE_LOCATION=redis://cache:6379, or ...db.DatabaseCache & a table name.
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+# After a write, the user's reads go to the primary for this many seconds.
+DB_READ_YOUR_WRITES_WINDOW = config('DB_READ_YOUR_WRITES_WINDOW', default=5, cast=int)
+DB_REPLICA_HEALTH_INTERVAL = 10  # seconds
+DB_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=int)  # seconds
+
+# `manage.py serve` (gunicorn). 0 workers: 2 * CPUs + 1 (at most SERVER_MAX_WORKERS).
+SERVER_WORKERS = config('SERVER_WORKERS', default=0, cast=int)
+SERVER_MAX_WORKERS = config('SERVER_MAX_WORKERS', default=12, cast=int)
+SERVER_THREADS = config('SERVER_THREADS', default=4, cast=int)
+SERVER_TIMEOUT = 30  # seconds
+# Workers are recycled (one at a time) after this many requests: bounds leaks.
+SERVER_MAX_REQUESTS = 5000
+# Dotted paths of callables run in the master, before the workers are forked.
+SERVER_WARM_UP_HOOKS = ['core.schema.build']
+
+# The OpenAPI schema (/api/schema/) is generated once per code version & kept here.
+# CODE_VERSION (e.g. the git commit, set at build time); default: a hash of the sources.
+CODE_VERSION = config('CODE_VERSION', default='')
+SCHEMA_CACHE_ROOT = '/vol/web/schema'
+
+# Response compression (core.middleware.CompressionMiddleware), preferred first.
+# brotli & zstd need the `brotli` & `zstandard` packages; /api/metrics/ has the ratios
+# & CPU time per encoding, to tune the levels.
+COMPRESSION_ENCODINGS = config('COMPRESSION_ENCODINGS', default='br,zstd,gzip', cast=Csv())
+COMPRESSION_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent as is
+
+# /readyz: checks still running after this many seconds count as failed.
+HEALTH_CHECK_TIMEOUT = 2.0
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+
+# PBKDF2 (the default algorithm) computed in a process pool: login bursts don't block the
+# request threads (see core/hashers.py). Django's own PBKDF2 hasher must not be listed too:
+# both use the `pbkdf2_sha256` algorithm name.
+PASSWORD_HASHERS = [
+    'core.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# Processes hashing passwords, per server process; 0: hash on the request thread.
+PASSWORD_HASHER_WORKERS = config('PASSWORD_HASHER_WORKERS', default=2, cast=int)
+# Beyond this many hashes in flight, requests wait up to PASSWORD_HASHER_QUEUE_TIMEOUT
+# seconds, then get a 503.
+PASSWORD_HASHER_MAX_PENDING = config('PASSWORD_HASHER_MAX_PENDING', default=16, cast=int)
+PASSWORD_HASHER_QUEUE_TIMEOUT = 2.0
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -136,10 +224,48 @@ USE_TZ = True
 
 STATIC_URL = '/static/static/'
 STATIC_ROOT = '/vol/web/static'
+# `collectstatic` writes hashed names + .gz & .br variants (see core/staticfiles.py).
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Processes compressing the static files during `collectstatic`; 0: one per CPU.
+STATIC_COMPRESSION_WORKERS = config('STATIC_COMPRESSION_WORKERS', default=0, cast=int)
 
 MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 
+# How `core.media.serve_media` hands files over:
+# 'python' (FileResponse / wsgi.file_wrapper), 'x-accel-redirect' (nginx) or 'x-sendfile'.
+MEDIA_SERVE_BACKEND = config('MEDIA_SERVE_BACKEND', default='python')
+# nginx `internal` location aliased to MEDIA_ROOT (x-accel-redirect only).
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+MEDIA_SERVE_BLOCK_SIZE = 64 * 1024
+# Uploaded files get a uuid name & are never modified => cache them "forever".
+MEDIA_IMMUTABLE_PREFIXES = ['uploads/']
+
+# Resumable (chunked) uploads: partial files are kept on local disk until finalized.
+# Keep it on the same filesystem as MEDIA_ROOT, so finalizing is a mere rename.
+UPLOAD_SESSION_ROOT = '/vol/web/partial'
+UPLOAD_SESSION_MAX_SIZE = 50 * 2**20
+# Older sessions are rejected & removed by `manage.py expire_upload_sessions`.
+UPLOAD_SESSION_MAX_AGE = 24 * 3600  # seconds
+
+# Batch image uploads (/recipes/upload-images/): at most this many images are processed
+# at once, per server process.
+IMAGE_BATCH_WORKERS = config('IMAGE_BATCH_WORKERS', default=4, cast=int)
+
+# On-demand renditions (/recipes/{id}/image/?width=...): only these widths are rendered,
+# & the cached files are evicted (least recently used first) beyond IMAGE_CACHE_MAX_BYTES.
+IMAGE_RENDITION_WIDTHS = [160, 320, 640, 1024, 1600]
+IMAGE_CACHE_ROOT = '/vol/web/media/cache/renditions'
+IMAGE_CACHE_MAX_BYTES = config('IMAGE_CACHE_MAX_BYTES', default=2 * 2**30, cast=int)
+
+# Re-encoding stored images (`optimize_images` command; & right after uploads, as a
+# background job, if enabled): keep the result only if it's at least this much smaller.
+IMAGE_OPTIMIZE_ON_UPLOAD = config('IMAGE_OPTIMIZE_ON_UPLOAD', default=False, cast=bool)
+IMAGE_OPTIMIZE_MIN_SAVING = 0.05
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -150,8 +276,40 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # ------------------------------------------------------------------------------- #
 AUTH_USER_MODEL = 'core.User'
 
+# Background jobs: `core.jobs` & `manage.py run_worker`.
+JOB_WORKER_CONCURRENCY = config('JOB_WORKER_CONCURRENCY', default=4, cast=int)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 5  # seconds; doubled after every failed attempt (+ jitter)
+JOB_RETRY_BACKOFF_MAX = 3600
+# Jobs `running` for longer than this are assumed lost (e.g. the worker was killed).
+JOB_TIMEOUT = 3600
+
+# `core.authentication.CachedTokenAuthentication`: token => user lookups cached per process.
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=30, cast=int)  # seconds
+
+# Signed access/refresh tokens (core/tokens.py); lifetimes in seconds.
+SIGNED_TOKEN_ACCESS_LIFETIME = 5 * 60
+SIGNED_TOKEN_REFRESH_LIFETIME = 14 * 24 * 3600
+# How often every process reloads the revoked tokens.
+SIGNED_TOKEN_REVOCATION_REFRESH = 30
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson & MessagePack (core/renderers.py, core/parsers.py), picked by the `Accept`
+    # & `Content-Type` headers; JSON when nothing specific is asked for.
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'EXCEPTION_HANDLER': 'core.views.exception_handler',
 }
 
 # To make image upload work smoothly via the browser interface:
@@ -14,21 +14,43 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 
-from django.conf.urls.static import static
 from django.conf import settings
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+
+from core.media import serve_media
+from core.staticfiles import serve_static
+from core.views import api_schema, healthz, metrics, readyz
 
 urlpatterns = [
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/async/recipe/', include('recipe.async_urls')),
+    path('api/metrics/', metrics, name='metrics'),
+    path('api/schema/', api_schema, name='api-schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docs')
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Unlike `django.conf.urls.static`, this is meant for production as well:
+# it supports Range requests & delegates the transfer to the proxy (see core/media.py).
+# Static files are served precompressed (see core/staticfiles.py).
+urlpatterns += [
+    re_path(
+        r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+        serve_media,
+        name='media'
+    ),
+    re_path(
+        r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+        serve_static,
+        name='static'
+    ),
+]
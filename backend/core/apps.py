@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import authentication  # noqa: F401 (registers the cache invalidation)
+        from core import snapshots  # noqa: F401 (registers the snapshot maintenance)
@@ -0,0 +1,232 @@
+"""
+Authentication classes.
+
+`CachedTokenAuthentication`: DB tokens, with the token => user lookups cached
+in process. DRF's `TokenAuthentication` runs a Token + User query on every request; here
+the result is kept in a bounded LRU, for `AUTH_TOKEN_CACHE_TTL` seconds.
+
+Entries are invalidated when a token is deleted & whenever its user is saved
+(deactivation, password change, ...). The cache lives in each server process:
+other processes only see such changes once their entries expire, hence the
+short TTL.
+
+`SignedTokenAuthentication`: stateless signed access tokens (see `core.tokens`),
+verified without any DB query.
+
+`aauthenticate`: both schemes, for async (non DRF) views.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from core import tokens
+
+
+class TokenCache:
+    """Thread-safe LRU of token key => (user, token), with a TTL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key => (user, token, expires at)
+        self.keys_by_user = {}  # user id => {key, ...}
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        user, token = entry[:2]
+        # Every request gets its own copy: views may modify `request.user`.
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            expires_at = time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL
+            self.entries[key] = (user, token, expires_at)
+            self.keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._remove(next(iter(self.entries)))  # least recently used
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key in list(self.keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': settings.AUTH_TOKEN_CACHE_SIZE,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        user = self.entries.pop(key)[0]
+        keys = self.keys_by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_user[user.pk]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """`TokenAuthentication`, with the token lookups cached (see `token_cache`)."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Raises `AuthenticationFailed` for unknown tokens & inactive users:
+        # neither is ever cached.
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    `Authorization: Bearer <access token>` (see `core.tokens`).
+
+    The signature, expiry & revocation are checked in memory; `request.user`
+    is built from the token's claims (other fields are deferred: they're only
+    loaded from the DB if a view reads them).
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        try:
+            claims = tokens.verify_token(auth[1].decode(), tokens.ACCESS)
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return self.get_user(claims), claims
+
+    def get_user(self, claims):
+        User = get_user_model()
+        values = {
+            'id': claims['uid'], 'email': claims['email'], 'is_active': True,
+            'is_staff': claims['staff'], 'is_superuser': claims['su'],
+        }
+        # `from_db` wants the values in the order of the model's fields.
+        names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+        return User.from_db('default', names, [values[name] for name in names])
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+async def aauthenticate(request):
+    """
+    Authenticate an async view's request, without blocking the event loop.
+
+    Accepts the same credentials as `CachedTokenAuthentication` (`Token <key>`,
+    sharing its cache) & `SignedTokenAuthentication` (`Bearer <token>`).
+    Returns the user, `None` without credentials; raises `AuthenticationFailed`.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() not in (b'token', b'bearer'):
+        return None
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+    if auth[0].lower() == b'bearer':
+        if tokens.revocations.is_stale():
+            await tokens.revocations.areload()
+        try:
+            claims = tokens.verify_token(key, tokens.ACCESS)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return SignedTokenAuthentication().get_user(claims)
+
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    token_cache.set(key, token.user, token)
+    return token.user
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    token_cache.delete_user(instance.pk)
+    if getattr(instance, '_revoke_signed_tokens', False) or kwargs['signal'] is post_delete:
+        tokens.revoke_user_tokens(instance.pk)
+        instance._revoke_signed_tokens = False
+
+
+@receiver(pre_save, sender=get_user_model())
+def check_credentials_change(sender, instance, **kwargs):
+    """
+    Signed tokens must be revoked on deactivation, password & permission
+    changes (their claims hold `is_staff` & `is_superuser`).
+    """
+    if instance.pk is None:
+        return
+    fields = ['password', 'is_active', 'is_staff', 'is_superuser']
+    old = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._revoke_signed_tokens = bool(old) and any(
+        old[field] != getattr(instance, field) for field in fields
+    )
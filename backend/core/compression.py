@@ -0,0 +1,214 @@
+"""
+Response compression codecs & their metrics (see `CompressionMiddleware`).
+
+gzip always works; brotli & zstd are offered when their packages (`brotli`,
+`zstandard`) are installed. Each codec compresses a body at once or chunk by
+chunk: after every chunk the compressor is flushed, so what a streaming
+response produced so far reaches the client without waiting for the rest.
+"""
+import re
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits=31: gzip header & trailer.
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data=b''):
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return (
+            self.compressor.compress(data)
+            + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        )
+
+    def finish(self, data=b''):
+        return (
+            self.compressor.compress(data)
+            + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        )
+
+
+# Preferred first, when the client accepts several with the same q-value.
+COMPRESSORS = {
+    name: compressor for name, compressor, available in [
+        ('br', BrotliCompressor, brotli is not None),
+        ('zstd', ZstdCompressor, zstandard is not None),
+        ('gzip', GzipCompressor, True),
+    ]
+    if available
+}
+
+re_accept_encoding = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def get_encodings():
+    """The enabled encodings, preferred first."""
+    return [name for name in settings.COMPRESSION_ENCODINGS if name in COMPRESSORS]
+
+
+def parse_accept_encoding(accept_encoding):
+    """`{encoding: q-value}` of an `Accept-Encoding` header."""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        match = re_accept_encoding.match(item)
+        if match is None:
+            continue
+        try:
+            q = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+        accepted[match[1].lower()] = q
+    return accepted
+
+
+def negotiate(accept_encoding, encodings=None):
+    """
+    The encoding to use for an `Accept-Encoding` header (None: don't compress).
+
+    Picked from `encodings` (preferred first; default: the enabled ones).
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    if encodings is None:
+        encodings = get_encodings()
+    default = accepted.get('*', 0.0)
+    # Highest q-value first; ties: in our order of preference.
+    best = max(
+        encodings,
+        key=lambda name: (accepted.get(name, default), -encodings.index(name)),
+        default=None,
+    )
+    if best is None or accepted.get(best, default) <= 0:
+        return None
+    return best
+
+
+def get_compressor(encoding):
+    return COMPRESSORS[encoding](settings.COMPRESSION_LEVELS[encoding])
+
+
+class CompressionStats:
+    """Thread-safe counters of the responses compressed by this server process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.encodings = {}
+            self.too_small = 0  # under COMPRESSION_MIN_SIZE: sent as is
+
+    def record(self, encoding, bytes_in, bytes_out, cpu_time):
+        with self.lock:
+            stats = self.encodings.setdefault(encoding, {
+                'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_time': 0.0,
+            })
+            stats['responses'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['cpu_time'] += cpu_time
+
+    def record_too_small(self):
+        with self.lock:
+            self.too_small += 1
+
+    def snapshot(self):
+        with self.lock:
+            encodings = {}
+            for name, stats in self.encodings.items():
+                bytes_in, cpu_time = stats['bytes_in'], stats['cpu_time']
+                encodings[name] = {
+                    **stats,
+                    'level': settings.COMPRESSION_LEVELS[name],
+                    'ratio': stats['bytes_out'] / bytes_in if bytes_in else 0.0,
+                    # MB compressed per CPU second.
+                    'throughput': bytes_in / cpu_time / 2**20 if cpu_time else 0.0,
+                }
+            return {'encodings': encodings, 'too_small': self.too_small}
+
+
+stats = CompressionStats()
+
+
+def compress(encoding, content):
+    """Compress a whole body (returns the compressed body)."""
+    started = time.thread_time()
+    compressed = get_compressor(encoding).finish(content)
+    stats.record(encoding, len(content), len(compressed), time.thread_time() - started)
+    return compressed
+
+
+class StreamCompressor:
+    """Compresses the chunks of a streaming body, one at a time."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.compressor = get_compressor(encoding)
+        self.bytes_in = self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def compress(self, chunk):
+        started = time.thread_time()
+        compressed = self.compressor.compress(chunk)
+        self.cpu_time += time.thread_time() - started
+        self.bytes_in += len(chunk)
+        self.bytes_out += len(compressed)
+        return compressed
+
+    def finish(self):
+        started = time.thread_time()
+        compressed = self.compressor.finish()
+        self.cpu_time += time.thread_time() - started
+        self.bytes_out += len(compressed)
+        stats.record(self.encoding, self.bytes_in, self.bytes_out, self.cpu_time)
+        return compressed
+
+    def compress_sequence(self, chunks):
+        for chunk in chunks:
+            data = self.compress(chunk)
+            if data:
+                yield data
+        yield self.finish()
+
+    async def acompress_sequence(self, chunks):
+        async for chunk in chunks:
+            data = self.compress(chunk)
+            if data:
+                yield data
+        yield self.finish()
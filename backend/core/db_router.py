@@ -0,0 +1,185 @@
+"""
+Read replica routing, with read-your-writes consistency.
+
+Replicas are the `DATABASE_REPLICAS` aliases (see settings). `ReplicaRouter`
+sends an ORM read to a replica only when all of these hold:
+
+- it runs during a request (`core.middleware.ReplicaRoutingMiddleware`) with a
+  safe method (GET, HEAD, OPTIONS);
+- the request's user is already resolved & authenticated; lookups made while
+  authenticating (tokens, sessions) always hit the primary, so a freshly
+  created token works right away;
+- the request hasn't written anything itself & the user didn't write during
+  the last `DB_READ_YOUR_WRITES_WINDOW` seconds (pinned in the default cache:
+  it must be shared by the server processes, see `check_pin_cache()`);
+- a replica is healthy. Replicas are checked at most every
+  `DB_REPLICA_HEALTH_INTERVAL` seconds (per process), & skipped when they're
+  unreachable or lag more than `DB_REPLICA_MAX_LAG` seconds. Healthy ones are
+  used round-robin; with none left, reads go to the primary.
+
+Everything else (writes, commands, workers) uses the primary.
+"""
+import contextvars
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request_state = contextvars.ContextVar('db_request_state', default=None)
+
+
+class RequestState:
+    """What the router needs to know about the current request."""
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self.pinned = None  # looked up (once) on the first read
+
+
+def get_resolved_user(request):
+    """The request's user, without triggering its (lazy) lookup; None if not known yet."""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+def get_pin_key(user_id):
+    return f'db-router:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for the next `DB_READ_YOUR_WRITES_WINDOW` s."""
+    cache.set(get_pin_key(user_id), True, settings.DB_READ_YOUR_WRITES_WINDOW)
+
+
+async def apin_to_primary(user_id):
+    await cache.aset(get_pin_key(user_id), True, settings.DB_READ_YOUR_WRITES_WINDOW)
+
+
+def is_pinned(user_id):
+    return cache.get(get_pin_key(user_id), False)
+
+
+class ReplicaHealth:
+    """Per process health of the replicas, refreshed lazily."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = {}  # alias => (healthy, checked at)
+        self.counter = itertools.count()
+
+    def check(self, alias):
+        """Whether the replica `alias` answers & isn't lagging too far behind."""
+        try:
+            conn = connections[alias]
+            conn.ensure_connection()
+            if conn.vendor == 'postgresql':
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT CASE WHEN pg_is_in_recovery() THEN '
+                        'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                    )
+                    lag = cursor.fetchone()[0]
+                if lag is not None and lag > settings.DB_REPLICA_MAX_LAG:
+                    return False
+            return True
+        except Exception:
+            return False
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        healthy, checked_at = self.status.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < settings.DB_REPLICA_HEALTH_INTERVAL:
+            return healthy
+        with self.lock:
+            # Another thread may have checked it while we were waiting.
+            healthy, checked_at = self.status.get(alias, (None, None))
+            if checked_at is None or now - checked_at >= settings.DB_REPLICA_HEALTH_INTERVAL:
+                healthy = self.check(alias)
+                self.status[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def choose(self, aliases):
+        """The next healthy replica (round-robin), None if there's none."""
+        healthy = [alias for alias in aliases if self.is_healthy(alias)]
+        if not healthy:
+            return None
+        return healthy[next(self.counter) % len(healthy)]
+
+    def reset(self):
+        with self.lock:
+            self.status.clear()
+
+
+health = ReplicaHealth()
+
+
+# Caches that aren't shared between processes: a pin set by one server worker
+# wouldn't be seen by the others.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_pin_cache():
+    backend = settings.CACHES[DEFAULT_DB_ALIAS]['BACKEND']
+    if settings.DATABASE_REPLICAS and backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f'DATABASE_REPLICAS need a default cache shared by the server processes '
+            f'(Redis, memcached, the database, ...) to pin users to the primary after '
+            f'a write; {backend} is per process. Set CACHE_BACKEND & CACHE_LOCATION.'
+        )
+
+
+class ReplicaRouter:
+    def __init__(self):
+        check_pin_cache()
+
+    def db_for_read(self, model, **hints):
+        # The database cache (pins included) must be read from the primary.
+        if model._meta.app_label == 'django_cache':
+            return None
+        state = _request_state.get()
+        if not settings.DATABASE_REPLICAS or state is None or state.wrote:
+            return None
+        if state.request.method not in SAFE_METHODS:
+            return None
+        user = get_resolved_user(state.request)
+        if user is None:
+            return None
+        if state.pinned is None:
+            state.pinned = is_pinned(user.pk)
+        if state.pinned:
+            return None
+        return health.choose(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True  # the rest of the request reads its own writes
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary: objects read from either are related alike.
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,145 @@
+"""
+PBKDF2 password hashing in a process pool.
+
+Hashing a password (sign up, login, password change) costs ~1M SHA256 rounds
+of pure CPU. Done on the request thread, a burst of logins blocks every other
+request of the server process; here it runs in a small, dedicated process pool
+instead, with a bound on the number of hashes waiting for it.
+"""
+import base64
+import hashlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.utils.encoding import force_bytes
+
+
+class HashingBusy(Exception):
+    """
+    No room in the pool's queue. A 503, for the APIs (`core.views.exception_handler`)
+    & the other views (`core.middleware.HashingBusyMiddleware`) alike.
+    """
+
+    def __init__(self, message='Too many sign-ins at the moment, try again shortly.'):
+        super().__init__(message)
+
+
+class HasherMetrics:
+    """Thread-safe counters of the hashes computed by this server process."""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.pending = 0  # submitted to the pool & not done yet
+        self.hashes = self.rejected = 0
+        self.queue_time = self.max_queue_time = self.hash_time = 0.0
+
+    def record(self, queue_time, hash_time):
+        with self.lock:
+            self.hashes += 1
+            self.queue_time += queue_time
+            self.max_queue_time = max(self.max_queue_time, queue_time)
+            self.hash_time += hash_time
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pending': self.pending,
+                'hashes': self.hashes,
+                'rejected': self.rejected,
+                'avg_queue_time': self.queue_time / self.hashes if self.hashes else 0.0,
+                'max_queue_time': self.max_queue_time,
+                'avg_hash_time': self.hash_time / self.hashes if self.hashes else 0.0,
+            }
+
+
+metrics = HasherMetrics()
+_pool_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_hasher_pool():
+    """
+    The process pool hashing passwords.
+
+    Created lazily, i.e. in every server process (after the server forked its
+    workers). Spawned, not forked: forking a process with threads isn't safe.
+    No `django.setup()` in there: the workers only call `hashlib`.
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.PASSWORD_HASHER_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def pbkdf2_sha256(password, salt, iterations, submitted_at):
+    """Run in the pool. Returns `(hash, queue time, hash time)`."""
+    started_at = time.time()
+    value = hashlib.pbkdf2_hmac('sha256', password, salt, iterations)
+    return value, started_at - submitted_at, time.time() - started_at
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    `PBKDF2PasswordHasher`, computed in `get_hasher_pool()`.
+
+    Same algorithm & encoding: existing hashes stay valid (nothing to rehash).
+    Waits at most `PASSWORD_HASHER_QUEUE_TIMEOUT` seconds for room in the
+    queue, then raises `HashingBusy` (=> 503).
+    """
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        args = (force_bytes(password), force_bytes(salt), iterations)
+
+        if settings.PASSWORD_HASHER_WORKERS:
+            value = self._hash_in_pool(*args)
+        else:  # pool disabled
+            value = pbkdf2_sha256(*args, time.time())[0]
+
+        value = base64.b64encode(value).decode('ascii').strip()
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, value)
+
+    def _hash_in_pool(self, password, salt, iterations):
+        submitted_at = time.time()  # queue time: waiting for room + waiting for a process
+        with metrics.lock:
+            has_room = metrics.lock.wait_for(
+                lambda: metrics.pending < settings.PASSWORD_HASHER_MAX_PENDING,
+                timeout=settings.PASSWORD_HASHER_QUEUE_TIMEOUT,
+            )
+            if not has_room:
+                metrics.rejected += 1
+                raise HashingBusy()
+            metrics.pending += 1
+
+        pool = get_hasher_pool()
+        try:
+            future = pool.submit(pbkdf2_sha256, password, salt, iterations, submitted_at)
+            value, queue_time, hash_time = future.result()
+        except BrokenProcessPool:
+            # A process died (e.g. OOM killed): the pool is unusable. The next
+            # hashes get a new one; this one is computed here.
+            self._replace_pool(pool)
+            value, queue_time, hash_time = pbkdf2_sha256(
+                password, salt, iterations, submitted_at
+            )
+        finally:
+            with metrics.lock:
+                metrics.pending -= 1
+                metrics.lock.notify()
+
+        metrics.record(queue_time, hash_time)
+        return value
+
+    def _replace_pool(self, broken):
+        with _pool_lock:
+            # Other threads may have replaced it already.
+            if get_hasher_pool() is broken:
+                get_hasher_pool.cache_clear()
+        broken.shutdown(wait=False)
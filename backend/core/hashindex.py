@@ -0,0 +1,110 @@
+"""
+Multi-index hashing (MIH) for near-duplicate image lookups.
+
+A 64-bit perceptual hash is split into 4 bands of 16 bits. If two hashes are
+within Hamming distance `k`, then (pigeonhole) at least one of their bands is
+within distance `k // 4`. So instead of comparing against every hash, we only
+look up the few band values close to the query's bands - using the per-band
+DB indexes on `Recipe` or the in-memory `MultiIndexHash` - and verify those
+candidates.
+"""
+from collections import defaultdict
+from itertools import combinations
+
+from django.db.models import Q
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# `Recipe` fields holding the bands (see `hash_fields`).
+BAND_FIELDS = [f'image_phash_{i}' for i in range(BANDS)]
+
+
+def to_signed(value):
+    """Unsigned 64-bit hash => value storable in a (signed) BigIntegerField."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def hamming_distance(a, b):
+    return (to_unsigned(a) ^ to_unsigned(b)).bit_count()
+
+
+def split_bands(value):
+    value = to_unsigned(value)
+    return [(value >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+
+def hash_fields(value):
+    """Return the `Recipe` fields for the (unsigned) hash `value`."""
+    if value is None:
+        return dict.fromkeys(['image_phash'] + BAND_FIELDS)
+    return {'image_phash': to_signed(value), **dict(zip(BAND_FIELDS, split_bands(value)))}
+
+
+def band_neighbours(band, radius):
+    """Return all band values within Hamming distance `radius` of `band`."""
+    values = [band]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            flipped = band
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.append(flipped)
+    return values
+
+
+def near_hash_q(value, max_distance):
+    """`Q` matching (a superset of) the rows with a hash within `max_distance`."""
+    radius = max_distance // BANDS
+    q = Q()
+    for field, band in zip(BAND_FIELDS, split_bands(value)):
+        q |= Q(**{f'{field}__in': band_neighbours(band, radius)})
+    return q
+
+
+class MultiIndexHash:
+    """In-memory multi-index over `key => 64-bit hash`."""
+
+    def __init__(self, items=()):
+        self.hashes = {}
+        self.tables = [defaultdict(list) for _ in range(BANDS)]
+        for key, value in items:
+            self.add(key, value)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, key, value):
+        value = to_unsigned(value)
+        self.hashes[key] = value
+        for table, band in zip(self.tables, split_bands(value)):
+            table[band].append(key)
+
+    def query(self, value, max_distance):
+        """Return `[(key, distance)]` of the hashes within `max_distance`, closest first."""
+        value = to_unsigned(value)
+        radius = max_distance // BANDS
+        candidates = set()
+        for table, band in zip(self.tables, split_bands(value)):
+            for neighbour in band_neighbours(band, radius):
+                candidates.update(table.get(neighbour, ()))
+
+        matches = []
+        for key in candidates:
+            distance = hamming_distance(value, self.hashes[key])
+            if distance <= max_distance:
+                matches.append((key, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def pairs(self, max_distance):
+        """Yield `(key_a, key_b, distance)` for every near-duplicate pair (once)."""
+        for key, value in self.hashes.items():
+            for other, distance in self.query(value, max_distance):
+                if other > key:
+                    yield key, other, distance
@@ -0,0 +1,80 @@
+"""
+Dependency checks, for `manage.py wait_for_db` & the /readyz endpoint.
+
+Each check raises if its dependency isn't usable. They're cheap: the database
+check runs `SELECT 1` (no table is touched), the media one writes & deletes a
+tiny file, the cache one sets & reads back a key.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def check_database(alias=DEFAULT_DB_ALIAS):
+    conn = connections[alias]
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        # Checks run in short-lived threads: don't leave their connections open.
+        conn.close()
+
+
+def check_media():
+    name = default_storage.save(f'.healthcheck/{uuid.uuid4().hex}', ContentFile(b'ok'))
+    default_storage.delete(name)
+
+
+def check_cache():
+    key, value = f'healthcheck:{uuid.uuid4().hex}', 'ok'
+    cache.set(key, value, 10)
+    if cache.get(key) != value:
+        raise RuntimeError('The cache did not return the value just set.')
+    cache.delete(key)
+
+
+CHECKS = {
+    'database': check_database,
+    'media': check_media,
+    'cache': check_cache,
+}
+
+
+def _run(check):
+    started = time.monotonic()
+    try:
+        check()
+        error = None
+    except Exception as exc:
+        error = f'{type(exc).__name__}: {exc}'.strip()
+    return error, time.monotonic() - started
+
+
+def run_checks(names=None, timeout=None):
+    """
+    Run the `names` checks (all by default) in parallel.
+
+    Returns `{name: {'ok': bool, 'error': str or None, 'duration': seconds}}`;
+    checks still running after `timeout` seconds count as failed.
+    """
+    names = list(CHECKS) if names is None else list(names)
+    executor = ThreadPoolExecutor(max_workers=len(names) or 1, thread_name_prefix='health')
+    futures = {name: executor.submit(_run, CHECKS[name]) for name in names}
+    wait(futures.values(), timeout=timeout)
+    # Don't wait for a hung check: its thread ends whenever it gives up.
+    executor.shutdown(wait=False)
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            error, duration = future.result()
+        else:
+            error, duration = f'Timed out after {timeout}s', timeout
+        results[name] = {'ok': error is None, 'error': error, 'duration': duration}
+    return results
@@ -0,0 +1,258 @@
+"""
+Image processing helpers.
+
+Everything here works on plain files / file-like objects & Pillow images
+(no ORM access), so it can also run in worker processes.
+"""
+import io
+import math
+import mimetypes
+from datetime import datetime, timedelta, timezone
+
+from PIL import Image, ImageOps
+
+from core.hashindex import BAND_FIELDS, hash_fields
+
+# EXIF tags: https://exiftool.org/TagNames/EXIF.html
+EXIF_IFD = 0x8769
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_OFFSET_TIME_ORIGINAL = 0x9011
+
+# Size of the thumbnail the colour & placeholder are computed from.
+# It's tiny on purpose: both are meant to be a blurry preview only.
+SAMPLE_SIZE = (32, 32)
+
+# What decoding a file that passed `Image.verify()` may still raise (truncated, corrupt,
+# a decompression bomb, ...).
+IMAGE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+# The `Recipe` fields `extract_image_metadata` returns.
+METADATA_FIELDS = [
+    'image_width', 'image_height', 'image_format', 'image_taken_at',
+    'image_color', 'image_placeholder', 'image_phash', *BAND_FIELDS,
+]
+
+# Formats stored under another format's extension (MPO: a JPEG + extra frames, from
+# cameras; browsers show it as a JPEG).
+EXTENSION_OVERRIDES = {'MPO': '.jpg'}
+
+BLURHASH_COMPONENTS = (4, 3)
+BASE83_CHARS = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+)
+
+
+def extract_image_metadata(file):
+    """
+    Read the metadata of an uploaded image, to be stored on `Recipe`.
+
+    Returns a dict of `Recipe` field names => values. The file position is
+    reset afterwards, so the same file can be saved to the storage. Raises
+    one of `IMAGE_ERRORS` if the image can't be decoded.
+    """
+    file.seek(0)
+    with Image.open(file) as img:
+        exif = img.getexif()
+        width, height = img.size
+        # Orientations 5-8 are rotated by 90 degrees: swap for layout purposes.
+        if exif.get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+
+        metadata = {
+            'image_width': width,
+            'image_height': height,
+            'image_format': img.format or '',
+            'image_taken_at': get_capture_time(exif),
+        }
+
+        # JPEG only: let the decoder downscale by up to 8x; much cheaper than a full decode.
+        img.draft('RGB', (SAMPLE_SIZE[0] * 2, SAMPLE_SIZE[1] * 2))
+        sample = ImageOps.exif_transpose(img).convert('RGB')
+        sample.thumbnail(SAMPLE_SIZE)
+
+    metadata['image_color'] = get_dominant_color(sample)
+    metadata['image_placeholder'] = encode_blurhash(sample)
+    metadata.update(hash_fields(compute_dhash(sample)))
+    file.seek(0)
+    return metadata
+
+
+def get_extension(image_format):
+    """The file extension for a Pillow format ('JPEG' => '.jpg'); '' if unknown."""
+    if image_format in EXTENSION_OVERRIDES:
+        return EXTENSION_OVERRIDES[image_format]
+    Image.init()
+    mime_type = Image.MIME.get(image_format)
+    extension = mimetypes.guess_extension(mime_type) if mime_type else None
+    if extension is None:
+        extensions = Image.registered_extensions()
+        extension = next((ext for ext, fmt in extensions.items() if fmt == image_format), '')
+    return extension
+
+
+def reprocess_image(path):
+    """Return the metadata of the image file at `path` (backfills, in worker processes)."""
+    with open(path, 'rb') as f:
+        return extract_image_metadata(f)
+
+
+def get_minimal_exif(exif):
+    """Keep only the EXIF tags we rely on: orientation & capture time (no GPS, ...)."""
+    minimal = Image.Exif()
+    for tag in (EXIF_ORIENTATION, EXIF_DATETIME):
+        if tag in exif:
+            minimal[tag] = exif[tag]
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    for tag in (EXIF_DATETIME_ORIGINAL, EXIF_OFFSET_TIME_ORIGINAL):
+        if tag in exif_ifd:
+            minimal.get_ifd(EXIF_IFD)[tag] = exif_ifd[tag]
+    return minimal
+
+
+def recompress_image(file):
+    """
+    Re-encode a JPEG or PNG image as compactly as possible, without visible loss.
+
+    - JPEG: same quantization tables & subsampling (`quality='keep'`), optimized
+      Huffman tables, progressive.
+    - PNG: pixels untouched, max. zlib compression.
+
+    Only the colour profile & a minimal EXIF are kept. Returns the new file's
+    content, or `None` if the format (or an animation) isn't supported.
+    """
+    file.seek(0)
+    with Image.open(file) as img:
+        if img.format not in ('JPEG', 'PNG') or getattr(img, 'is_animated', False):
+            return None
+
+        params = {'optimize': True, 'exif': get_minimal_exif(img.getexif())}
+        if img.info.get('icc_profile'):
+            params['icc_profile'] = img.info['icc_profile']
+        if img.format == 'JPEG':
+            params.update(quality='keep', subsampling='keep', progressive=True)
+
+        output = io.BytesIO()
+        img.save(output, format=img.format, **params)
+    file.seek(0)
+    return output.getvalue()
+
+
+def get_capture_time(exif):
+    """Return the EXIF capture time as an aware datetime (UTC if no offset is given)."""
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    value = exif_ifd.get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    if not value:
+        return None
+
+    try:
+        taken_at = datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+    tz = timezone.utc
+    offset = str(exif_ifd.get(EXIF_OFFSET_TIME_ORIGINAL) or '').strip('\x00 ')
+    if len(offset) == 6 and offset[0] in '+-':  # e.g. '+02:00'
+        try:
+            hours, minutes = int(offset[1:3]), int(offset[4:6])
+        except ValueError:
+            pass
+        else:
+            sign = -1 if offset[0] == '-' else 1
+            tz = timezone(sign * timedelta(hours=hours, minutes=minutes))
+    return taken_at.replace(tzinfo=tz)
+
+
+def compute_dhash(img, hash_size=8):
+    """
+    Return the 64-bit difference hash (dHash) of an image.
+
+    Each bit tells whether a pixel is brighter than its right neighbour in a
+    9x8 grayscale thumbnail; re-encoding, resizing or small edits of a photo
+    only flip a few bits (=> compare hashes by Hamming distance).
+    """
+    gray = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def get_dominant_color(img):
+    """Return the most common colour of an RGB image as '#rrggbb'."""
+    quantized = img.quantize(colors=5)
+    palette = quantized.getpalette()
+    _, idx = max(quantized.getcolors())
+    r, g, b = palette[idx * 3:idx * 3 + 3]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+# BlurHash: https://github.com/woltapp/blurhash/blob/master/Algorithm.md ------- #
+def _encode_base83(value, length):
+    return ''.join(
+        BASE83_CHARS[(value // 83 ** (length - i - 1)) % 83] for i in range(length)
+    )
+
+
+def _srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    v = min(max(value, 0), 1)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode_blurhash(img, components=BLURHASH_COMPONENTS):
+    """Encode a (small) RGB image as a BlurHash string."""
+    x_components, y_components = components
+    width, height = img.size
+    pixels = [tuple(_srgb_to_linear(c) for c in px) for px in img.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            normalisation = 1 if i == j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(c) for factor in ac for c in factor)
+        quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1
+    blurhash += _encode_base83(quantised_max, 1)
+
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    blurhash += _encode_base83((r << 16) + (g << 8) + b, 4)
+
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, int(math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5)))
+            for c in factor
+        )
+        blurhash += _encode_base83(r * 19 * 19 + g * 19 + b, 2)
+    return blurhash
@@ -0,0 +1,170 @@
+"""
+A small, database-backed background job queue.
+
+    from core.jobs import job, enqueue
+
+    @job
+    def optimize_image(recipe_id):
+        ...
+
+    enqueue(optimize_image, recipe_id=recipe.id)
+
+Jobs are rows of `core.models.Job`; `manage.py run_worker` claims & runs them.
+Enqueueing inside the request's transaction means a rolled back request never
+leaves a job behind (no outside broker to keep in sync).
+"""
+import random
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job
+
+
+def job(func):
+    """Mark `func` as runnable by the workers."""
+    func.job_name = f'{func.__module__}.{func.__qualname__}'
+    return func
+
+
+def enqueue(func, *, run_at=None, max_attempts=None, **kwargs):
+    """Queue a call of the `@job` function `func` with (JSON serializable) `kwargs`."""
+    if not getattr(func, 'job_name', None):
+        raise ValueError(f'{func!r} is not a @job.')
+    return Job.objects.create(
+        name=func.job_name,
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim_jobs(worker_id, limit):
+    """Atomically mark (at most) `limit` due jobs as running by `worker_id`."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at')
+    claim = {
+        'status': Job.RUNNING, 'locked_by': worker_id, 'locked_at': now,
+        'attempts': F('attempts') + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        # Postgres: rows locked by other workers are skipped, not waited for.
+        with transaction.atomic():
+            ids = list(
+                due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit]
+            )
+            Job.objects.filter(id__in=ids).update(**claim)
+    else:
+        # SQLite: no row locks; the conditional UPDATE is atomic though,
+        # so each job is won by a single worker.
+        ids = [
+            idx for idx in due.values_list('id', flat=True)[:limit]
+            if Job.objects.filter(id=idx, status=Job.QUEUED).update(**claim)
+        ]
+
+    return list(Job.objects.filter(id__in=ids).order_by('run_at'))
+
+
+def requeue_stale_jobs():
+    """
+    Requeue the jobs whose worker died (or hung) while running them; those out
+    of attempts fail instead, so a job crashing its worker isn't retried forever.
+    Returns the number of requeued jobs.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', locked_at=None,
+        last_error=f'Still running after {settings.JOB_TIMEOUT}s: worker died or hung.',
+    )
+    return stale.update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def get_retry_delay(attempts):
+    """Exponential backoff, with jitter so failed jobs don't retry in lockstep."""
+    delay = min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX
+    )
+    return delay * random.uniform(0.5, 1.5)
+
+
+def execute_job(job_id):
+    """
+    Run the (claimed) job `job_id`.
+
+    Returns `(name, status, duration)`. Runs in worker threads or processes,
+    hence it only takes the id & does its own DB access.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        started = time.monotonic()
+        try:
+            func = import_string(job.name)
+            if not getattr(func, 'job_name', None):
+                raise ValueError(f'{job.name} is not a @job.')
+            func(**job.kwargs)
+        except Exception:
+            duration = time.monotonic() - started
+            now = timezone.now()
+            if job.attempts < job.max_attempts:
+                job.status = Job.QUEUED
+                job.run_at = now + timedelta(seconds=get_retry_delay(job.attempts))
+            else:
+                job.status = Job.FAILED
+                job.finished_at = now
+            job.last_error = traceback.format_exc()
+            job.locked_by, job.locked_at = '', None
+            job.save(update_fields=[
+                'status', 'run_at', 'finished_at', 'last_error', 'locked_by', 'locked_at'
+            ])
+            return job.name, 'retried' if job.status == Job.QUEUED else Job.FAILED, duration
+
+        duration = time.monotonic() - started
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+        return job.name, Job.DONE, duration
+    finally:
+        close_old_connections()
+
+
+class JobMetrics:
+    """Thread-safe counters of the jobs run by a worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counts = {Job.DONE: 0, 'retried': 0, Job.FAILED: 0}
+        self.runtime = 0.0
+        self.by_name = {}
+
+    def record(self, name, status, duration):
+        with self.lock:
+            self.counts[status] += 1
+            self.runtime += duration
+            stats = self.by_name.setdefault(name, {'runs': 0, 'runtime': 0.0})
+            stats['runs'] += 1
+            stats['runtime'] += duration
+
+    def snapshot(self):
+        with self.lock:
+            runs = sum(self.counts.values())
+            elapsed = time.monotonic() - self.started
+            return {
+                **self.counts,
+                'runs': runs,
+                'jobs_per_sec': runs / elapsed if elapsed else 0.0,
+                'avg_runtime': self.runtime / runs if runs else 0.0,
+                'by_name': {name: dict(stats) for name, stats in self.by_name.items()},
+            }
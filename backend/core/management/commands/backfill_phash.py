@@ -0,0 +1,46 @@
+"""
+Django command to compute the perceptual hash of existing recipe images.
+"""
+from django.core.management.base import BaseCommand
+
+from core.hashindex import BAND_FIELDS
+from core.images import IMAGE_ERRORS, extract_image_metadata
+from core.models import Recipe
+
+PHASH_FIELDS = ['image_phash'] + BAND_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Compute the perceptual hash of recipe images that have none yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        batch_size = options['batch_size']
+        queryset = Recipe.objects.filter(image_phash__isnull=True).exclude(image='')
+        queryset = queryset.exclude(image__isnull=True).only('id', 'image').order_by('id')
+
+        done = failed = 0
+        batch = []
+        for recipe in queryset.iterator(chunk_size=batch_size):
+            try:
+                with recipe.image.open('rb') as img_file:
+                    metadata = extract_image_metadata(img_file)
+            except IMAGE_ERRORS as e:  # missing file / not an image
+                failed += 1
+                self.stderr.write(f'Recipe {recipe.id}: {e}')
+                continue
+
+            for field in PHASH_FIELDS:
+                setattr(recipe, field, metadata[field])
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                done += Recipe.objects.bulk_update(batch, PHASH_FIELDS)
+                batch = []
+
+        if batch:
+            done += Recipe.objects.bulk_update(batch, PHASH_FIELDS)
+
+        self.stdout.write(self.style.SUCCESS(f'Hashed {done} images ({failed} failed).'))
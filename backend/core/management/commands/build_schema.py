@@ -0,0 +1,26 @@
+"""
+Django command to generate the OpenAPI schema files (see `core.schema`).
+"""
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema served at /api/schema/ for the current code.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate the files even if they exist for this code version.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        code_version = schema.get_code_version()
+        for fmt, rendered in schema.build(force=options['force']).items():
+            self.stdout.write(
+                f'{schema.get_schema_path(code_version, fmt)}: {len(rendered.body)} bytes '
+                f'({len(rendered.gzipped)} gzipped), ETag {rendered.etag}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Schema ready for version {code_version}.'))
@@ -0,0 +1,58 @@
+"""
+Django command to compare the recipes' tag & ingredient snapshots with the
+M2M tables (see `core.snapshots`) & optionally repair them.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import snapshots
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Find (& with --repair, fix) recipes whose tags/ingredients snapshots drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--repair', action='store_true', help='Recompute the drifted snapshots.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        fields = [snapshots.get_field(relation) for relation in snapshots.RELATIONS]
+        queryset = Recipe.objects.order_by('pk').values_list('pk', *fields)
+
+        checked = 0
+        drifted = []
+        last_pk = 0
+        while batch := list(queryset.filter(pk__gt=last_pk)[:options['batch_size']]):
+            last_pk = batch[-1][0]
+            checked += len(batch)
+            expected = snapshots.compute([row[0] for row in batch])
+            for pk, *values in batch:
+                stored = dict(zip(snapshots.RELATIONS, values))
+                if stored != expected[pk]:
+                    drifted.append(pk)
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f'Recipe {pk}: {stored} != {expected[pk]}')
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} recipes: no drift.'))
+            return
+        if not options['repair']:
+            raise CommandError(
+                f'{len(drifted)} of {checked} recipes have drifted snapshots; '
+                'run with --repair to fix them.'
+            )
+
+        for start in range(0, len(drifted), options['batch_size']):
+            recipe_ids = drifted[start:start + options['batch_size']]
+            # Locked: a concurrent change waits, then refreshes after us.
+            with transaction.atomic():
+                locked = Recipe.objects.select_for_update().filter(pk__in=recipe_ids)
+                list(locked.values_list('pk', flat=True))
+                snapshots.refresh(recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired {len(drifted)} of {checked} recipes.'
+        ))
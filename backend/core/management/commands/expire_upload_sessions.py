@@ -0,0 +1,71 @@
+"""
+Django command to delete expired upload sessions (see `recipe.uploads`) & their
+partial files, plus partial files whose session is gone (e.g. a crash between
+deleting the row & the file). Meant to run periodically (cron, ...).
+"""
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.management.commands.gc_media import batched, walk_files
+from core.models import UploadSession
+from recipe import uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete upload sessions older than UPLOAD_SESSION_MAX_AGE & their partial files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        max_age = settings.UPLOAD_SESSION_MAX_AGE
+        expired = UploadSession.objects.filter(
+            created_at__lte=timezone.now() - timedelta(seconds=max_age)
+        )
+        sessions = 0
+        for session in expired.iterator(chunk_size=options['batch_size']):
+            uploads.delete_session(session)
+            sessions += 1
+
+        # A partial file is written to after its session is created: an old one
+        # without a session is an orphan.
+        cutoff = time.time() - max_age
+        files = 0
+        candidates = (
+            entry for entry in walk_files(settings.UPLOAD_SESSION_ROOT)
+            if entry.name.endswith('.part')
+        )
+        for batch in batched(candidates, options['batch_size']):
+            ids = {entry.name.removesuffix('.part'): entry for entry in batch}
+            valid_ids = [pk for pk in ids if is_uuid(pk)]
+            existing = {
+                str(pk) for pk in
+                UploadSession.objects.filter(pk__in=valid_ids).values_list('pk', flat=True)
+            }
+            for pk, entry in ids.items():
+                try:
+                    if pk in existing or entry.stat().st_mtime > cutoff:
+                        continue
+                    os.remove(entry.path)
+                except FileNotFoundError:  # removed meanwhile
+                    continue
+                files += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {sessions} expired upload sessions & {files} orphaned partial files.'
+        ))
+
+
+def is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,122 @@
+"""
+Django command to delete (or quarantine) orphaned media files.
+
+Recipe images are left behind on disk when they're replaced via `upload-image`
+or when the recipe (or, by CASCADE, its user) is deleted. This command walks
+the upload directory & removes files no `Recipe.image` references anymore.
+"""
+import os
+import shutil
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+
+
+def walk_files(root):
+    """Lazily yield a `DirEntry` for every file under `root`."""
+    # `os.scandir` streams the directory & caches the file type; no list of
+    # millions of paths is ever built in memory (unlike `os.walk` per directory).
+    dirs = [root]
+    while dirs:
+        try:
+            with os.scandir(dirs.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:  # removed while walking
+            continue
+
+
+def batched(iterable, size):
+    """Yield lists of (at most) `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Delete (or quarantine) media files that are not referenced by any recipe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=os.path.join('uploads', 'recipe'),
+            help='Directory to clean up, relative to MEDIA_ROOT.'
+        )
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Keep unreferenced files younger than this; they may belong to an '
+                 'upload whose DB transaction has not committed yet.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--quarantine', metavar='DIR',
+            help='Move orphaned files to DIR (keeping their relative path) instead of '
+                 'deleting them.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only report what would be removed.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        root = os.path.join(media_root, options['path'])
+        if not os.path.isdir(root):
+            raise CommandError(f'{root} is not a directory.')
+
+        cutoff = time.time() - options['grace_hours'] * 3600
+        quarantine = options['quarantine']
+        dry_run = options['dry_run']
+        stats = {'scanned': 0, 'scanned_bytes': 0, 'orphaned': 0, 'orphaned_bytes': 0}
+
+        started = time.monotonic()
+        for batch in batched(walk_files(root), options['batch_size']):
+            # Storage names, as saved in the DB: 'uploads/recipe/<uuid>.jpg'
+            entries = {
+                os.path.relpath(entry.path, media_root).replace(os.sep, '/'): entry
+                for entry in batch
+            }
+            # One (indexed) query per batch.
+            referenced = set(
+                Recipe.objects.filter(image__in=entries).values_list('image', flat=True)
+            )
+
+            for name, entry in entries.items():
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                stats['scanned'] += 1
+                stats['scanned_bytes'] += stat.st_size
+                if name in referenced or stat.st_mtime > cutoff:
+                    continue
+
+                stats['orphaned'] += 1
+                stats['orphaned_bytes'] += stat.st_size
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'Orphaned: {name}')
+                if dry_run:
+                    continue
+                if quarantine:
+                    destination = os.path.join(quarantine, name)
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    shutil.move(entry.path, destination)
+                else:
+                    os.remove(entry.path)
+
+        elapsed = time.monotonic() - started
+        action = 'Would remove' if dry_run else 'Quarantined' if quarantine else 'Deleted'
+        self.stdout.write(
+            f"Scanned {stats['scanned']} files ({stats['scanned_bytes'] / 2**20:.1f} MiB) "
+            f"in {elapsed:.2f}s ({stats['scanned'] / max(elapsed, 1e-6):.0f} files/s)."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {stats['orphaned']} orphaned files "
+            f"({stats['orphaned_bytes'] / 2**20:.1f} MiB)."
+        ))
@@ -0,0 +1,60 @@
+"""
+Django command to re-encode stored recipe images more compactly.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.images import IMAGE_ERRORS
+from core.models import Recipe
+from core.optimize import optimize_recipe_image
+
+
+class Command(BaseCommand):
+    help = 'Re-encode (JPEG/PNG) recipe images that were not optimized yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-saving', type=float, default=settings.IMAGE_OPTIMIZE_MIN_SAVING,
+            help='Keep a new version only if it is smaller by this fraction (e.g. 0.05).'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also retry the images that were already processed.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only report the possible savings.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        queryset = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            queryset = queryset.filter(image_bytes_saved__isnull=True)
+        queryset = queryset.only('id', 'image').order_by('id')
+
+        optimized = failed = total = saved = 0
+        for recipe in queryset.iterator(chunk_size=options['batch_size']):
+            try:
+                original_size = recipe.image.size
+                recipe_saved = optimize_recipe_image(
+                    recipe, min_saving=options['min_saving'], dry_run=options['dry_run']
+                )
+            except IMAGE_ERRORS as e:  # missing file / not an image
+                failed += 1
+                self.stderr.write(f'Recipe {recipe.id}: {e}')
+                continue
+
+            total += original_size
+            if recipe_saved:
+                optimized += 1
+                saved += recipe_saved
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'Recipe {recipe.id}: -{recipe_saved} bytes')
+
+        ratio = saved / total if total else 0
+        verb = 'Would optimize' if options['dry_run'] else 'Optimized'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {optimized} images ({failed} failed): '
+            f'{saved / 2**20:.1f} of {total / 2**20:.1f} MB saved ({ratio:.0%}).'
+        ))
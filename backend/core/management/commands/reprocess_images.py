@@ -0,0 +1,143 @@
+"""
+Django command to recompute the derived data of all existing recipe images.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import Recipe
+
+
+class TokenBucket:
+    """Allow on average `rate` units per second, in bursts of up to `capacity` units."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def consume(self, amount):
+        """Take `amount` tokens, sleeping as long as it takes to earn them back."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        if self.tokens < 0:
+            time.sleep(-self.tokens / self.rate)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the metadata (size, colour, hash, ...) of all recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+            help='Number of processes decoding images (default: half the CPUs).'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of recipes fetched, updated & checkpointed at once.'
+        )
+        parser.add_argument(
+            '--max-mb-per-sec', type=float, default=0,
+            help='Limit the rate images are read at (0: no limit).'
+        )
+        parser.add_argument(
+            '--checkpoint', default='reprocess_images.json',
+            help='File the progress is saved to after every chunk.'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue after the last recipe recorded in the checkpoint.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        checkpoint = options['checkpoint']
+        state = {'last_id': 0, 'done': 0, 'failed': 0}
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state.update(json.load(f))
+            self.stdout.write(f"Resuming after recipe {state['last_id']}.")
+
+        bucket = None
+        if options['max_mb_per_sec']:
+            bucket = TokenBucket(options['max_mb_per_sec'] * 2**20)
+
+        queryset = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        queryset = queryset.order_by('id').values_list('id', 'image')
+        started = time.monotonic()
+        processed = read = 0  # by this run (the rates are computed from these)
+
+        # Spawned: the children only decode files, they never touch the database.
+        executor = ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn')
+        )
+        with executor:
+            while True:
+                # Keyset pagination: every chunk is an index range scan, however far we are.
+                rows = list(queryset.filter(id__gt=state['last_id'])[:options['chunk_size']])
+                if not rows:
+                    break
+
+                futures = {}
+                for idx, name in rows:
+                    try:
+                        path = default_storage.path(name)
+                        size = os.path.getsize(path)
+                    except OSError as e:
+                        state['failed'] += 1
+                        self.stderr.write(f'Recipe {idx}: {e}')
+                        continue
+                    if bucket:
+                        bucket.consume(size)
+                    read += size
+                    futures[executor.submit(images.reprocess_image, path)] = idx
+
+                recipes = []
+                for future in as_completed(futures):
+                    idx = futures[future]
+                    try:
+                        metadata = future.result()
+                    except images.IMAGE_ERRORS as e:
+                        state['failed'] += 1
+                        self.stderr.write(f'Recipe {idx}: {e}')
+                        continue
+                    recipes.append(Recipe(id=idx, **metadata))
+
+                if recipes:
+                    state['done'] += Recipe.objects.bulk_update(
+                        recipes, images.METADATA_FIELDS
+                    )
+                processed += len(rows)
+                state['last_id'] = rows[-1][0]
+                self.save_checkpoint(checkpoint, state)
+                self.report(state, processed, read, started)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Reprocessed {state['done']} images ({state['failed']} failed) "
+            f"in {elapsed:.1f}s."
+        ))
+
+    def save_checkpoint(self, path, state):
+        # Write & rename: an interrupted run never leaves a truncated checkpoint.
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def report(self, state, processed, read, started):
+        elapsed = time.monotonic() - started or 1e-9
+        self.stdout.write(
+            f"Up to recipe {state['last_id']}: {state['done']} done, "
+            f"{state['failed']} failed; {processed / elapsed:.1f} images/s, "
+            f"{read / elapsed / 2**20:.1f} MB/s."
+        )
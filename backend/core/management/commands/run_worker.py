@@ -0,0 +1,143 @@
+"""
+Django command to run background jobs (see `core.jobs`).
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+# Seconds between two checks for jobs lost by dead workers.
+REQUEUE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Claim & run background jobs from the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY,
+            help='Number of jobs run at once.'
+        )
+        parser.add_argument(
+            '--mode', choices=['thread', 'process'], default='thread',
+            help='Run jobs in a thread pool (I/O bound jobs) or a process pool (CPU bound).'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait before polling again when the queue is empty.'
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60.0,
+            help='Seconds between two metrics reports.'
+        )
+        parser.add_argument(
+            '--burst', action='store_true', help='Exit once the queue is empty.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        metrics = jobs.JobMetrics()
+
+        self.stopping = False
+        previous_handlers = {
+            sig: signal.signal(sig, self.stop) for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            self.run(worker_id, metrics, options)
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+        self.report(metrics)
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped.'))
+
+    def run(self, worker_id, metrics, options):
+        """Claim jobs while there's room in the pool, until stopped."""
+        concurrency = options['concurrency']
+        poll_interval = options['poll_interval']
+        self.executor = self.create_executor(options)
+
+        self.stdout.write(
+            f"Worker {worker_id} started ({concurrency} {options['mode']} workers)."
+        )
+        last_report = last_requeue = time.monotonic()
+        in_flight = {}  # future: (job id, its executor)
+        try:
+            while not self.stopping:
+                if time.monotonic() - last_requeue > REQUEUE_INTERVAL:
+                    jobs.requeue_stale_jobs()
+                    last_requeue = time.monotonic()
+
+                if len(in_flight) < concurrency:
+                    for job in jobs.claim_jobs(worker_id, concurrency - len(in_flight)):
+                        future = self.executor.submit(jobs.execute_job, job.id)
+                        in_flight[future] = (job.id, self.executor)
+
+                if not in_flight:
+                    if options['burst']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.collect(future, *in_flight.pop(future), metrics, options)
+
+                if time.monotonic() - last_report > options['stats_interval']:
+                    self.report(metrics)
+                    last_report = time.monotonic()
+
+            # Graceful shutdown: finish the jobs already claimed.
+            for future, (job_id, executor) in in_flight.items():
+                self.collect(future, job_id, executor, metrics, options)
+        finally:
+            self.executor.shutdown()
+
+    def create_executor(self, options):
+        if options['mode'] == 'process':
+            connections.close_all()
+            return ProcessPoolExecutor(
+                max_workers=options['concurrency'],
+                # Spawned, not forked (forking a process with open DB connections &
+                # threads isn't safe): set Django up from scratch in every process.
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(
+            max_workers=options['concurrency'], thread_name_prefix='job'
+        )
+
+    def collect(self, future, job_id, executor, metrics, options):
+        """Record the outcome of a job run; an error is logged, the worker goes on."""
+        try:
+            metrics.record(*future.result())
+        except Exception as e:
+            # E.g. lost DB connection, or a job that killed its process. The
+            # job stays running: `requeue_stale_jobs` retries (or fails) it later.
+            self.stderr.write(f'Job {job_id}: {e!r}')
+            if isinstance(e, BrokenProcessPool) and executor is self.executor:
+                self.executor.shutdown(wait=False)
+                self.executor = self.create_executor(options)
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the running jobs ...')
+        self.stopping = True
+
+    def report(self, metrics):
+        stats = metrics.snapshot()
+        self.stdout.write(
+            f"Jobs: {stats['done']} done, {stats['retried']} retried, "
+            f"{stats['failed']} failed; {stats['jobs_per_sec']:.2f} jobs/s, "
+            f"avg {stats['avg_runtime'] * 1000:.1f} ms."
+        )
@@ -0,0 +1,141 @@
+"""
+Django command to run the production server: gunicorn, pre-forked workers.
+
+- The app is loaded & warmed up (see `warm_up`) once, in the master, before
+  the workers are forked: they share that memory copy-on-write & are ready to
+  serve as soon as they start.
+- Workers & threads are sized from the CPUs available to the container
+  (`SERVER_WORKERS` / `SERVER_THREADS` or the options override them).
+- Rolling restarts: each worker is replaced after `SERVER_MAX_REQUESTS` (+ jitter)
+  requests, one at a time. `kill -HUP <master>` replaces all the workers
+  gracefully; to deploy new code (preloaded: HUP keeps the old one), start a
+  new master with `kill -USR2 <master>`, then stop the old one with `-QUIT`.
+"""
+import gc
+import math
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+from gunicorn.app.base import BaseApplication
+from PIL import Image
+
+
+def get_cpu_count():
+    """CPUs this process may use: its affinity, bounded by the cgroup (v2) CPU quota."""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:  # macOS
+        cpus = os.cpu_count()
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus or 1, 1)
+
+
+def get_worker_count(cpus):
+    """The usual `2 * CPUs + 1`, bounded by `SERVER_MAX_WORKERS` (memory)."""
+    return min(2 * cpus + 1, settings.SERVER_MAX_WORKERS)
+
+
+def warm_up():
+    """
+    Run in the master before forking: whatever is loaded here is shared by the workers.
+    """
+    # Imports every view, serializer, model & their dependencies.
+    get_resolver().url_patterns
+    get_resolver()._populate()
+    # Pillow registers its format plugins lazily, on the first unknown image.
+    Image.init()
+    for hook in settings.SERVER_WARM_UP_HOOKS:
+        import_string(hook)()
+
+    # Sockets mustn't be shared between processes.
+    connections.close_all()
+    # Whatever is alive now is never collected: the GC won't touch (& so copy)
+    # the shared pages in the workers.
+    gc.collect()
+    gc.freeze()
+
+
+class DjangoApplication(BaseApplication):
+    """gunicorn, configured from a dict rather than its command line."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        application = get_wsgi_application()
+        warm_up()
+        return application
+
+
+class Command(BaseCommand):
+    help = 'Run the production (gunicorn) server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='0.0.0.0:8000', help='Address to listen on.')
+        parser.add_argument(
+            '--workers', type=int, default=settings.SERVER_WORKERS,
+            help='Worker processes (default: from the CPU count).'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=settings.SERVER_THREADS,
+            help='Threads per worker.'
+        )
+        parser.add_argument(
+            '--timeout', type=int, default=settings.SERVER_TIMEOUT,
+            help='Seconds a request may take before its worker is restarted.'
+        )
+        parser.add_argument('--pidfile', help="Write the master's pid to this file.")
+        parser.add_argument(
+            '--print-config', action='store_true',
+            help='Print the resulting configuration & exit.'
+        )
+
+    def get_options(self, options):
+        workers = options['workers'] or get_worker_count(get_cpu_count())
+        threads = max(options['threads'], 1)
+        return {
+            'bind': options['bind'],
+            'workers': workers,
+            'threads': threads,
+            'worker_class': 'gthread' if threads > 1 else 'sync',
+            'preload_app': True,
+            'timeout': options['timeout'],
+            # In-flight requests get this long to finish on restarts & shutdowns.
+            'graceful_timeout': options['timeout'],
+            'max_requests': settings.SERVER_MAX_REQUESTS,
+            # Workers started together mustn't all restart at once.
+            'max_requests_jitter': settings.SERVER_MAX_REQUESTS // 10,
+            'pidfile': options['pidfile'],
+            'accesslog': '-',
+            'proc_name': 'recipe-app',
+        }
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        gunicorn_options = self.get_options(options)
+        if options['print_config']:
+            for key, value in gunicorn_options.items():
+                self.stdout.write(f'{key} = {value!r}')
+            return
+
+        self.stdout.write(
+            f"Serving on {gunicorn_options['bind']}: {gunicorn_options['workers']} "
+            f"workers x {gunicorn_options['threads']} threads."
+        )
+        DjangoApplication(gunicorn_options).run()
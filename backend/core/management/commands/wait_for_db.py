@@ -1,26 +1,68 @@
 """
-Django command to wait for the database until available.
+Django command to wait for the database (& the other dependencies) until available.
 """
+import random
 import time
 
-from psycopg2 import OperationalError as Psycopg2OpError
+from django.core.management.base import BaseCommand, CommandError
 
-from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from core import health
+
+# Backoff between two attempts: from a few ms (containers usually start together),
+# doubled after every failed attempt, up to MAX_DELAY; +/- 50% jitter.
+INITIAL_DELAY = 0.005
+MAX_DELAY = 1.0
 
 
 class Command(BaseCommand):
+    help = 'Wait until the database, media storage & cache are usable.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=60.0,
+            help='Give up (& fail) after this many seconds.'
+        )
+        parser.add_argument(
+            '--checks', nargs='+', choices=list(health.CHECKS), default=list(health.CHECKS),
+            help='Dependencies to wait for (default: all).'
+        )
+
     def handle(self, *args, **options):
         """Entrypoint for command."""
-        self.stdout.write('Waiting for database ...')
-        db_up = False
-        while not db_up:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Psycopg2OpError, OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 sec ...')
-                time.sleep(1)
+        started = time.monotonic()
+        deadline = started + options['timeout']
+        pending = list(options['checks'])
+        self.stdout.write(f"Waiting for {', '.join(pending)} ...")
+
+        delay = INITIAL_DELAY
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            results = health.run_checks(pending, timeout=remaining)
+            for name, result in results.items():
+                if result['ok']:
+                    pending.remove(name)
+                    self.stdout.write(
+                        f"{name.capitalize()} available ({result['duration'] * 1000:.0f} ms)."
+                    )
+            if not pending:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise CommandError(
+                    f"Timed out after {options['timeout']}s "
+                    f"waiting for: {', '.join(pending)}."
+                )
+            sleep = min(delay * random.uniform(0.5, 1.5), remaining)
+            for name in pending:
+                self.stdout.write(
+                    f"{name.capitalize()} unavailable ({results[name]['error']}), "
+                    f"retrying in {sleep * 1000:.0f} ms ..."
+                )
+            time.sleep(sleep)
+            delay = min(delay * 2, MAX_DELAY)
 
         # style.success: bold green font
-        self.stdout.write(self.style.SUCCESS('Database available!'))
+        self.stdout.write(self.style.SUCCESS(
+            f'All dependencies available in {time.monotonic() - started:.2f}s!'
+        ))
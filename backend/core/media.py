@@ -0,0 +1,180 @@
+"""
+Serve user-uploaded media files.
+
+In production the actual file transfer is handed over to the front proxy:
+- `x-accel-redirect`: nginx serves the file from an `internal` location.
+- `x-sendfile`: Apache (mod_xsendfile) / lighttpd serve the file by path.
+
+The `python` backend streams the file ourselves, but still avoids copying it
+through Python when possible: `FileResponse` hands the open file to the WSGI
+server's `wsgi.file_wrapper`, which uses `os.sendfile` (e.g. gunicorn).
+Byte ranges & conditional requests (ETag / Last-Modified) are supported.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# For files that never change once written (e.g. uuid-named uploads).
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Read-only view over `length` bytes of an open file, from its current position.
+
+    `fileno()` is exposed on purpose: a WSGI file wrapper can `sendfile` the
+    range straight from the descriptor (offset = current position,
+    count = Content-Length) instead of iterating over `read()`.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+        self.name = file.name
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single `bytes=start-end` range header.
+
+    Returns `(start, end)` (inclusive), `None` if the header should be ignored
+    (i.e. serve the full file), or raises `ValueError` if unsatisfiable.
+    Multi-range requests are ignored; serving the whole file is always valid.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last `end` bytes.
+        length = int(end)
+        if length == 0:
+            raise ValueError('Empty suffix range.')
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable.')
+    return start, end
+
+
+def get_etag(stat):
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def serve_file(request, path, *, cache_control=DEFAULT_CACHE_CONTROL, accel_path=None,
+               content_type=None):
+    """
+    Return a response for the file at the absolute `path`.
+
+    `accel_path` is the internal URL the front proxy maps to this file;
+    it is only used by the `x-accel-redirect` backend.
+    """
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File does not exist.')
+    if not os.path.isfile(path):
+        raise Http404('File does not exist.')
+
+    etag = get_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    # 304 Not Modified / 412 Precondition Failed:
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type = content_type or mimetypes.guess_type(path)[0]
+        content_type = content_type or 'application/octet-stream'
+        response = _file_response(request, path, stat.st_size, etag, content_type, accel_path)
+
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _file_response(request, path, size, etag, content_type, accel_path):
+    backend = settings.MEDIA_SERVE_BACKEND
+
+    # The proxy takes care of Range requests itself.
+    if backend == 'x-accel-redirect' and accel_path:
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Accel-Redirect'] = quote(accel_path)
+        return response
+    if backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Sendfile'] = path
+        return response
+
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and size and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            status = 206
+
+    file = open(path, 'rb')
+    file.seek(start)
+    length = end - start + 1 if size else 0
+    response = FileResponse(RangeFile(file, length), status=status, content_type=content_type)
+    response.block_size = settings.MEDIA_SERVE_BLOCK_SIZE
+    response.headers['Content-Length'] = length
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from `MEDIA_ROOT`: /static/media/<path>"""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:  # path traversal
+        raise Http404('File does not exist.')
+
+    immutable = any(path.startswith(prefix) for prefix in settings.MEDIA_IMMUTABLE_PREFIXES)
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL
+    accel_path = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+    return serve_file(request, full_path, cache_control=cache_control, accel_path=accel_path)
@@ -0,0 +1,271 @@
+"""
+Middlewares.
+
+They support both sync & async requests: under ASGI, a sync-only middleware
+would put every request (even async views) back on a thread.
+"""
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+from core import compression, db_router, hashers
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Expose the current request to `core.db_router.ReplicaRouter`.
+
+    Users who wrote something (or sent an unsafe request) are pinned to the
+    primary for `DB_READ_YOUR_WRITES_WINDOW` seconds afterwards.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = db_router.RequestState(request)
+        token = db_router._request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router._request_state.reset(token)
+
+        user = self.get_user_to_pin(request, state)
+        if user is not None:
+            db_router.pin_to_primary(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        state = db_router.RequestState(request)
+        token = db_router._request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router._request_state.reset(token)
+
+        user = self.get_user_to_pin(request, state)
+        if user is not None:
+            await db_router.apin_to_primary(user.pk)
+        return response
+
+    def get_user_to_pin(self, request, state):
+        if state.wrote or request.method not in db_router.SAFE_METHODS:
+            return db_router.get_resolved_user(request)
+        return None
+
+
+# Already compressed formats: compressing them again costs CPU & saves nothing.
+re_compressed_type = re.compile(
+    r'^(image/(?!svg)|video/|audio/|font/woff|application/'
+    r'(zip|gzip|x-gzip|zstd|x-bzip2|x-xz|x-7z-compressed|x-rar-compressed|pdf|wasm))',
+    re.IGNORECASE,
+)
+
+
+class CompressionMiddleware:
+    """
+    Compress the responses with the best encoding the client accepts:
+    brotli, zstd or gzip (see `core.compression`).
+
+    Bodies under `COMPRESSION_MIN_SIZE` bytes are sent as is. Streaming bodies
+    are compressed chunk by chunk, as they're sent. Skipped: files under
+    `MEDIA_URL` & `STATIC_URL`, formats that are compressed already (images,
+    ZIPs, ...) & responses with a `Content-Encoding` (e.g. the pre-gzipped
+    API schema).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        # Compressed or not, the response depends on Accept-Encoding.
+        if self.is_compressible(request, response):
+            patch_vary_headers(response, ('Accept-Encoding',))
+        else:
+            return response
+
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compressor = compression.StreamCompressor(encoding)
+            if response.is_async:
+                response.streaming_content = compressor.acompress_sequence(
+                    response.streaming_content
+                )
+            else:
+                response.streaming_content = compressor.compress_sequence(
+                    response.streaming_content
+                )
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                compression.stats.record_too_small()
+                return response
+            compressed = compression.compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body isn't the one a strong ETag was computed for.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, request, response):
+        if response.status_code in (204, 206, 304) or response.has_header('Content-Encoding'):
+            return False
+        # Media: mostly images; static: precompressed by `collectstatic`.
+        if request.path.startswith((settings.MEDIA_URL, settings.STATIC_URL)):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if re_compressed_type.match(response.get('Content-Type', '')):
+            return False
+        content_length = response.get('Content-Length')
+        if response.streaming and content_length and content_length.isdigit():
+            return int(content_length) >= settings.COMPRESSION_MIN_SIZE
+        return True
+
+
+class BrowserMiddleware:
+    """
+    Run the `BROWSER_MIDDLEWARE` (sessions, CSRF, messages, ...) except for the
+    paths under `LEAN_MIDDLEWARE_PREFIXES`.
+
+    The APIs authenticate with tokens: loading a session, checking CSRF, ... is
+    wasted on their requests. Everything else (e.g. the admin) gets the full stack.
+
+    Like `MIDDLEWARE`, first is outermost; the `process_view()`,
+    `process_exception()` & `process_template_response()` hooks are called in
+    the same order as if they were listed in `MIDDLEWARE`. The middleware must
+    support both sync & async requests (Django's do).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(settings.LEAN_MIDDLEWARE_PREFIXES)
+
+        self.middleware = []
+        handler = get_response
+        for path in reversed(settings.BROWSER_MIDDLEWARE):
+            middleware_class = import_string(path)
+            if not (
+                getattr(middleware_class, 'sync_capable', True)
+                and getattr(middleware_class, 'async_capable', False)
+            ):
+                raise ImproperlyConfigured(
+                    f'{path} must support both sync & async requests to be in '
+                    'BROWSER_MIDDLEWARE.'
+                )
+            try:
+                middleware = middleware_class(handler)
+            except MiddlewareNotUsed:
+                continue
+            self.middleware.insert(0, middleware)
+            # Like Django does between the `MIDDLEWARE`.
+            handler = convert_exception_to_response(middleware)
+        self.browser_get_response = handler
+
+        self.view_middleware = [
+            m.process_view for m in self.middleware if hasattr(m, 'process_view')
+        ]
+        self.exception_middleware = [
+            m.process_exception for m in reversed(self.middleware)
+            if hasattr(m, 'process_exception')
+        ]
+        self.template_response_middleware = [
+            m.process_template_response for m in reversed(self.middleware)
+            if hasattr(m, 'process_template_response')
+        ]
+
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_lean(self, request):
+        return request.path_info.startswith(self.prefixes)
+
+    def __call__(self, request):
+        if self.is_lean(request):
+            return self.get_response(request)
+        return self.browser_get_response(request)
+
+    # Sync: Django runs them on a thread when serving async requests.
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_lean(request):
+            return None
+        for process_view in self.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        if self.is_lean(request):
+            return None
+        for process_exception in self.exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        for process_template_response in self.template_response_middleware:
+            response = process_template_response(request, response)
+        return response
+
+
+class HashingBusyMiddleware:
+    """
+    `core.hashers.HashingBusy` => 503, outside of the APIs (the admin's login,
+    ...); DRF's views map it themselves (`core.views.exception_handler`).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Under ASGI, a coroutine: awaited by the caller.
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, hashers.HashingBusy):
+            return HttpResponse(str(exception), status=503, content_type='text/plain')
+        return None
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:14
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, null=True, upload_to=core.models.get_path_for_recipe_img),
+        ),
+    ]
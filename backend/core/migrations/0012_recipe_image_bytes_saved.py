@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_bytes_saved',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
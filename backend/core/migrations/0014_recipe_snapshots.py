@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:22
+
+from django.db import migrations, models
+
+
+def fill_snapshots(apps, schema_editor):
+    """Like `core.snapshots.refresh()`, on the historical models."""
+    Recipe = apps.get_model('core', 'Recipe')
+    snapshots = {pk: ([], []) for pk in Recipe.objects.values_list('pk', flat=True)}
+    for index, (relation, name) in enumerate([('tags', 'tag'), ('ingredients', 'ingredient')]):
+        rows = (
+            getattr(Recipe, relation).through.objects.order_by(f'{name}_id')
+            .values_list('recipe_id', f'{name}_id', f'{name}__name')
+        )
+        for recipe_id, pk, value in rows.iterator():
+            snapshots[recipe_id][index].append({'id': pk, 'name': value})
+    recipes = [
+        Recipe(pk=pk, tags_snapshot=tags, ingredients_snapshot=ingredients)
+        for pk, (tags, ingredients) in snapshots.items()
+        if tags or ingredients
+    ]
+    Recipe.objects.bulk_update(
+        recipes, ['tags_snapshot', 'ingredients_snapshot'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_snapshot',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_snapshot',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='revokedtoken',
+            constraint=models.UniqueConstraint(condition=models.Q(('jti', ''), _negated=True), fields=('jti',), name='revokedtoken_jti_unique'),
+        ),
+    ]
@@ -3,9 +3,11 @@ Database models.
 """
 import os
 import uuid
+from datetime import timedelta
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -92,16 +94,65 @@ class Recipe(models.Model):
     link = models.URLField(max_length=250, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=get_path_for_recipe_img)
+    # `[{id, name}]` of the tags & ingredients, ordered by id; kept in sync by
+    # `core.snapshots`, so listing recipes needs neither a join nor a prefetch.
+    tags_snapshot = models.JSONField(default=list, blank=True, editable=False)
+    ingredients_snapshot = models.JSONField(default=list, blank=True, editable=False)
+    # Indexed for the batched lookups of the `gc_media` command.
+    image = models.ImageField(null=True, upload_to=get_path_for_recipe_img, db_index=True)
+    # Image metadata; extracted once at upload time (see `core.images`),
+    # so we never have to open the file to lay out a gallery grid.
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=10, blank=True)
+    image_taken_at = models.DateTimeField(null=True, blank=True, db_index=True)  # EXIF
+    image_color = models.CharField(max_length=7, blank=True)  # dominant colour: '#rrggbb'
+    image_placeholder = models.CharField(max_length=64, blank=True)  # BlurHash
+    # Perceptual hash (dHash) & its 4 16-bit bands, for near-duplicate lookups
+    # by multi-index hashing (see `core.hashindex`).
+    image_phash = models.BigIntegerField(null=True, blank=True)
+    image_phash_0 = models.PositiveIntegerField(null=True, blank=True)
+    image_phash_1 = models.PositiveIntegerField(null=True, blank=True)
+    image_phash_2 = models.PositiveIntegerField(null=True, blank=True)
+    image_phash_3 = models.PositiveIntegerField(null=True, blank=True)
+    # Bytes saved by re-encoding the image (see `core.optimize`); null: not optimized yet.
+    image_bytes_saved = models.PositiveIntegerField(null=True, blank=True)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,  # set to 'core.User' in config/setttings.py
         on_delete=models.CASCADE
     )
 
+    # Only written by `core.snapshots` (with `bulk_update`).
+    SNAPSHOT_FIELDS = ('tags_snapshot', 'ingredients_snapshot')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', f'image_phash_{i}'], name=f'recipe_phash_{i}_idx')
+            for i in range(4)
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # A full save of an existing recipe leaves the snapshots out: the copy in
+        # memory may predate a tag change (e.g. loaded before a concurrent request
+        # added one) & would put the stale snapshots back.
+        if (
+            not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.SNAPSHOT_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
 
 # Tag Model ----------------------------------------------------------------------- #
 class Tag(models.Model):
@@ -121,3 +172,91 @@ class Ingredient(models.Model):
 
     def __str__(self):
         return self.name
+
+
+# Upload Session Model ------------------------------------------------------------ #
+class UploadSession(models.Model):
+    """A resumable, chunked upload of a recipe image (see `recipe.uploads`)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Chunks may arrive in parallel & out of order: `received` holds the merged
+    # `[start, end)` byte ranges written so far; `offset` is where the first gap starts.
+    received = models.JSONField(default=list)
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def partial_path(self):
+        """Where the data is written until the upload is finalized."""
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, f'{self.id}.part')
+
+    @property
+    def expires_at(self):
+        return self.created_at + timedelta(seconds=settings.UPLOAD_SESSION_MAX_AGE)
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+
+# Job Model ----------------------------------------------------------------------- #
+class Job(models.Model):
+    """Background work, run by `manage.py run_worker` (see `core.jobs`)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, DONE, FAILED)]
+
+    name = models.CharField(max_length=200)  # dotted path of a `@job` function
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers only ever look for queued jobs that are due.
+            models.Index(
+                fields=['run_at'], condition=models.Q(status='queued'), name='job_queued_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
+
+
+# Revoked Token Model ------------------------------------------------------------- #
+class RevokedToken(models.Model):
+    """
+    A revoked signed token (`jti`), or all the tokens of a user issued before
+    `revoked_at` (`jti` empty). See `core.tokens`.
+    """
+    jti = models.CharField(max_length=32, blank=True)
+    # Not a foreign key: the revocation must outlive a deleted user.
+    user_id = models.BigIntegerField(null=True, blank=True)
+    revoked_at = models.DateTimeField(default=timezone.now)
+    # Once every token it covers has expired, the row is useless.
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            # Claiming a refresh token (single use) = inserting its row.
+            models.UniqueConstraint(
+                fields=['jti'], condition=~models.Q(jti=''), name='revokedtoken_jti_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return self.jti or f'All tokens of user {self.user_id}'
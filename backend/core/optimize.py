@@ -0,0 +1,61 @@
+"""
+Re-encoding stored recipe images, to cut storage & egress (see `images.recompress_image`).
+"""
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from core.images import recompress_image
+from core.jobs import enqueue, job
+from core.models import Recipe
+
+
+def optimize_recipe_image(recipe, min_saving=None, dry_run=False):
+    """
+    Re-encode the image of `recipe`; returns the number of bytes saved.
+
+    The result is only kept if it's smaller by at least `min_saving` (a fraction
+    of the original size). It's stored under a *new* name since the old URL may
+    be cached as immutable by clients; the old file is left for `gc_media`.
+    """
+    if min_saving is None:
+        min_saving = settings.IMAGE_OPTIMIZE_MIN_SAVING
+    old_name = recipe.image.name
+    storage = recipe.image.storage
+
+    original_size = storage.size(old_name)
+    with storage.open(old_name, 'rb') as f:
+        data = recompress_image(f)
+    saved = original_size - len(data) if data is not None else 0
+    if saved < max(original_size * min_saving, 1):
+        saved = 0
+    if dry_run:
+        return saved
+
+    current = Recipe.objects.filter(pk=recipe.pk, image=old_name)
+    if not saved:
+        current.update(image_bytes_saved=0)  # don't try again
+        return 0
+
+    new_name = storage.save(
+        recipe.image.field.generate_filename(recipe, old_name), ContentFile(data)
+    )
+    # Conditional: a new image may have been uploaded in the meantime.
+    if not current.update(image=new_name, image_bytes_saved=saved):
+        storage.delete(new_name)
+        return 0
+    recipe.image.name, recipe.image_bytes_saved = new_name, saved
+    return saved
+
+
+@job
+def optimize_image(recipe_id):
+    """Background job: re-encode the (just uploaded) image of a recipe."""
+    recipe = Recipe.objects.filter(pk=recipe_id).exclude(image='').first()
+    if recipe and recipe.image and recipe.image_bytes_saved is None:
+        optimize_recipe_image(recipe)
+
+
+def schedule_optimization(recipe):
+    """Queue the optimization of a newly uploaded image, if enabled."""
+    if settings.IMAGE_OPTIMIZE_ON_UPLOAD:
+        enqueue(optimize_image, recipe_id=recipe.id)
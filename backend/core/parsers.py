@@ -0,0 +1,34 @@
+"""
+Faster parsers for the APIs; the counterparts of `core.renderers`.
+"""
+import msgpack
+import orjson
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from core import renderers
+
+
+class ORJSONParser(BaseParser):
+    """`JSONParser`, decoded by orjson (UTF-8 only, as JSON must be)."""
+    media_type = 'application/json'
+    renderer_class = renderers.ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    """`Content-Type: application/msgpack` request bodies."""
+    media_type = 'application/msgpack'
+    renderer_class = renderers.MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=0)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
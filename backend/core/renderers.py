@@ -0,0 +1,62 @@
+"""
+Faster renderers for the APIs.
+
+- `ORJSONRenderer`: `JSONRenderer`'s output (byte for byte, for compact JSON),
+  encoded by orjson; several times faster on large lists.
+- `MessagePackRenderer`: `Accept: application/msgpack`; the same values,
+  binary encoded (smaller & faster to decode for non browser clients).
+
+Values neither format knows natively (datetimes, UUIDs, lazy strings, ...)
+become what DRF's JSON encoder makes of them, except `Decimal`: it's rendered
+as a string, like `DecimalField`s render it (`COERCE_DECIMAL_TO_STRING`), so
+a cost looks the same whether it went through a serializer or not.
+"""
+from decimal import Decimal
+
+import msgpack
+import orjson
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+_encoder = encoders.JSONEncoder()
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def encode_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """`JSONRenderer`, encoded by orjson."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Indented JSON is for humans (e.g. the browsable API): no need to be fast.
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        # Like `JSONRenderer`: escape U+2028 & U+2029 (JSON must be valid JavaScript).
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+            ret = ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack (https://msgpack.org)."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
@@ -0,0 +1,183 @@
+"""
+On-demand image renditions, cached on disk.
+
+A rendition is the source image resized to one of the whitelisted widths &
+encoded in the best format the client accepts (AVIF > WebP > JPEG).
+
+- Cache key: a hash of the source's identity (storage name, size & mtime) plus
+  the rendition parameters; replacing an image never serves a stale variant.
+- Eviction: LRU, bounded by `IMAGE_CACHE_MAX_BYTES`; hits bump the file's atime
+  (not its mtime: the ETag it's served with derives from it).
+- Coalescing: the first request for an uncached variant renders it while holding
+  an exclusive `flock`; concurrent requests (threads or processes) for the same
+  variant wait for that lock & then find the file, so it's decoded only once.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+# (media type, Pillow format, file extension, save options), by preference.
+FORMATS = [
+    ('image/avif', 'AVIF', 'avif', {'quality': 60}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('image/jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+]
+FALLBACK_FORMAT = FORMATS[-1]
+
+ORIENTATION_TAG = 0x0112  # EXIF
+
+# A fixed set of lock files; the variant's key picks one. Unrelated variants
+# rarely share a lock & no lock file is ever left behind per variant.
+LOCK_STRIPES = 256
+
+_size_lock = threading.Lock()
+_cache_sizes = {}  # cache dir => its estimated size in bytes (as seen by this process)
+
+
+def get_accepted_formats(accept_header):
+    """Return the media types explicitly listed (with q > 0) in an `Accept` header."""
+    accepted = set()
+    for item in (accept_header or '').split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        q = next((p[2:] for p in params if p.startswith('q=')), '1')
+        try:
+            if float(q) > 0:
+                accepted.add(media_type.lower())
+        except ValueError:
+            continue
+    return accepted
+
+
+def negotiate_format(accept_header):
+    """
+    Pick the output format for an `Accept` header.
+
+    Only formats the client lists explicitly are used (a bare `*/*` doesn't
+    mean a client can decode AVIF); JPEG is the universal fallback.
+    """
+    accepted = get_accepted_formats(accept_header)
+    for fmt in FORMATS[:-1]:
+        media_type, pil_format = fmt[0], fmt[1]
+        if media_type in accepted and features.check(pil_format.lower()):
+            return fmt
+    return FALLBACK_FORMAT
+
+
+def get_cache_path(source_name, source_path, width, fmt):
+    stat = os.stat(source_path)
+    identity = f'{source_name}:{stat.st_size}:{stat.st_mtime_ns}:{width}:{fmt[1]}'
+    key = hashlib.sha256(identity.encode()).hexdigest()
+    return os.path.join(settings.IMAGE_CACHE_ROOT, key[:2], f'{key}.{fmt[2]}')
+
+
+@contextmanager
+def variant_lock(path):
+    lock_dir = os.path.join(settings.IMAGE_CACHE_ROOT, 'locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    stripe = int(hashlib.md5(path.encode()).hexdigest(), 16) % LOCK_STRIPES
+    with open(os.path.join(lock_dir, f'{stripe}.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def render(source_path, width, fmt, destination):
+    """Resize the source to (at most) `width` pixels wide & encode it."""
+    _, pil_format, _, options = fmt
+    with Image.open(source_path) as img:
+        # The displayed size: EXIF orientations 5-8 rotate the image by 90°.
+        rotated = img.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8)
+        displayed_width, displayed_height = img.size[::-1] if rotated else img.size
+        ratio = displayed_height / displayed_width
+        height = max(round(width * ratio), 1)
+        # JPEG: decode at a reduced scale directly (still >= the requested size);
+        # the box is in the stored (not yet rotated) orientation.
+        img.draft('RGB', (height, width) if rotated else (width, height))
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:  # never upscale
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        if pil_format == 'JPEG' or img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB' if pil_format == 'JPEG' else 'RGBA')
+
+        # Write & rename: readers never see a partially written file.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                img.save(tmp_file, format=pil_format, **options)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def get_rendition(source_name, source_path, width, fmt):
+    """Return the path of the cached rendition, rendering it if needed."""
+    path = get_cache_path(source_name, source_path, width, fmt)
+    if _touch(path):
+        return path
+
+    with variant_lock(path):
+        # Someone else may have rendered it while we were waiting for the lock.
+        if _touch(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        render(source_path, width, fmt, path)
+
+    _track(os.path.getsize(path))
+    return path
+
+
+def _touch(path):
+    """Mark a cached rendition as recently used; returns whether it exists."""
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _iter_cached_files():
+    with os.scandir(settings.IMAGE_CACHE_ROOT) as subdirs:
+        for subdir in subdirs:
+            if not subdir.is_dir() or subdir.name == 'locks':
+                continue
+            with os.scandir(subdir.path) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        yield entry
+
+
+def _track(size):
+    """Account for a new rendition & evict the least recently used ones if needed."""
+    root = settings.IMAGE_CACHE_ROOT
+    with _size_lock:
+        if root in _cache_sizes:
+            _cache_sizes[root] += size
+        else:
+            _cache_sizes[root] = sum(e.stat().st_size for e in _iter_cached_files())
+        if _cache_sizes[root] > settings.IMAGE_CACHE_MAX_BYTES:
+            _cache_sizes[root] = evict(settings.IMAGE_CACHE_MAX_BYTES * 0.9)
+
+
+def evict(target_bytes):
+    """Delete the least recently used renditions until the cache fits `target_bytes`."""
+    entries = [(e.stat().st_atime, e.stat().st_size, e.path) for e in _iter_cached_files()]
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # evicted by another process
+            pass
+        total -= size
+    return total
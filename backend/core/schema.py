@@ -0,0 +1,136 @@
+"""
+The OpenAPI schema, generated once per code version.
+
+drf-spectacular's `SpectacularAPIView` walks every view & serializer on each
+request. Here the schema is rendered once (JSON & YAML, plain & gzipped) &
+kept in memory; it's also written to `SCHEMA_CACHE_ROOT`, so other processes &
+restarts of the same code only read it back. The files are keyed by the code
+version (`CODE_VERSION`, or a hash of the sources & of the packages involved):
+a deploy means a new schema, nothing else does.
+
+`manage.py build_schema` builds the files ahead of time (e.g. in the image);
+`manage.py serve` loads them before forking (see `SERVER_WARM_UP_HOOKS`).
+"""
+import functools
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from importlib.metadata import version
+from pathlib import Path
+
+from django.conf import settings
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.plumbing import build_bearer_security_scheme_object
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+# format => (media type, renderer)
+FORMATS = {
+    'yaml': ('application/vnd.oai.openapi', OpenApiYamlRenderer),
+    'json': ('application/vnd.oai.openapi+json', OpenApiJsonRenderer),
+}
+# Packages that shape the schema (besides our own code).
+PACKAGES = ['Django', 'djangorestframework', 'drf-spectacular']
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """Documents `Authorization: Bearer <access token>`."""
+    target_class = 'core.authentication.SignedTokenAuthentication'
+    name = 'signedTokenAuth'
+
+    def get_security_definition(self, auto_schema):
+        return build_bearer_security_scheme_object(
+            header_name='Authorization', token_prefix='Bearer'
+        )
+
+
+class RenderedSchema:
+    def __init__(self, body, gzipped=None):
+        self.body = body
+        self.gzipped = gzipped if gzipped is not None else gzip.compress(body, mtime=0)
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+_lock = threading.Lock()
+_schemas = {}  # (code version, format) => RenderedSchema
+
+
+@functools.cache
+def get_code_version():
+    if settings.CODE_VERSION:
+        return settings.CODE_VERSION
+    digest = hashlib.sha256()
+    for package in PACKAGES:
+        digest.update(f'{package}=={version(package)}\n'.encode())
+    base_dir = Path(settings.BASE_DIR)
+    for path in sorted(base_dir.rglob('*.py')):
+        digest.update(str(path.relative_to(base_dir)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def get_schema_path(code_version, fmt):
+    return os.path.join(settings.SCHEMA_CACHE_ROOT, f'schema-{code_version}.{fmt}')
+
+
+def generate():
+    """Render the schema in every format: `{format: bytes}`."""
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    return {
+        fmt: renderer().render(schema, renderer_context={})
+        for fmt, (_, renderer) in FORMATS.items()
+    }
+
+
+def save(code_version, fmt, rendered):
+    """Write the files (atomically); best effort: the schema is in memory anyway."""
+    try:
+        os.makedirs(settings.SCHEMA_CACHE_ROOT, exist_ok=True)
+        for suffix, content in (('', rendered.body), ('.gz', rendered.gzipped)):
+            fd, tmp_path = tempfile.mkstemp(dir=settings.SCHEMA_CACHE_ROOT, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, get_schema_path(code_version, fmt) + suffix)
+    except OSError:
+        pass
+
+
+def load(code_version, fmt):
+    path = get_schema_path(code_version, fmt)
+    try:
+        with open(path, 'rb') as f, open(path + '.gz', 'rb') as gz:
+            return RenderedSchema(f.read(), gz.read())
+    except FileNotFoundError:
+        return None
+
+
+def build(force=False):
+    """Make sure every format is in memory (& on disk); returns `{format: RenderedSchema}`."""
+    code_version = get_code_version()
+    with _lock:
+        if not force:
+            for fmt in FORMATS:
+                if (code_version, fmt) not in _schemas:
+                    rendered = load(code_version, fmt)
+                    if rendered is not None:
+                        _schemas[code_version, fmt] = rendered
+        missing = [fmt for fmt in FORMATS if (code_version, fmt) not in _schemas]
+        if force or missing:
+            for fmt, body in generate().items():
+                _schemas[code_version, fmt] = RenderedSchema(body)
+                save(code_version, fmt, _schemas[code_version, fmt])
+        return {fmt: _schemas[code_version, fmt] for fmt in FORMATS}
+
+
+def get_schema(fmt):
+    rendered = _schemas.get((get_code_version(), fmt))
+    if rendered is None:
+        rendered = build()[fmt]
+    return rendered
+
+
+def clear():
+    with _lock:
+        _schemas.clear()
@@ -0,0 +1,134 @@
+"""
+Denormalized tags & ingredients of the recipes: `Recipe.tags_snapshot` &
+`Recipe.ingredients_snapshot`.
+
+They hold what `TagSerializer` / `IngredientSerializer` render (`{id, name}`,
+ordered by id), so `RecipeSerializer` reads them from the recipe row instead
+of querying the M2M tables. They're refreshed in the transaction of the
+change, by the signals below: a tag / ingredient added to or removed from a
+recipe (`m2m_changed`, both directions), renamed or deleted.
+
+`Recipe.save()` leaves them out (unless listed in `update_fields`): a full
+save of a recipe loaded before a tag change doesn't write the stale values
+back. Writes that bypass the signals (raw SQL, `QuerySet.update()` of a name,
+...) leave drift behind: `manage.py check_recipe_snapshots --repair` finds &
+fixes it.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+
+# relation: its model
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
+BATCH_SIZE = 500
+
+
+def get_field(relation):
+    return f'{relation}_snapshot'
+
+
+def get_relation(model):
+    return next(relation for relation, related in RELATIONS.items() if related is model)
+
+
+def compute(recipe_ids, relations=RELATIONS):
+    """`{recipe id: {relation: snapshot}}` as the M2M tables have it."""
+    snapshots = {pk: {relation: [] for relation in relations} for pk in recipe_ids}
+    for relation in relations:
+        through = getattr(Recipe, relation).through
+        name = RELATIONS[relation]._meta.model_name  # the through model's FK: 'tag', ...
+        rows = (
+            through.objects.filter(recipe_id__in=snapshots)
+            .order_by(f'{name}_id')
+            .values_list('recipe_id', f'{name}_id', f'{name}__name')
+        )
+        for recipe_id, pk, value in rows:
+            snapshots[recipe_id][relation].append({'id': pk, 'name': value})
+    return snapshots
+
+
+def save(snapshots, relations=RELATIONS):
+    """Write `compute()`'s output to the recipes."""
+    recipes = [
+        Recipe(pk=pk, **{get_field(relation): values[relation] for relation in relations})
+        for pk, values in snapshots.items()
+    ]
+    fields = [get_field(relation) for relation in relations]
+    Recipe.objects.bulk_update(recipes, fields, batch_size=BATCH_SIZE)
+
+
+def refresh(recipe_ids, relations=RELATIONS, instance=None):
+    """
+    Recompute the snapshots of these recipes.
+
+    `instance`: a recipe in memory that's updated as well (e.g. the one a
+    serializer renders next).
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    snapshots = compute(recipe_ids, relations)
+    save(snapshots, relations)
+    if instance is not None and instance.pk in snapshots:
+        for relation in relations:
+            setattr(instance, get_field(relation), snapshots[instance.pk][relation])
+
+
+def get_recipe_ids(model, pk):
+    """The recipes a tag / ingredient belongs to."""
+    through = getattr(Recipe, get_relation(model)).through
+    return set(
+        through.objects.filter(**{f'{model._meta.model_name}_id': pk})
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    relation = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    if not reverse:  # recipe.tags.add(...): `instance` is the recipe
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh([instance.pk], [relation], instance=instance)
+        return
+
+    # tag.recipe_set.add(...): `pk_set` holds recipe ids, except for clear().
+    if action == 'pre_clear':
+        instance._snapshot_recipe_ids = get_recipe_ids(type(instance), instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        refresh(pk_set, [relation])
+    elif action == 'post_clear':
+        refresh(instance.__dict__.pop('_snapshot_recipe_ids', ()), [relation])
+
+
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Ingredient)
+def check_rename(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._renamed = False
+        return
+    old = sender.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+    instance._renamed = old is not None and old != instance.name
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def renamed(sender, instance, **kwargs):
+    if instance.__dict__.pop('_renamed', False):
+        refresh(get_recipe_ids(sender, instance.pk), [get_relation(sender)])
+
+
+# The M2M rows of a deleted tag go by CASCADE, without `m2m_changed`.
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_recipes(sender, instance, **kwargs):
+    instance._snapshot_recipe_ids = get_recipe_ids(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def deleted(sender, instance, **kwargs):
+    recipe_ids = instance.__dict__.pop('_snapshot_recipe_ids', ())
+    refresh(recipe_ids, [get_relation(sender)])
@@ -0,0 +1,152 @@
+"""
+Static files (the admin's, ...): hashed names, precompressed & served with
+long-lived cache headers.
+
+`collectstatic` (with `CompressedManifestStaticFilesStorage`) copies every
+file under a name that includes a hash of its content (e.g.
+`admin/css/base.5af66c1b1797.css`; `{% static %}` resolves to these) & writes
+a `.gz` & a `.br` (brotli) next to the text ones, in parallel across the
+CPUs: the best compression levels are slow, but it's done once per deploy.
+
+`serve_static` sends the smallest variant the client accepts, hashed files
+with an immutable `Cache-Control` (a new version gets a new name).
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+from django.views.decorators.http import require_safe
+
+from core import compression
+from core.media import DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL, serve_file
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Text formats: the others (images, woff2, ...) are compressed already.
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ttf', '.otf', '.eot', '.ico',
+}
+# Compressed variants saving less than this aren't worth a file (& a request path).
+MIN_SAVING = 0.05
+
+# encoding: file suffix (preferred first)
+VARIANTS = {'br': '.br', 'gzip': '.gz'}
+
+
+def compress_file(path):
+    """Write the `.gz` & `.br` variants of the file at `path`; returns their paths."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < settings.COMPRESSION_MIN_SIZE:
+        return []
+
+    written = []
+    # mtime=0: the same file always gets the same .gz.
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) > len(data) * (1 - MIN_SAVING):
+            continue
+        with open(path + suffix, 'wb') as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+def get_worker_count():
+    if settings.STATIC_COMPRESSION_WORKERS:
+        return settings.STATIC_COMPRESSION_WORKERS
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """`ManifestStaticFilesStorage` + `.gz` & `.br` variants of the hashed files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        to_compress = sorted({
+            self.path(name) for name in self.hashed_files.values()
+            if posixpath.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+        })
+        # A hashed name always has the same content: compressed by a previous deploy.
+        to_compress = [
+            path for path in to_compress
+            if not any(os.path.exists(path + suffix) for suffix in VARIANTS.values())
+        ]
+        workers = min(get_worker_count(), len(to_compress))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(compress_file, to_compress, chunksize=8))
+        else:
+            for path in to_compress:
+                compress_file(path)
+
+    def stored_name(self, name):
+        # Before the first `collectstatic` (development, tests) there's no
+        # manifest: the files keep their names.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    @cached_property
+    def hashed_names(self):
+        return frozenset(self.hashed_files.values())
+
+
+@require_safe
+def serve_static(request, path):
+    """Serve a file from `STATIC_ROOT`: /static/static/<path>"""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:  # path traversal
+        raise Http404('File does not exist.')
+    # The variants are only served as a Content-Encoding of their file.
+    if path.endswith(tuple(VARIANTS.values())) or not os.path.isfile(full_path):
+        raise Http404('File does not exist.')
+
+    hashed_names = getattr(staticfiles_storage, 'hashed_names', ())
+    cache_control = IMMUTABLE_CACHE_CONTROL if path in hashed_names else DEFAULT_CACHE_CONTROL
+
+    available = [
+        encoding for encoding, suffix in VARIANTS.items()
+        if os.path.isfile(full_path + suffix)
+    ]
+    encoding = None
+    if available:
+        encoding = compression.negotiate(
+            request.headers.get('Accept-Encoding', ''), available
+        )
+    if encoding is None:
+        response = serve_file(request, full_path, cache_control=cache_control)
+    else:
+        # The type of the original, not of a .gz / .br file.
+        response = serve_file(
+            request, full_path + VARIANTS[encoding], cache_control=cache_control,
+            content_type=mimetypes.guess_type(full_path)[0],
+        )
+        response.headers['Content-Encoding'] = encoding
+    if available:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,245 @@
+"""
+Tests for the cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core import tokens
+from core.authentication import SignedTokenAuthentication, token_cache
+from user.serializers import UserSerializer
+
+PROFILE_URL = reverse('user:me')
+METRICS_URL = reverse('metrics')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test caching the token => user lookups."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!', name='Skye'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_lookup_is_cached(self):
+        # The token lookup + the profile (always loaded fresh).
+        with self.assertNumQueries(2):
+            res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['hit_ratio'], 0.5)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(PROFILE_URL)
+
+        self.token.delete()
+
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(PROFILE_URL)
+
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates(self):
+        self.client.get(PROFILE_URL)
+
+        self.user.set_password('Something else!')
+        self.user.save()
+
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_updates_do_not_leak_into_the_cache(self):
+        self.client.get(PROFILE_URL)
+
+        # Modifies `request.user`; the cached user must not be affected in the meantime.
+        with patch.object(get_user_model(), 'save'):
+            self.client.patch(PROFILE_URL, {'name': 'Changed'})
+
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.data['name'], 'Skye')
+
+    def test_profile_update_keeps_db_values(self):
+        """A stale cached user isn't written back."""
+        self.client.get(PROFILE_URL)
+        cached_user = token_cache.get(self.token.key)[0]
+        # Deactivated by another server process: no signal reaches this one's cache.
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+
+        serializer = UserSerializer(cached_user, {'name': 'Changed'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Changed')
+        self.assertFalse(self.user.is_active)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=-1)
+    def test_expired_entries_are_looked_up_again(self):
+        self.client.get(PROFILE_URL)
+
+        with self.assertNumQueries(2):
+            self.client.get(PROFILE_URL)
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        other_user = get_user_model().objects.create_user(
+            email='user2@example.com', password='Whatever!'
+        )
+        other_token = Token.objects.create(user=other_user)
+        self.client.get(PROFILE_URL)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_token.key}')
+        self.client.get(PROFILE_URL)
+
+        self.assertEqual(token_cache.stats()['size'], 1)
+        self.assertIsNone(token_cache.get(self.token.key))
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    """Test authenticating with signed access tokens."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!', name='Skye'
+        )
+        self.client = APIClient()
+        tokens.revocations.reload()
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_no_db_query(self):
+        access = tokens.issue_token(self.user, tokens.ACCESS)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        with self.assertNumQueries(0):
+            user, claims = SignedTokenAuthentication().authenticate(request)
+
+        self.assertEqual((user.pk, user.email), (self.user.pk, self.user.email))
+        # Other fields are loaded on demand.
+        self.assertEqual(user.name, 'Skye')
+
+    def test_profile(self):
+        self.authenticate(tokens.issue_token(self.user, tokens.ACCESS))
+
+        res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'Skye')
+
+    def test_invalid_tokens(self):
+        access = tokens.issue_token(self.user, tokens.ACCESS)
+        refresh = tokens.issue_token(self.user, tokens.REFRESH)
+
+        for token in (access[:-2], refresh, 'nope'):
+            self.authenticate(token)
+            res = self.client.get(PROFILE_URL)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(SIGNED_TOKEN_ACCESS_LIFETIME=-1)
+    def test_expired_token(self):
+        self.authenticate(tokens.issue_token(self.user, tokens.ACCESS))
+
+        res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_tokens(self):
+        access = tokens.issue_token(self.user, tokens.ACCESS)
+
+        self.user.set_password('Something else!')
+        self.user.save()
+
+        self.authenticate(access)
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        # Other processes pick it up on their next reload.
+        tokens.revocations.reload()
+        self.assertIn(self.user.pk, tokens.revocations.users)
+
+    def test_permission_change_revokes_tokens(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.authenticate(tokens.issue_token(self.user, tokens.ACCESS))
+
+        self.user.is_staff = False
+        self.user.save()
+
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_keeps_db_values(self):
+        """The claims of the token aren't written back to the user."""
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.authenticate(tokens.issue_token(self.user, tokens.ACCESS))
+        # E.g. demoted while this process' revocations weren't reloaded yet.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_staff=False, is_superuser=False
+        )
+
+        res = self.client.patch(PROFILE_URL, {'name': 'Changed'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Changed')
+        self.assertFalse(self.user.is_staff)
+        self.assertFalse(self.user.is_superuser)
+
+    def test_other_changes_keep_tokens(self):
+        self.authenticate(tokens.issue_token(self.user, tokens.ACCESS))
+
+        self.user.name = 'Changed'
+        self.user.save()
+
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class MetricsAPITests(TestCase):
+    """Test the in-process metrics API."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_metrics_staff_only(self):
+        user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics(self):
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('hit_ratio', res.data['auth_token_cache'])
@@ -1,33 +1,364 @@
 """
 Test custom Django management commands.
 """
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import MagicMock, mock_open, patch
 
-from unittest.mock import patch
-
+from PIL import Image
 from psycopg2 import OperationalError as Psycopg2OpError
 
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
 # We simply mock database; no need to actually create/destroy => SimpleTestCase is sufficient
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from core import health, images
+from core.management.commands import serve
+from core.management.commands.reprocess_images import TokenBucket
+from core.models import Recipe
+from core.tests.test_images import create_image_file
 
 
-@patch('core.management.commands.wait_for_db.Command.check')
 class CommandTests(SimpleTestCase):
-    def test_wait_for_db_ready(self, patched_check):
-        """Make sure if db is ready to connect."""
-        patched_check.return_value = True
+    """Test waiting for the dependencies (the checks themselves are mocked)."""
 
-        call_command('wait_for_db')
+    def setUp(self):
+        self.checks = {name: MagicMock(return_value=None) for name in health.CHECKS}
+        patcher = patch.dict(health.CHECKS, self.checks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_wait_for_db_ready(self):
+        """Make sure if db is ready to connect."""
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
 
-        patched_check.assert_called_once_with(databases=['default'])
+        for check in self.checks.values():
+            check.assert_called_once_with()
+        self.assertIn('All dependencies available', out.getvalue())
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(self, patched_sleep):
         n, m = 2, 3
-        patched_check.side_effect = [Psycopg2OpError] * n + [OperationalError] * m + [True]
+        self.checks['database'].side_effect = (
+            [Psycopg2OpError] * n + [OperationalError] * m + [None]
+        )
+
+        call_command('wait_for_db', stdout=StringIO())
+
+        self.assertEqual(self.checks['database'].call_count, n+m+1)
+        # Only the failed checks are retried.
+        self.checks['cache'].assert_called_once_with()
+        # Exponential backoff, from a few ms.
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(len(delays), n+m)
+        self.assertLess(delays[0], 0.01)
+        self.assertGreater(delays[-1], delays[0])
+
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(self, patched_sleep):
+        self.checks['media'].side_effect = PermissionError('read-only')
+
+        with self.assertRaisesRegex(CommandError, 'waiting for: media.$'):
+            call_command('wait_for_db', '--timeout=0.2', stdout=StringIO())
+
+    def test_wait_for_selected_checks(self):
+        call_command('wait_for_db', '--checks', 'database', stdout=StringIO())
+
+        self.checks['database'].assert_called_once_with()
+        self.checks['media'].assert_not_called()
+
+
+class GCMediaCommandTests(TestCase):
+    """Test the orphaned media garbage collector."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.upload_dir = os.path.join(self.media_root, 'uploads', 'recipe')
+        os.makedirs(self.upload_dir)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.referenced = self.create_file('referenced.jpg')
+        self.orphan = self.create_file('orphan.jpg')
+        self.fresh_orphan = self.create_file('fresh.jpg', age=0)
+        Recipe.objects.create(
+            user=user, title='Sample', time_minutes=5, cost=Decimal('1.00'),
+            image='uploads/recipe/referenced.jpg'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def create_file(self, name, age=48 * 3600):
+        path = os.path.join(self.upload_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_gc_media_deletes_old_orphans(self):
+        out = StringIO()
+        call_command('gc_media', batch_size=2, stdout=out)
+
+        self.assertTrue(os.path.exists(self.referenced))
+        self.assertTrue(os.path.exists(self.fresh_orphan))  # within the grace period
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertIn('Scanned 3 files', out.getvalue())
+        self.assertIn('Deleted 1 orphaned files', out.getvalue())
+
+    def test_gc_media_dry_run(self):
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertIn('Would remove 1 orphaned files', out.getvalue())
+
+    def test_gc_media_quarantine(self):
+        quarantine = os.path.join(self.media_root, 'quarantine')
+        call_command('gc_media', quarantine=quarantine, stdout=StringIO())
+
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertTrue(
+            os.path.exists(os.path.join(quarantine, 'uploads', 'recipe', 'orphan.jpg'))
+        )
+
+
+class BackfillPhashCommandTests(TestCase):
+    """Test computing the perceptual hash of existing images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'uploads', 'recipe'))
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        with open(os.path.join(self.media_root, 'uploads', 'recipe', 'a.png'), 'wb') as f:
+            f.write(create_image_file().read())
+        defaults = {'user': user, 'title': 'Sample', 'time_minutes': 5, 'cost': Decimal('1')}
+        self.recipe = Recipe.objects.create(image='uploads/recipe/a.png', **defaults)
+        self.missing = Recipe.objects.create(image='uploads/recipe/missing.png', **defaults)
+        self.no_image = Recipe.objects.create(**defaults)
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def test_backfill_phash(self):
+        out, err = StringIO(), StringIO()
+        call_command('backfill_phash', stdout=out, stderr=err)
+
+        self.recipe.refresh_from_db()
+        self.assertIsNotNone(self.recipe.image_phash)
+        self.assertIsNotNone(self.recipe.image_phash_3)
+        self.assertIn('Hashed 1 images (1 failed)', out.getvalue())
+        self.assertIn(f'Recipe {self.missing.id}', err.getvalue())
+
+
+class ReprocessImagesCommandTests(TestCase):
+    """Test recomputing the metadata of all recipe images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'uploads', 'recipe'))
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+
+        user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        defaults = {'user': user, 'title': 'Sample', 'time_minutes': 5, 'cost': Decimal('1')}
+        self.recipes = []
+        for name, size in [('a.png', (20, 10)), ('b.png', (30, 10))]:
+            with open(os.path.join(self.media_root, 'uploads', 'recipe', name), 'wb') as f:
+                f.write(create_image_file(size=size).read())
+            self.recipes.append(
+                Recipe.objects.create(image=f'uploads/recipe/{name}', **defaults)
+            )
+        self.missing = Recipe.objects.create(image='uploads/recipe/missing.png', **defaults)
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def reprocess(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'reprocess_images', workers=1, chunk_size=2, checkpoint=self.checkpoint,
+            stdout=out, stderr=err, **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_reprocess_images(self):
+        out, err = self.reprocess()
+
+        for recipe, width in zip(self.recipes, (20, 30)):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image_width, width)
+            self.assertIsNotNone(recipe.image_phash)
+        self.assertIn('Reprocessed 2 images (1 failed)', out)
+        self.assertIn(f'Recipe {self.missing.id}', err)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['last_id'], self.missing.id)
+
+    def test_resume(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'last_id': self.recipes[0].id, 'done': 1, 'failed': 0}, f)
+
+        out, _ = self.reprocess(resume=True)
+
+        self.recipes[0].refresh_from_db()
+        self.recipes[1].refresh_from_db()
+        self.assertIsNone(self.recipes[0].image_width)
+        self.assertEqual(self.recipes[1].image_width, 30)
+        self.assertIn('Reprocessed 2 images (1 failed)', out)
+
+    @patch('core.management.commands.reprocess_images.time.sleep')
+    def test_token_bucket(self, patched_sleep):
+        bucket = TokenBucket(rate=100)
+
+        bucket.consume(60)
+        patched_sleep.assert_not_called()
+        bucket.consume(90)  # 50 tokens short => ~0.5s
+        self.assertAlmostEqual(patched_sleep.call_args.args[0], 0.5, places=2)
+
+
+class OptimizeImagesCommandTests(TestCase):
+    """Test re-encoding stored recipe images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'uploads', 'recipe'))
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[0x927C] = b'\x00' * 8192  # a bulky MakerNote
+        self.jpeg = self.create_file('a.jpg', create_image_file(
+            size=(64, 64), img_format='JPEG', exif=exif
+        ))
+        # Already as compact as it gets.
+        self.png = self.create_file('b.png', create_image_file(size=(8, 8)))
+
+        defaults = {'user': user, 'title': 'Sample', 'time_minutes': 5, 'cost': Decimal('1')}
+        self.recipe = Recipe.objects.create(image=self.jpeg, **defaults)
+        self.optimal = Recipe.objects.create(image=self.png, **defaults)
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def create_file(self, name, img_file):
+        data = img_file.read()
+        optimized = images.recompress_image(img_file) if name.endswith('png') else None
+        with open(os.path.join(self.media_root, 'uploads', 'recipe', name), 'wb') as f:
+            f.write(optimized or data)
+        return f'uploads/recipe/{name}'
+
+    def test_optimize_images(self):
+        out = StringIO()
+        call_command('optimize_images', stdout=out)
+
+        self.recipe.refresh_from_db()
+        # Stored under a new name; the old file is left for `gc_media`.
+        self.assertNotEqual(self.recipe.image.name, self.jpeg)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, self.jpeg)))
+        self.assertGreater(self.recipe.image_bytes_saved, 8192)
+        self.optimal.refresh_from_db()
+        self.assertEqual(self.optimal.image.name, self.png)
+        self.assertEqual(self.optimal.image_bytes_saved, 0)
+        self.assertIn('Optimized 1 images (0 failed)', out.getvalue())
+
+        # Processed images are skipped afterwards.
+        out = StringIO()
+        call_command('optimize_images', stdout=out)
+        self.assertIn('Optimized 0 images', out.getvalue())
+
+    def test_optimize_images_dry_run(self):
+        out = StringIO()
+        call_command('optimize_images', dry_run=True, stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, self.jpeg)
+        self.assertIsNone(self.recipe.image_bytes_saved)
+        self.assertIn('Would optimize 1 images', out.getvalue())
+
+
+warm_up_calls = []
+
+
+def record_warm_up():
+    warm_up_calls.append(True)
+
+
+class ServeCommandTests(SimpleTestCase):
+    """Test the production server's configuration (the server isn't started)."""
+
+    @patch('os.sched_getaffinity', return_value={0, 1, 2, 3, 4, 5, 6, 7})
+    def test_cpu_count_bounded_by_cgroup_quota(self, patched_affinity):
+        with patch('builtins.open', mock_open(read_data='250000 100000\n')):
+            self.assertEqual(serve.get_cpu_count(), 3)
+
+        with patch('builtins.open', mock_open(read_data='max 100000\n')):
+            self.assertEqual(serve.get_cpu_count(), 8)
+
+        with patch('builtins.open', side_effect=FileNotFoundError):
+            self.assertEqual(serve.get_cpu_count(), 8)
+
+    @override_settings(SERVER_MAX_WORKERS=12)
+    def test_worker_count(self):
+        self.assertEqual(serve.get_worker_count(2), 5)
+        self.assertEqual(serve.get_worker_count(32), 12)
+
+    @patch('core.management.commands.serve.get_cpu_count', return_value=2)
+    def test_print_config(self, patched_cpu_count):
+        out = StringIO()
+        call_command('serve', '--print-config', '--workers=0', '--threads=1', stdout=out)
+
+        config = out.getvalue()
+        self.assertIn("workers = 5", config)
+        self.assertIn("worker_class = 'sync'", config)
+        self.assertIn("preload_app = True", config)
+
+    def test_application_config(self):
+        options = serve.Command().get_options({
+            'bind': '127.0.0.1:9000', 'workers': 3, 'threads': 4, 'timeout': 20,
+            'pidfile': None,
+        })
+        app = serve.DjangoApplication(options)
+
+        self.assertEqual(app.cfg.workers, 3)
+        self.assertEqual(app.cfg.threads, 4)
+        self.assertEqual(app.cfg.worker_class_str, 'gthread')
+        self.assertTrue(app.cfg.preload_app)
+        self.assertEqual(app.cfg.address, [('127.0.0.1', 9000)])
+
+    @override_settings(SERVER_WARM_UP_HOOKS=[f'{__name__}.record_warm_up'])
+    @patch('gc.freeze')
+    @patch('core.management.commands.serve.connections')
+    def test_warm_up(self, patched_connections, patched_freeze):
+        warm_up_calls.clear()
 
-        call_command('wait_for_db')
+        serve.warm_up()
 
-        self.assertEqual(patched_check.call_count, n+m+1)
-        patched_check.assert_called_with(databases=['default'])
+        self.assertEqual(warm_up_calls, [True])
+        patched_connections.close_all.assert_called_once_with()
+        patched_freeze.assert_called_once_with()
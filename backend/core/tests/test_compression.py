@@ -0,0 +1,168 @@
+"""
+Tests for the response compression middleware.
+"""
+import gzip
+import zlib
+
+import brotli
+import zstandard
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import compression
+from core.middleware import CompressionMiddleware
+
+BODY = b'{"title": "Recipe with a longish title", "cost": "3.49"}' * 100
+
+
+def decompress(encoding, data):
+    if encoding == 'br':
+        return brotli.decompress(data)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress(data)
+
+
+class NegotiateTests(SimpleTestCase):
+    """Test picking the encoding from `Accept-Encoding`."""
+
+    def test_negotiate(self):
+        cases = [
+            ('gzip, deflate, br, zstd', 'br'),
+            ('gzip, deflate', 'gzip'),
+            ('gzip;q=1.0, br;q=0.5', 'gzip'),
+            ('zstd, gzip', 'zstd'),
+            ('*', 'br'),
+            ('*, br;q=0', 'zstd'),
+            ('identity', None),
+            ('gzip;q=0', None),
+            ('', None),
+            ('gzip;q=abc, deflate', None),
+        ]
+        for accept_encoding, expected in cases:
+            with self.subTest(accept_encoding):
+                self.assertEqual(compression.negotiate(accept_encoding), expected)
+
+    @override_settings(COMPRESSION_ENCODINGS=['gzip'])
+    def test_enabled_encodings(self):
+        self.assertEqual(compression.negotiate('br, gzip'), 'gzip')
+        self.assertIsNone(compression.negotiate('br, zstd'))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test compressing the responses."""
+
+    def setUp(self):
+        compression.stats.reset()
+        self.addCleanup(compression.stats.reset)
+
+    def get(self, response, path='/api/recipe/recipes/', accept_encoding='gzip, br, zstd'):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compress(self):
+        for encoding in ['gzip', 'br', 'zstd']:
+            with self.subTest(encoding):
+                response = HttpResponse(BODY, content_type='application/json')
+                response['ETag'] = '"abc"'
+
+                res = self.get(response, accept_encoding=encoding)
+
+                self.assertEqual(res['Content-Encoding'], encoding)
+                self.assertEqual(res['Vary'], 'Accept-Encoding')
+                self.assertEqual(res['ETag'], 'W/"abc"')
+                self.assertEqual(int(res['Content-Length']), len(res.content))
+                self.assertLess(len(res.content), len(BODY))
+                self.assertEqual(decompress(encoding, res.content), BODY)
+
+        snapshot = compression.stats.snapshot()['encodings']
+        self.assertEqual(set(snapshot), {'gzip', 'br', 'zstd'})
+        self.assertEqual(snapshot['gzip']['bytes_in'], len(BODY))
+        self.assertLess(snapshot['gzip']['ratio'], 0.1)
+
+    def test_small_body(self):
+        res = self.get(HttpResponse(b'{"id": 1}', content_type='application/json'))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.content, b'{"id": 1}')
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(compression.stats.snapshot()['too_small'], 1)
+
+    def test_not_accepted(self):
+        res = self.get(HttpResponse(BODY), accept_encoding='identity')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.content, BODY)
+
+    def test_skip(self):
+        encoded = HttpResponse(BODY, content_type='application/json')
+        encoded['Content-Encoding'] = 'gzip'
+        no_transform = HttpResponse(BODY)
+        no_transform['Cache-Control'] = 'no-transform'
+        cases = [
+            ('image', HttpResponse(BODY, content_type='image/webp'), '/api/'),
+            ('zip', HttpResponse(BODY, content_type='application/zip'), '/api/'),
+            ('media', HttpResponse(BODY, content_type='text/plain'), '/static/media/a.txt'),
+            ('encoded', encoded, '/api/'),
+            ('no-transform', no_transform, '/api/'),
+            ('partial', HttpResponse(BODY, status=206), '/api/'),
+        ]
+        for name, response, path in cases:
+            with self.subTest(name):
+                encoding = response.get('Content-Encoding')
+
+                res = self.get(response, path=path)
+
+                self.assertEqual(res.get('Content-Encoding'), encoding)
+                self.assertEqual(res.content, BODY)
+
+    def test_svg(self):
+        res = self.get(HttpResponse(BODY, content_type='image/svg+xml'))
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+
+    def test_streaming(self):
+        """Every chunk is sent (compressed) as soon as it's produced."""
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield BODY
+
+        res = self.get(StreamingHttpResponse(chunks()), accept_encoding='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        content = iter(res.streaming_content)
+        first = next(content)
+        self.assertEqual(produced, [0])
+        # The first chunk decompresses on its own (the compressor was flushed).
+        self.assertEqual(zlib.decompressobj(31).decompress(first), BODY)
+        self.assertEqual(gzip.decompress(first + b''.join(content)), BODY * 3)
+        snapshot = compression.stats.snapshot()['encodings']['gzip']
+        self.assertEqual(snapshot['bytes_in'], len(BODY) * 3)
+
+    def test_streaming_small_file(self):
+        """Streaming bodies of a known, small size are sent as is."""
+        res = self.get(FileResponse(iter([b'x']), headers={'Content-Length': '1'}))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    async def test_async_streaming(self):
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+
+        async def view(request):
+            return StreamingHttpResponse(chunks())
+
+        middleware = CompressionMiddleware(view)
+        request = RequestFactory().get('/api/', HTTP_ACCEPT_ENCODING='zstd')
+
+        res = await middleware(request)
+
+        self.assertEqual(res['Content-Encoding'], 'zstd')
+        content = b''.join([chunk async for chunk in res.streaming_content])
+        self.assertEqual(decompress('zstd', content), BODY * 3)
@@ -0,0 +1,221 @@
+"""
+Tests for the read replica router.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.functional import SimpleLazyObject
+
+from core import db_router
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+REPLICAS = ['replica_0', 'replica_1']
+# The pins must be shared by the server processes.
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'test_cache',
+    }
+}
+
+
+@override_settings(
+    DATABASE_REPLICAS=REPLICAS, DB_REPLICA_HEALTH_INTERVAL=10, CACHES=SHARED_CACHES
+)
+class ReplicaRouterTests(TestCase):
+    """Test routing reads to the replicas."""
+
+    def setUp(self):
+        call_command('createcachetable')
+        cache.clear()
+        db_router.health.reset()
+        self.addCleanup(db_router.health.reset)
+        patcher = patch.object(db_router.health, 'check', return_value=True)
+        self.check = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.router = db_router.ReplicaRouter()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+
+    def in_request(self, method='GET', user=None):
+        request = RequestFactory().generic(method, '/api/recipe/recipes/')
+        request.user = self.user if user is None else user
+        state = db_router.RequestState(request)
+        token = db_router._request_state.set(state)
+        self.addCleanup(db_router._request_state.reset, token)
+        return state
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_safe_reads_use_replicas_round_robin(self):
+        self.in_request()
+        used = {self.router.db_for_read(Recipe) for _ in range(4)}
+        self.assertEqual(used, set(REPLICAS))
+
+    def test_unsafe_requests_use_primary(self):
+        self.in_request('POST')
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_unresolved_or_anonymous_user_uses_primary(self):
+        self.in_request(user=SimpleLazyObject(lambda: self.user))
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+        self.in_request(user=AnonymousUser())
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_process_local_cache_rejected(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            with self.assertRaises(ImproperlyConfigured):
+                db_router.ReplicaRouter()
+            with override_settings(DATABASE_REPLICAS=[]):
+                db_router.ReplicaRouter()
+
+    def test_pin_lookups_use_primary(self):
+        """The database cache is read from the primary (the pins can't lag)."""
+        self.in_request()
+        self.assertIsNone(self.router.db_for_read(cache.cache_model_class))
+        self.assertIn(self.router.db_for_read(Recipe), REPLICAS)
+
+    def test_reads_after_a_write_use_primary(self):
+        self.in_request()
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_pinned_user_uses_primary(self):
+        db_router.pin_to_primary(self.user.pk)
+        self.in_request()
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_unhealthy_replica_is_skipped(self):
+        self.check.side_effect = lambda alias: alias == 'replica_1'
+        self.in_request()
+        used = {self.router.db_for_read(Recipe) for _ in range(4)}
+        self.assertEqual(used, {'replica_1'})
+
+    def test_no_healthy_replica_fails_over_to_primary(self):
+        self.check.return_value = False
+        self.in_request()
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_health_is_checked_once_per_interval(self):
+        self.in_request()
+        for _ in range(5):
+            self.router.db_for_read(Recipe)
+        self.assertEqual(self.check.call_count, len(REPLICAS))
+
+        with override_settings(DB_REPLICA_HEALTH_INTERVAL=0):
+            self.router.db_for_read(Recipe)
+        self.assertEqual(self.check.call_count, 2 * len(REPLICAS))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(
+    DATABASE_REPLICAS=REPLICAS, DB_READ_YOUR_WRITES_WINDOW=5, CACHES=SHARED_CACHES
+)
+class ReplicaRoutingMiddlewareTests(TestCase):
+    """Test pinning the users who write to the primary."""
+
+    def setUp(self):
+        call_command('createcachetable')
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+
+    def call(self, method, view):
+        request = RequestFactory().generic(method, '/api/recipe/recipes/')
+        request.user = self.user
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_write_pins_user(self):
+        def view(request):
+            Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, cost=1)
+            return HttpResponse()
+
+        self.call('GET', view)
+
+        self.assertTrue(db_router.is_pinned(self.user.pk))
+
+    def test_unsafe_request_pins_user(self):
+        self.call('DELETE', lambda request: HttpResponse())
+
+        self.assertTrue(db_router.is_pinned(self.user.pk))
+
+    def test_read_only_request_does_not_pin(self):
+        self.call('GET', lambda request: HttpResponse())
+
+        self.assertFalse(db_router.is_pinned(self.user.pk))
+        self.assertIsNone(db_router._request_state.get())
+
+    async def test_async_request_pins_user(self):
+        async def view(request):
+            return HttpResponse()
+
+        request = RequestFactory().generic('POST', '/api/recipe/recipes/')
+        request.user = self.user
+        await ReplicaRoutingMiddleware(view)(request)
+
+        self.assertTrue(await cache.aget(db_router.get_pin_key(self.user.pk)))
+
+
+# Committed data: the replica connection doesn't see the test case's transaction.
+@override_settings(DATABASE_REPLICAS=['replica_test'], CACHES=SHARED_CACHES)
+class ReplicaConnectionTests(TransactionTestCase):
+    """Test the reads really run on the replica's connection (a mirror of the primary)."""
+    databases = {'default', 'replica_test'}
+
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        cache.clear()
+        db_router.health.reset()
+        self.addCleanup(db_router.health.reset)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, cost=1)
+
+    def get_recipe_queries(self):
+        def view(request):
+            return HttpResponse(list(Recipe.objects.values_list('title', flat=True)))
+
+        request = RequestFactory().get('/api/recipe/recipes/')
+        request.user = self.user
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica_test']) as replica:
+            res = ReplicaRoutingMiddleware(view)(request)
+
+        self.assertEqual(res.content, b'Soup')
+        return {
+            alias: [q['sql'] for q in queries if 'core_recipe' in q['sql']]
+            for alias, queries in [('default', primary), ('replica_test', replica)]
+        }
+
+    def test_read_uses_replica(self):
+        queries = self.get_recipe_queries()
+
+        self.assertEqual(len(queries['replica_test']), 1)
+        self.assertEqual(queries['default'], [])
+
+    def test_pinned_read_uses_primary(self):
+        db_router.pin_to_primary(self.user.pk)
+
+        queries = self.get_recipe_queries()
+
+        self.assertEqual(len(queries['default']), 1)
+        self.assertEqual(queries['replica_test'], [])
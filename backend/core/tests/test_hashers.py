@@ -0,0 +1,82 @@
+"""
+Tests for the pooled password hasher.
+"""
+import os
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashers
+
+TOKEN_URL = reverse('user:token')
+
+
+class PooledHasherTests(SimpleTestCase):
+    """Test hashing passwords in the process pool."""
+
+    def setUp(self):
+        self.hasher = hashers.PooledPBKDF2PasswordHasher()
+
+    def test_same_hashes_as_django(self):
+        expected = PBKDF2PasswordHasher().encode('Whatever!', 'somesalt', 1000)
+
+        self.assertEqual(self.hasher.encode('Whatever!', 'somesalt', 1000), expected)
+        with override_settings(PASSWORD_HASHER_WORKERS=0):
+            self.assertEqual(self.hasher.encode('Whatever!', 'somesalt', 1000), expected)
+
+    def test_make_and_check_password(self):
+        encoded = make_password('Whatever!')
+
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+        self.assertTrue(check_password('Whatever!', encoded))
+        self.assertFalse(check_password('Nope', encoded))
+        self.assertGreater(hashers.metrics.snapshot()['hashes'], 0)
+
+    def test_broken_pool_is_replaced(self):
+        expected = PBKDF2PasswordHasher().encode('Whatever!', 'somesalt', 1000)
+        pool = hashers.get_hasher_pool()
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()  # e.g. OOM killed
+
+        self.assertEqual(self.hasher.encode('Whatever!', 'somesalt', 1000), expected)
+
+        self.assertIsNot(hashers.get_hasher_pool(), pool)
+        self.assertEqual(self.hasher.encode('Whatever!', 'somesalt', 1000), expected)
+
+    @override_settings(PASSWORD_HASHER_MAX_PENDING=0, PASSWORD_HASHER_QUEUE_TIMEOUT=0.01)
+    def test_busy(self):
+        rejected = hashers.metrics.snapshot()['rejected']
+
+        with self.assertRaises(hashers.HashingBusy):
+            self.hasher.encode('Whatever!', 'somesalt', 1000)
+
+        self.assertEqual(hashers.metrics.snapshot()['rejected'], rejected + 1)
+
+
+class LoginWhenBusyTests(TestCase):
+    """Test logins while the hasher is saturated."""
+
+    def test_login_busy(self):
+        client = APIClient()
+        payload = {'email': 'user1@example.com', 'password': 'Whatever!'}
+
+        with patch.object(hashers.PooledPBKDF2PasswordHasher, 'encode',
+                          side_effect=hashers.HashingBusy):
+            res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_admin_login_busy(self):
+        payload = {'username': 'user1@example.com', 'password': 'Whatever!'}
+
+        with patch.object(hashers.PooledPBKDF2PasswordHasher, 'encode',
+                          side_effect=hashers.HashingBusy):
+            res = self.client.post(reverse('admin:login'), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,59 @@
+"""
+Tests for the multi-index hashing helpers.
+"""
+import random
+
+from django.test import SimpleTestCase
+
+from core import hashindex
+
+
+class HashIndexTests(SimpleTestCase):
+    """Test near-duplicate lookups by multi-index hashing."""
+
+    def test_signed_roundtrip(self):
+        for value in (0, 1, 2**63 - 1, 2**63, 2**64 - 1):
+            signed = hashindex.to_signed(value)
+            self.assertTrue(-2**63 <= signed < 2**63)
+            self.assertEqual(hashindex.to_unsigned(signed), value)
+
+    def test_hash_fields(self):
+        fields = hashindex.hash_fields(0x0001000200030004)
+
+        self.assertEqual(fields['image_phash'], 0x0001000200030004)
+        self.assertEqual(
+            [fields[f] for f in hashindex.BAND_FIELDS], [0x0004, 0x0003, 0x0002, 0x0001]
+        )
+
+    def test_band_neighbours(self):
+        self.assertEqual(hashindex.band_neighbours(5, 0), [5])
+        neighbours = hashindex.band_neighbours(5, 1)
+        self.assertEqual(len(neighbours), 17)
+        self.assertTrue(all(bin(5 ^ n).count('1') <= 1 for n in neighbours))
+
+    def test_query_matches_brute_force(self):
+        rnd = random.Random(42)
+        base = [rnd.getrandbits(64) for _ in range(50)]
+        # Near-duplicates of every base hash: flip up to 7 random bits.
+        items = []
+        for i, value in enumerate(base):
+            items.append((i * 2, value))
+            for bit in rnd.sample(range(64), rnd.randint(0, 7)):
+                value ^= 1 << bit
+            items.append((i * 2 + 1, value))
+        index = hashindex.MultiIndexHash(items)
+
+        for max_distance in (0, 3, 4, 7, 10):
+            for _, query in items[:20]:
+                expected = sorted(
+                    (key, hashindex.hamming_distance(query, value))
+                    for key, value in items
+                    if hashindex.hamming_distance(query, value) <= max_distance
+                )
+                found = sorted(index.query(query, max_distance))
+                self.assertEqual(found, expected)
+
+    def test_pairs(self):
+        index = hashindex.MultiIndexHash([(1, 0b1011), (2, 0b1001), (3, 2**63)])
+
+        self.assertEqual(list(index.pairs(1)), [(1, 2, 1)])
@@ -0,0 +1,69 @@
+"""
+Tests for the dependency checks & the health endpoints.
+"""
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import health
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthTests(TestCase):
+    """Test the checks & the /healthz, /readyz endpoints."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_run_checks(self):
+        results = health.run_checks()
+
+        self.assertEqual(set(results), {'database', 'media', 'cache'})
+        self.assertTrue(all(result['ok'] for result in results.values()))
+        # The media check cleans up after itself.
+        self.assertEqual(os.listdir(os.path.join(self.media_root, '.healthcheck')), [])
+
+    def test_run_checks_timeout(self):
+        with patch.dict(health.CHECKS, {'cache': lambda: time.sleep(1)}):
+            results = health.run_checks(['cache'], timeout=0.05)
+
+        self.assertFalse(results['cache']['ok'])
+        self.assertIn('Timed out', results['cache']['error'])
+
+    def test_healthz(self):
+        with self.assertNumQueries(0):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readyz(self):
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['status'], 'ok')
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_readyz_unavailable(self):
+        def fail():
+            raise OSError('Read-only file system')
+
+        with patch.dict(health.CHECKS, {'media': fail}):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        checks = res.json()['checks']
+        self.assertFalse(checks['media']['ok'])
+        self.assertIn('Read-only file system', checks['media']['error'])
+        self.assertTrue(checks['database']['ok'])
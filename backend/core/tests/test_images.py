@@ -0,0 +1,106 @@
+"""
+Tests for the image processing helpers.
+"""
+import io
+from datetime import datetime, timedelta, timezone
+
+from PIL import Image
+
+from django.test import SimpleTestCase
+
+from core import images
+
+
+def create_image_file(size=(20, 10), color=(255, 0, 0), img_format='PNG', exif=None):
+    """Return an in-memory image file."""
+    img_file = io.BytesIO()
+    params = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', size, color).save(img_file, format=img_format, **params)
+    img_file.seek(0)
+    return img_file
+
+
+class ImageMetadataTests(SimpleTestCase):
+    """Test extracting image metadata."""
+
+    def test_extract_metadata(self):
+        img_file = create_image_file()
+
+        metadata = images.extract_image_metadata(img_file)
+
+        self.assertEqual(metadata['image_width'], 20)
+        self.assertEqual(metadata['image_height'], 10)
+        self.assertEqual(metadata['image_format'], 'PNG')
+        self.assertEqual(metadata['image_color'], '#ff0000')
+        self.assertIsNone(metadata['image_taken_at'])
+        # The file is ready to be saved to the storage.
+        self.assertEqual(img_file.tell(), 0)
+
+    def test_extract_exif_capture_time_and_orientation(self):
+        exif = Image.Exif()
+        exif[images.EXIF_ORIENTATION] = 6  # rotated 90 degrees
+        exif.get_ifd(images.EXIF_IFD)[images.EXIF_DATETIME_ORIGINAL] = '2024:05:01 12:30:00'
+        exif.get_ifd(images.EXIF_IFD)[images.EXIF_OFFSET_TIME_ORIGINAL] = '+02:00'
+        img_file = create_image_file(img_format='JPEG', exif=exif)
+
+        metadata = images.extract_image_metadata(img_file)
+
+        self.assertEqual((metadata['image_width'], metadata['image_height']), (10, 20))
+        self.assertEqual(
+            metadata['image_taken_at'],
+            datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc)
+        )
+        self.assertEqual(metadata['image_taken_at'].utcoffset(), timedelta(hours=2))
+
+    def test_blurhash_solid_color(self):
+        """The DC component (average colour) of a solid image is that colour."""
+        img = Image.new('RGB', (8, 8), (255, 0, 0))
+
+        blurhash = images.encode_blurhash(img)
+
+        self.assertEqual(len(blurhash), 28)  # 4x3 components
+        self.assertEqual(blurhash[0], images.BASE83_CHARS[3 + 2 * 9])
+        self.assertEqual(blurhash[2:6], images._encode_base83(0xff0000, 4))
+
+    def test_get_extension(self):
+        cases = [('JPEG', '.jpg'), ('MPO', '.jpg'), ('PNG', '.png'), ('WEBP', '.webp'),
+                 ('', '')]
+        for image_format, extension in cases:
+            with self.subTest(image_format):
+                self.assertEqual(images.get_extension(image_format), extension)
+
+
+class RecompressImageTests(SimpleTestCase):
+    """Test re-encoding images more compactly."""
+
+    def test_recompress_jpeg_keeps_orientation_and_capture_time(self):
+        exif = Image.Exif()
+        exif[images.EXIF_ORIENTATION] = 6
+        exif.get_ifd(images.EXIF_IFD)[images.EXIF_DATETIME_ORIGINAL] = '2024:05:01 12:30:00'
+        exif.get_ifd(images.EXIF_IFD)[0x927C] = b'\x00' * 4096  # MakerNote
+        img_file = create_image_file(size=(64, 32), img_format='JPEG', exif=exif)
+        original = img_file.getvalue()
+
+        data = images.recompress_image(img_file)
+
+        self.assertLess(len(data), len(original) - 4096)
+        with Image.open(io.BytesIO(data)) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (64, 32)))
+            new_exif = img.getexif()
+            self.assertEqual(new_exif[images.EXIF_ORIENTATION], 6)
+            self.assertNotIn(0x927C, new_exif.get_ifd(images.EXIF_IFD))
+        self.assertEqual(
+            images.extract_image_metadata(io.BytesIO(data))['image_taken_at'],
+            images.extract_image_metadata(img_file)['image_taken_at'],
+        )
+
+    def test_recompress_png_is_lossless(self):
+        img_file = create_image_file(size=(16, 16), img_format='PNG')
+
+        data = images.recompress_image(img_file)
+
+        with Image.open(img_file) as before, Image.open(io.BytesIO(data)) as after:
+            self.assertEqual(before.tobytes(), after.tobytes())
+
+    def test_recompress_unsupported_format(self):
+        self.assertIsNone(images.recompress_image(create_image_file(img_format='GIF')))
@@ -0,0 +1,168 @@
+"""
+Tests for the background job queue.
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+CALLS = []
+
+
+@jobs.job
+def record_call(value):
+    CALLS.append(value)
+
+
+@jobs.job
+def always_fail():
+    raise RuntimeError('boom')
+
+
+def not_a_job():
+    pass
+
+
+class JobQueueTests(TestCase):
+    """Test enqueueing, claiming & running jobs."""
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue_requires_job(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue(not_a_job)
+
+    def test_claim_and_execute(self):
+        job = jobs.enqueue(record_call, value=42)
+        self.assertEqual(job.name, 'core.tests.test_jobs.record_call')
+
+        claimed = jobs.claim_jobs('worker-1', limit=10)
+
+        self.assertEqual([j.id for j in claimed], [job.id])
+        self.assertEqual(claimed[0].status, Job.RUNNING)
+        self.assertEqual(claimed[0].attempts, 1)
+        # Already claimed => not handed out twice.
+        self.assertEqual(jobs.claim_jobs('worker-2', limit=10), [])
+
+        name, outcome, _ = jobs.execute_job(job.id)
+
+        self.assertEqual((name, outcome), (job.name, Job.DONE))
+        self.assertEqual(CALLS, [42])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_claim_only_due_jobs(self):
+        jobs.enqueue(record_call, value=1, run_at=timezone.now() + timedelta(hours=1))
+        due = [jobs.enqueue(record_call, value=i) for i in range(3)]
+
+        claimed = jobs.claim_jobs('worker-1', limit=2)
+
+        self.assertEqual([j.id for j in claimed], [j.id for j in due[:2]])
+
+    @override_settings(JOB_RETRY_BACKOFF=10)
+    def test_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue(always_fail, max_attempts=2)
+
+        jobs.claim_jobs('worker-1', limit=1)
+        _, outcome, _ = jobs.execute_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(outcome, 'retried')
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('RuntimeError: boom', job.last_error)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertTrue(4 < delay <= 15)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.claim_jobs('worker-1', limit=1)
+        _, outcome, _ = jobs.execute_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(outcome, Job.FAILED)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_requeue_stale_jobs(self):
+        job = jobs.enqueue(record_call, value=1)
+        jobs.claim_jobs('worker-1', limit=1)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_stale_job_out_of_attempts_fails(self):
+        job = jobs.enqueue(record_call, value=1, max_attempts=1)
+        jobs.claim_jobs('worker-1', limit=1)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn('worker died or hung', job.last_error)
+
+    def test_metrics(self):
+        metrics = jobs.JobMetrics()
+        metrics.record('a', Job.DONE, 0.2)
+        metrics.record('a', 'retried', 0.4)
+
+        stats = metrics.snapshot()
+
+        self.assertEqual((stats['runs'], stats['done'], stats['retried']), (2, 1, 1))
+        self.assertAlmostEqual(stats['avg_runtime'], 0.3)
+        self.assertEqual(stats['by_name']['a']['runs'], 2)
+
+
+class RunWorkerCommandTests(TransactionTestCase):
+    """Test the `run_worker` command (jobs run in other threads => real commits)."""
+
+    def setUp(self):
+        CALLS.clear()
+
+    @patch('core.jobs.get_retry_delay', return_value=0)
+    def test_run_worker_burst(self, patched_delay):
+        for i in range(5):
+            jobs.enqueue(record_call, value=i)
+        jobs.enqueue(always_fail, max_attempts=2)
+
+        out = StringIO()
+        call_command('run_worker', burst=True, concurrency=3, poll_interval=0.01, stdout=out)
+
+        self.assertEqual(sorted(CALLS), list(range(5)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 5)
+        self.assertEqual(Job.objects.filter(status=Job.FAILED).count(), 1)
+        self.assertIn('Jobs: 5 done, 1 retried, 1 failed', out.getvalue())
+
+    def test_run_worker_survives_errors(self):
+        crashing = jobs.enqueue(record_call, value=1)
+        jobs.enqueue(record_call, value=2)
+        execute_job = jobs.execute_job
+
+        def execute(job_id):
+            if job_id == crashing.id:
+                raise RuntimeError('connection lost')
+            return execute_job(job_id)
+
+        out, err = StringIO(), StringIO()
+        with patch('core.jobs.execute_job', side_effect=execute):
+            call_command(
+                'run_worker', burst=True, concurrency=1, poll_interval=0.01,
+                stdout=out, stderr=err,
+            )
+
+        self.assertEqual(CALLS, [2])
+        self.assertIn(f"Job {crashing.id}: RuntimeError('connection lost')", err.getvalue())
+        self.assertIn('Jobs: 1 done', out.getvalue())
+        # Left for `requeue_stale_jobs`.
+        self.assertEqual(Job.objects.get(pk=crashing.pk).status, Job.RUNNING)
@@ -0,0 +1,130 @@
+"""
+Tests for serving media files.
+"""
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core.media import parse_range
+
+
+def get_media_url(path):
+    return reverse('media', args=[path])
+
+
+class ParseRangeTests(SimpleTestCase):
+    """Test parsing the `Range` header."""
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+
+    def test_parse_range_ignored(self):
+        """Malformed & multi-range headers fall back to the full file."""
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-9', 100))
+
+    def test_parse_range_unsatisfiable(self):
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=9-1', 100)
+
+
+class ServeMediaTests(SimpleTestCase):
+    """Test the media serving view."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'uploads', 'recipe'))
+        self.content = bytes(range(256)) * 4
+        self.path = 'uploads/recipe/sample.jpg'
+        with open(os.path.join(self.media_root, self.path), 'wb') as f:
+            f.write(self.content)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def test_serve_full_file(self):
+        res = self.client.get(get_media_url(self.path))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(self.content)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('ETag', res)
+
+    def test_serve_byte_range(self):
+        res = self.client.get(get_media_url(self.path), HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), self.content[10:20])
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(self.content)}')
+
+    def test_range_not_satisfiable(self):
+        res = self.client.get(get_media_url(self.path), HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_serves_full_file(self):
+        res = self.client.get(
+            get_media_url(self.path), HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"'
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Length'], str(len(self.content)))
+
+    def test_conditional_request_not_modified(self):
+        etag = self.client.get(get_media_url(self.path))['ETag']
+        res = self.client.get(get_media_url(self.path), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_mutable_path_short_cache(self):
+        with open(os.path.join(self.media_root, 'readme.txt'), 'w') as f:
+            f.write('hello')
+
+        res = self.client.get(get_media_url('readme.txt'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('immutable', res['Cache-Control'])
+
+    def test_missing_file_and_traversal_not_found(self):
+        self.assertEqual(self.client.get(get_media_url('nope.jpg')).status_code, 404)
+        self.assertEqual(self.client.get(get_media_url('uploads')).status_code, 404)
+        self.assertEqual(self.client.get(get_media_url('../etc/passwd')).status_code, 404)
+
+    def test_unsafe_method_not_allowed(self):
+        res = self.client.post(get_media_url(self.path))
+
+        self.assertEqual(res.status_code, 405)
+
+    @override_settings(MEDIA_SERVE_BACKEND='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        res = self.client.get(get_media_url(self.path))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['X-Accel-Redirect'], '/protected-media/' + self.path)
+        self.assertEqual(res.content, b'')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    @override_settings(MEDIA_SERVE_BACKEND='x-sendfile')
+    def test_x_sendfile(self):
+        res = self.client.get(get_media_url(self.path))
+
+        self.assertEqual(res['X-Sendfile'], os.path.join(self.media_root, self.path))
+        self.assertEqual(res.content, b'')
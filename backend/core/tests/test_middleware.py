@@ -0,0 +1,105 @@
+"""
+Tests for running the browser-only middleware outside of the APIs only.
+"""
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware import BrowserMiddleware
+
+ADMIN_LOGIN_URL = reverse('admin:login')
+METRICS_URL = reverse('metrics')
+
+
+class SyncOnlyMiddleware:
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+
+class BrowserMiddlewareTests(SimpleTestCase):
+    """Test skipping the `BROWSER_MIDDLEWARE` for the API paths."""
+
+    def view(self, request):
+        return HttpResponse(str(hasattr(request, 'session')))
+
+    async def async_view(self, request):
+        return self.view(request)
+
+    def test_api(self):
+        request = RequestFactory().get('/api/recipe/recipes/')
+
+        res = BrowserMiddleware(self.view)(request)
+
+        self.assertEqual(res.content, b'False')
+        self.assertFalse(res.has_header('X-Frame-Options'))
+
+    def test_browser(self):
+        request = RequestFactory().get('/admin/')
+
+        res = BrowserMiddleware(self.view)(request)
+
+        self.assertEqual(res.content, b'True')
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+
+    def test_process_view(self):
+        """The CSRF check (`process_view()`) runs, outside of the APIs only."""
+        middleware = BrowserMiddleware(self.view)
+        for path, expected in [('/api/recipe/recipes/', None), ('/admin/', 403)]:
+            with self.subTest(path):
+                request = RequestFactory().post(path)
+                middleware(request)
+
+                res = middleware.process_view(request, self.view, (), {})
+
+                self.assertEqual(getattr(res, 'status_code', None), expected)
+
+    async def test_async(self):
+        middleware = BrowserMiddleware(self.async_view)
+
+        api = await middleware(RequestFactory().get('/api/recipe/recipes/'))
+        browser = await middleware(RequestFactory().get('/admin/'))
+
+        self.assertEqual(api.content, b'False')
+        self.assertEqual(browser.content, b'True')
+
+    @override_settings(BROWSER_MIDDLEWARE=[f'{__name__}.SyncOnlyMiddleware'])
+    def test_sync_only_middleware(self):
+        with self.assertRaises(ImproperlyConfigured):
+            BrowserMiddleware(self.view)
+
+
+class BrowserMiddlewareClientTests(TestCase):
+    """Test the middleware stacks through the whole request handling."""
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_admin_login(self):
+        get_user_model().objects.create_superuser(
+            email='admin@example.com', password='Whatever!'
+        )
+        page = self.client.get(ADMIN_LOGIN_URL)
+
+        res = self.client.post(ADMIN_LOGIN_URL, {
+            'username': 'admin@example.com',
+            'password': 'Whatever!',
+            'csrfmiddlewaretoken': page.context['csrf_token'],
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertIn('sessionid', res.cookies)
+
+    def test_api_no_session(self):
+        """API requests don't touch the session, even with a session cookie."""
+        self.client.cookies['sessionid'] = 'unknown'
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertNotIn('sessionid', res.cookies)
+        self.assertFalse(res.has_header('X-Frame-Options'))
@@ -0,0 +1,144 @@
+"""
+Tests for the orjson & MessagePack renderers & parsers.
+"""
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import msgpack
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+SAMPLE = {
+    'id': 1,
+    'title': 'Crème brûlée   "quoted" / ✓',
+    'cost': '3.49',
+    'rating': 4.5,
+    'tags': [{'id': 1, 'name': 'Dessert'}, {'id': 2, 'name': 'French'}],
+    'link': '',
+    'image': None,
+    'published': True,
+    'taken_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    'uid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'label': gettext_lazy('Recipe'),
+    7: 'non str key',
+}
+
+
+class RendererTests(SimpleTestCase):
+    """Test the renderers' output against DRF's `JSONRenderer`."""
+
+    def test_orjson_same_output(self):
+        expected = JSONRenderer().render(SAMPLE)
+
+        self.assertEqual(ORJSONRenderer().render(SAMPLE), expected)
+        self.assertEqual(
+            ORJSONRenderer().render([SAMPLE] * 3), JSONRenderer().render([SAMPLE] * 3)
+        )
+
+    def test_orjson_indent(self):
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            ORJSONRenderer().render(SAMPLE, media_type),
+            JSONRenderer().render(SAMPLE, media_type),
+        )
+
+    def test_msgpack_same_values(self):
+        rendered = MessagePackRenderer().render(SAMPLE)
+
+        expected = json.loads(JSONRenderer().render(SAMPLE))
+        # JSON keys are strings; MessagePack keeps the int key.
+        expected[7] = expected.pop('7')
+        self.assertEqual(msgpack.unpackb(rendered, strict_map_key=False), expected)
+
+    def test_decimal_as_string(self):
+        """Decimals look the same as `DecimalField`'s output."""
+        data = {'cost': Decimal('3.50')}
+
+        self.assertEqual(ORJSONRenderer().render(data), b'{"cost":"3.50"}')
+        rendered = MessagePackRenderer().render(data)
+        self.assertEqual(msgpack.unpackb(rendered), {'cost': '3.50'})
+
+    def test_none(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+
+class ParserTests(SimpleTestCase):
+    """Test parsing JSON & MessagePack bodies."""
+
+    def test_parse(self):
+        data = {'title': 'Soup', 'cost': 3.5, 'tags': [{'name': 'Vegan'}]}
+
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(json.dumps(data).encode())), data)
+        self.assertEqual(MessagePackParser().parse(io.BytesIO(msgpack.packb(data))), data)
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"cost": NaN}'))
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+class NegotiationTests(TestCase):
+    """Test picking the formats from the `Accept` & `Content-Type` headers."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, cost=Decimal('3.49')
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+    def test_msgpack_response(self):
+        as_json = self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content), as_json.json())
+        self.assertEqual(as_json.json()[0]['cost'], '3.49')
+
+    def test_msgpack_request(self):
+        payload = {
+            'title': 'Curry', 'time_minutes': 20, 'cost': '7.99', 'tags': [{'name': 'Spicy'}]
+        }
+
+        res = self.client.post(
+            RECIPES_URL, msgpack.packb(payload), content_type='application/msgpack'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.json()['id'])
+        self.assertEqual(recipe.cost, Decimal('7.99'))
+        self.assertEqual([tag.name for tag in recipe.tags.all()], ['Spicy'])
+
+    def test_json_request(self):
+        res = self.client.post(
+            RECIPES_URL, {'title': 'Curry', 'time_minutes': 20, 'cost': 7.5}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json()['cost'], '7.50')
@@ -0,0 +1,151 @@
+"""
+Tests for the on-demand image renditions.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from PIL import Image
+
+from django.test import SimpleTestCase, override_settings
+
+from core import renditions
+
+JPEG = renditions.FALLBACK_FORMAT
+WEBP = next(fmt for fmt in renditions.FORMATS if fmt[1] == 'WEBP')
+
+
+class NegotiateFormatTests(SimpleTestCase):
+    """Test picking the output format from the `Accept` header."""
+
+    def test_explicitly_accepted_formats(self):
+        self.assertEqual(
+            renditions.get_accepted_formats('image/webp,image/png;q=0.9,image/avif;q=0'),
+            {'image/webp', 'image/png'}
+        )
+
+    def test_negotiate_format(self):
+        self.assertEqual(renditions.negotiate_format('image/webp,*/*;q=0.8')[1], 'WEBP')
+        # A wildcard doesn't mean the client can decode modern formats.
+        self.assertEqual(renditions.negotiate_format('*/*'), JPEG)
+        self.assertEqual(renditions.negotiate_format(None), JPEG)
+
+    def test_unsupported_format_is_skipped(self):
+        with mock.patch('core.renditions.features.check', return_value=False):
+            self.assertEqual(renditions.negotiate_format('image/avif,image/webp'), JPEG)
+
+
+class RenditionCacheTests(SimpleTestCase):
+    """Test rendering & caching renditions."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        settings_override = override_settings(
+            IMAGE_CACHE_ROOT=os.path.join(self.root, 'cache')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.source = os.path.join(self.root, 'photo.jpg')
+        Image.new('RGB', (800, 400), (0, 128, 255)).save(self.source, format='JPEG')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_render_and_reuse(self):
+        with mock.patch('core.renditions.render', wraps=renditions.render) as render:
+            path = renditions.get_rendition('photo.jpg', self.source, 320, WEBP)
+            again = renditions.get_rendition('photo.jpg', self.source, 320, WEBP)
+
+        self.assertEqual(again, path)
+        self.assertEqual(render.call_count, 1)
+        with Image.open(path) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (320, 160)))
+
+    def test_hit_keeps_mtime(self):
+        """A cache hit doesn't change the ETag the rendition is served with."""
+        path = renditions.get_rendition('photo.jpg', self.source, 320, WEBP)
+        os.utime(path, (1, 1))
+
+        renditions.get_rendition('photo.jpg', self.source, 320, WEBP)
+
+        stat = os.stat(path)
+        self.assertEqual(stat.st_mtime, 1)
+        self.assertGreater(stat.st_atime, 1)
+
+    def test_exif_rotated_source(self):
+        """Sized after the EXIF rotation: a phone photo taken upright stays upright."""
+        for size, width, expected in [
+            ((4000, 3000), 640, (640, 853)),
+            ((400, 300), 160, (160, 213)),
+        ]:
+            with self.subTest(size=size):
+                source = os.path.join(self.root, f'rotated-{size[0]}.jpg')
+                exif = Image.Exif()
+                exif[renditions.ORIENTATION_TAG] = 6  # 90° clockwise
+                Image.new('RGB', size, (0, 128, 255)).save(source, format='JPEG', exif=exif)
+
+                path = renditions.get_rendition('rotated.jpg', source, width, JPEG)
+
+                with Image.open(path) as img:
+                    self.assertEqual(img.size, expected)
+
+    def test_never_upscale(self):
+        path = renditions.get_rendition('photo.jpg', self.source, 1600, JPEG)
+
+        with Image.open(path) as img:
+            self.assertEqual(img.size, (800, 400))
+
+    def test_replaced_source_gets_new_rendition(self):
+        path = renditions.get_rendition('photo.jpg', self.source, 320, JPEG)
+        Image.new('RGB', (640, 640)).save(self.source, format='JPEG')
+
+        new_path = renditions.get_rendition('photo.jpg', self.source, 320, JPEG)
+
+        self.assertNotEqual(new_path, path)
+        with Image.open(new_path) as img:
+            self.assertEqual(img.size, (320, 320))
+
+    def test_concurrent_requests_render_once(self):
+        calls = []
+        lock = threading.Lock()
+        render = renditions.render
+
+        def slow_render(*args):
+            with lock:
+                calls.append(args)
+            threading.Event().wait(0.1)
+            render(*args)
+
+        with mock.patch('core.renditions.render', side_effect=slow_render):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                paths = set(executor.map(
+                    lambda _: renditions.get_rendition('photo.jpg', self.source, 160, JPEG),
+                    range(4)
+                ))
+
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_evict_least_recently_used(self):
+        old = renditions.get_rendition('photo.jpg', self.source, 160, JPEG)
+        recent = renditions.get_rendition('photo.jpg', self.source, 320, JPEG)
+        os.utime(old, (1, 1))
+
+        renditions.evict(os.path.getsize(recent))
+
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_cache_stays_bounded(self):
+        old = renditions.get_rendition('photo.jpg', self.source, 320, JPEG)
+        os.utime(old, (1, 1))
+
+        with override_settings(IMAGE_CACHE_MAX_BYTES=os.path.getsize(old)):
+            path = renditions.get_rendition('photo.jpg', self.source, 160, JPEG)
+
+        cached = list(renditions._iter_cached_files())
+        self.assertEqual([entry.path for entry in cached], [path])
@@ -0,0 +1,99 @@
+"""
+Tests for the precomputed OpenAPI schema.
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(TestCase):
+    """Test generating, caching & serving the schema."""
+
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_root)
+        settings_override = override_settings(SCHEMA_CACHE_ROOT=self.cache_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema.clear()
+        self.addCleanup(schema.clear)
+
+        self.generate = patch.object(schema, 'generate', wraps=schema.generate).start()
+        self.addCleanup(patch.stopall)
+
+    def test_get_schema(self):
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'application/vnd.oai.openapi+json')
+        self.assertIn('/api/recipe/recipes/', json.loads(res.content)['paths'])
+        self.assertTrue(res['ETag'])
+
+        res = self.client.get(SCHEMA_URL)
+        self.assertEqual(res['Content-Type'], 'application/vnd.oai.openapi')
+        self.assertTrue(res.content.startswith(b'openapi:'))
+
+    def test_generated_once(self):
+        self.client.get(SCHEMA_URL)
+        self.client.get(SCHEMA_URL, HTTP_ACCEPT='application/json')
+        self.client.get(SCHEMA_URL)
+
+        self.generate.assert_called_once_with()
+
+    def test_not_modified(self):
+        etag = self.client.get(SCHEMA_URL)['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+    def test_gzip(self):
+        plain = self.client.get(SCHEMA_URL)
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_loaded_from_disk(self):
+        """Another process (or a restart) reads the files back."""
+        expected = self.client.get(SCHEMA_URL).content
+        schema.clear()
+        self.generate.side_effect = AssertionError('Generated again.')
+
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.content, expected)
+
+    def test_regenerated_for_new_code_version(self):
+        with patch.object(schema, 'get_code_version', return_value='v1'):
+            self.client.get(SCHEMA_URL)
+        with patch.object(schema, 'get_code_version', return_value='v2'):
+            self.client.get(SCHEMA_URL)
+
+        self.assertEqual(self.generate.call_count, 2)
+        self.assertTrue(os.path.exists(schema.get_schema_path('v2', 'json')))
+
+    def test_build_schema_command(self):
+        out = StringIO()
+        with patch.object(schema, 'get_code_version', return_value='abc'):
+            call_command('build_schema', stdout=out)
+
+        for fmt in schema.FORMATS:
+            self.assertTrue(os.path.exists(schema.get_schema_path('abc', fmt)))
+            self.assertTrue(os.path.exists(schema.get_schema_path('abc', fmt) + '.gz'))
+        self.assertIn('Schema ready for version abc', out.getvalue())
@@ -0,0 +1,162 @@
+"""
+Tests for the denormalized tags & ingredients of the recipes.
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SnapshotTests(TestCase):
+    """Test keeping `tags_snapshot` & `ingredients_snapshot` up to date."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, cost=Decimal('3.49')
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+
+    def assertSnapshot(self, recipe, tags=None, ingredients=None):
+        recipe.refresh_from_db()
+        expected_tags = [{'id': tag.id, 'name': tag.name} for tag in tags or []]
+        expected_ingredients = [{'id': obj.id, 'name': obj.name} for obj in ingredients or []]
+        self.assertEqual(recipe.tags_snapshot, expected_tags)
+        self.assertEqual(recipe.ingredients_snapshot, expected_ingredients)
+
+    def test_add_remove_clear(self):
+        self.recipe.tags.add(self.quick, self.vegan)
+        self.assertSnapshot(self.recipe, [self.vegan, self.quick])  # ordered by id
+
+        self.recipe.tags.remove(self.vegan)
+        self.assertSnapshot(self.recipe, [self.quick])
+
+        self.recipe.tags.clear()
+        self.assertSnapshot(self.recipe)
+
+    def test_reverse_add_clear(self):
+        other = Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5, cost=Decimal('2.00')
+        )
+
+        self.vegan.recipe_set.add(self.recipe, other)
+        self.assertSnapshot(self.recipe, [self.vegan])
+        self.assertSnapshot(other, [self.vegan])
+
+        self.vegan.recipe_set.clear()
+        self.assertSnapshot(self.recipe)
+        self.assertSnapshot(other)
+
+    def test_rename_delete(self):
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe.tags.add(self.vegan, self.quick)
+        self.recipe.ingredients.add(salt)
+
+        self.vegan.name = 'Plant based'
+        self.vegan.save()
+        salt.name = 'Sea salt'
+        salt.save()
+        self.assertSnapshot(self.recipe, [self.vegan, self.quick], [salt])
+
+        self.quick.delete()
+        self.assertSnapshot(self.recipe, [self.vegan], [salt])
+
+    def test_stale_full_save(self):
+        """Saving a copy loaded before a tag change keeps the new snapshot."""
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.recipe.tags.add(self.vegan)
+
+        stale.title = 'Tomato soup'
+        stale.save()
+
+        self.assertSnapshot(self.recipe, [self.vegan])
+        self.assertEqual(self.recipe.title, 'Tomato soup')
+
+    def test_serializer(self):
+        payload = {
+            'title': 'Curry', 'time_minutes': 20, 'cost': '7.99',
+            'tags': [{'name': 'Spicy'}, {'name': 'Vegan'}],
+            'ingredients': [{'name': 'Rice'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        recipe = Recipe.objects.get(id=res.data['id'])
+        spicy = Tag.objects.get(name='Spicy')
+        rice = Ingredient.objects.get(name='Rice')
+        self.assertSnapshot(recipe, [self.vegan, spicy], [rice])
+        self.assertEqual(res.data['tags'], recipe.tags_snapshot)
+
+        res = self.client.patch(detail_url(recipe.id), {'tags': []}, format='json')
+
+        self.assertEqual(res.data['tags'], [])
+        self.assertSnapshot(recipe, [], [rice])
+
+    def test_list_single_query(self):
+        """Listing the recipes doesn't query their tags & ingredients."""
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, cost=Decimal('1.00')
+            )
+            recipe.tags.add(self.vegan)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 4)
+        self.assertEqual(res.data[0]['tags'], [{'id': self.vegan.id, 'name': 'Vegan'}])
+
+
+class CheckRecipeSnapshotsTests(TestCase):
+    """Test the `check_recipe_snapshots` command."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, cost=Decimal('3.49')
+        )
+        self.tag = Tag.objects.create(user=user, name='Vegan')
+        self.recipe.tags.add(self.tag)
+
+    def test_no_drift(self):
+        out = StringIO()
+
+        call_command('check_recipe_snapshots', stdout=out)
+
+        self.assertIn('Checked 1 recipes: no drift.', out.getvalue())
+
+    def test_drift_repair(self):
+        # Bypasses the signals:
+        Tag.objects.filter(pk=self.tag.pk).update(name='Plant based')
+
+        with self.assertRaisesRegex(CommandError, '1 of 1 recipes'):
+            call_command('check_recipe_snapshots', stdout=StringIO())
+
+        out = StringIO()
+        call_command('check_recipe_snapshots', '--repair', '--batch-size=1', stdout=out)
+
+        self.assertIn('Repaired 1 of 1 recipes.', out.getvalue())
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.tags_snapshot, [{'id': self.tag.id, 'name': 'Plant based'}]
+        )
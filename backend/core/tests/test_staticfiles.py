@@ -0,0 +1,118 @@
+"""
+Tests for the hashed, precompressed static files.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+
+import brotli
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core.media import DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL
+
+CSS = b'body { background: url("img/logo.png"); }\n' + b'.a { color: red; }\n' * 200
+JS = b'console.log("static");\n' * 200
+
+
+def get_static_url(path):
+    return reverse('static', args=[path])
+
+
+class StaticFilesTests(SimpleTestCase):
+    """Test collecting & serving the static files."""
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.static_root)
+        os.makedirs(os.path.join(self.source, 'img'))
+        for name, content in [
+            ('site.css', CSS),
+            ('app.js', JS),
+            ('small.js', b'1;'),
+            ('img/logo.png', b'\x89PNG' + os.urandom(2048)),
+        ]:
+            with open(os.path.join(self.source, name), 'wb') as f:
+                f.write(content)
+
+        settings_override = override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_COMPRESSION_WORKERS=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def collectstatic(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def read(self, name):
+        with open(os.path.join(self.static_root, name), 'rb') as f:
+            return f.read()
+
+    def test_collectstatic(self):
+        self.collectstatic()
+
+        css = staticfiles_storage.stored_name('site.css')
+        self.assertRegex(css, r'^site\.[0-9a-f]{12}\.css$')
+        logo = staticfiles_storage.stored_name('img/logo.png')
+        self.assertIn(logo.encode(), self.read(css))
+        self.assertEqual(gzip.decompress(self.read(css + '.gz')), self.read(css))
+        self.assertEqual(brotli.decompress(self.read(css + '.br')), self.read(css))
+        js = staticfiles_storage.stored_name('app.js')
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, js + '.br')))
+        # Too small / compressed already:
+        for name in ['small.js', 'img/logo.png']:
+            hashed = staticfiles_storage.stored_name(name)
+            self.assertFalse(os.path.exists(os.path.join(self.static_root, hashed + '.gz')))
+
+    def test_no_manifest(self):
+        """Before the first `collectstatic`, the files keep their names."""
+        self.assertEqual(staticfiles_storage.url('site.css'), '/static/static/site.css')
+
+    def test_serve_precompressed(self):
+        self.collectstatic()
+        css = staticfiles_storage.stored_name('site.css')
+        cases = [
+            ('gzip, deflate, br', 'br', css + '.br'),
+            ('gzip', 'gzip', css + '.gz'),
+            ('identity', None, css),
+        ]
+        for accept_encoding, encoding, name in cases:
+            with self.subTest(accept_encoding):
+                res = self.client.get(
+                    get_static_url(css), headers={'Accept-Encoding': accept_encoding}
+                )
+
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.get('Content-Encoding'), encoding)
+                self.assertEqual(res['Content-Type'], 'text/css')
+                self.assertEqual(res['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+                self.assertEqual(res['Vary'], 'Accept-Encoding')
+                self.assertEqual(b''.join(res.streaming_content), self.read(name))
+
+    def test_serve_unhashed(self):
+        self.collectstatic()
+
+        res = self.client.get(get_static_url('site.css'), headers={'Accept-Encoding': 'br'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Cache-Control'], DEFAULT_CACHE_CONTROL)
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_not_found(self):
+        self.collectstatic()
+        css = staticfiles_storage.stored_name('site.css')
+
+        for path in [css + '.gz', 'missing.css', '../site.css']:
+            with self.subTest(path):
+                res = self.client.get(get_static_url(path))
+
+                self.assertEqual(res.status_code, 404)
@@ -0,0 +1,154 @@
+"""
+Stateless, signed (HMAC, with `SECRET_KEY`) access & refresh tokens.
+
+- access: short-lived (`SIGNED_TOKEN_ACCESS_LIFETIME`); carries what's needed
+  to authenticate a request without any DB query (see
+  `authentication.SignedTokenAuthentication`).
+- refresh: long-lived; exchanged for a new pair at /api/user/token/refresh/
+  (that one does check the user in the DB) & revoked once used.
+
+Revocations (a token, or all the tokens of a user issued before a point in
+time) are stored in `RevokedToken`; every process keeps them in memory &
+reloads them every `SIGNED_TOKEN_REVOCATION_REFRESH` seconds.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+
+from core.models import RevokedToken
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+def get_lifetime(token_type):
+    if token_type == ACCESS:
+        return settings.SIGNED_TOKEN_ACCESS_LIFETIME
+    return settings.SIGNED_TOKEN_REFRESH_LIFETIME
+
+
+def issue_token(user, token_type):
+    claims = {
+        'uid': user.pk,
+        'jti': secrets.token_hex(16),
+        'iat': round(time.time(), 3),
+    }
+    if token_type == ACCESS:
+        claims.update(email=user.email, staff=user.is_staff, su=user.is_superuser)
+    # One salt per type: an access token can't be used as a refresh token & vice versa.
+    return signing.dumps(claims, salt=f'core.tokens.{token_type}')
+
+
+def issue_token_pair(user):
+    return {ACCESS: issue_token(user, ACCESS), REFRESH: issue_token(user, REFRESH)}
+
+
+def verify_token(token, token_type):
+    """
+    Return the claims of a valid token.
+
+    Raises `signing.BadSignature` (`signing.SignatureExpired` if expired) otherwise.
+    """
+    claims = signing.loads(
+        token, salt=f'core.tokens.{token_type}', max_age=get_lifetime(token_type)
+    )
+    if revocations.is_revoked(claims):
+        raise signing.BadSignature('Token revoked.')
+    return claims
+
+
+class RevocationList:
+    """In-memory copy of the (unexpired) `RevokedToken` rows."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jtis = set()
+        self.users = {}  # user id => tokens issued up to this timestamp are revoked
+        self.loaded_at = None
+
+    def get_rows(self):
+        now = datetime.now(timezone.utc)
+        return RevokedToken.objects.filter(expires_at__gt=now).values_list(
+            'jti', 'user_id', 'revoked_at'
+        )
+
+    def load(self, rows):
+        jtis, users = set(), {}
+        for jti, user_id, revoked_at in rows:
+            if jti:
+                jtis.add(jti)
+            else:
+                users[user_id] = max(users.get(user_id, 0), revoked_at.timestamp())
+        with self.lock:
+            self.jtis, self.users = jtis, users
+            self.loaded_at = time.monotonic()
+
+    def reload(self):
+        self.load(self.get_rows())
+
+    async def areload(self):
+        """`reload`, for async code (see `authentication.aauthenticate`)."""
+        self.load([row async for row in self.get_rows()])
+
+    def is_stale(self):
+        loaded_at = self.loaded_at
+        return loaded_at is None or (
+            time.monotonic() - loaded_at > settings.SIGNED_TOKEN_REVOCATION_REFRESH
+        )
+
+    def is_revoked(self, claims):
+        if self.is_stale():
+            self.reload()
+        return (
+            claims['jti'] in self.jtis
+            or claims['iat'] <= self.users.get(claims['uid'], 0)
+        )
+
+    def add(self, jti='', user_id=None, revoked_at=None):
+        with self.lock:
+            if jti:
+                self.jtis.add(jti)
+            else:
+                self.users[user_id] = max(self.users.get(user_id, 0), revoked_at)
+
+
+revocations = RevocationList()
+
+
+def revoke_token(claims, token_type):
+    """
+    Revoke a token; returns False if it was revoked already.
+
+    Atomic (unique `jti`): of concurrent requests, or requests to processes
+    whose revocations aren't reloaded yet, a single one revokes the token.
+    """
+    expires_at = claims['iat'] + get_lifetime(token_type)
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(
+                jti=claims['jti'], user_id=claims['uid'],
+                expires_at=datetime.fromtimestamp(expires_at, timezone.utc),
+            )
+    except IntegrityError:
+        revoked = False
+    else:
+        revoked = True
+    revocations.add(jti=claims['jti'])
+    return revoked
+
+
+def revoke_user_tokens(user_id):
+    """Revoke all the tokens issued to a user so far."""
+    now = datetime.now(timezone.utc)
+    # Expired, the tokens it covers would be rejected anyway.
+    lifetime = max(get_lifetime(ACCESS), get_lifetime(REFRESH))
+    RevokedToken.objects.create(
+        user_id=user_id, revoked_at=now, expires_at=now + timedelta(seconds=lifetime)
+    )
+    RevokedToken.objects.filter(expires_at__lte=now).delete()  # housekeeping
+    revocations.add(user_id=user_id, revoked_at=now.timestamp())
@@ -0,0 +1,91 @@
+"""
+Views for the *core* APIs.
+"""
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+from drf_spectacular.utils import extend_schema
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
+from rest_framework import status, views
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from core import compression, hashers, health, schema
+from core.authentication import CachedTokenAuthentication, token_cache
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def exception_handler(exc, context):
+    """DRF's exception handler, + `HashingBusy` (not an `APIException`) => 503."""
+    if isinstance(exc, hashers.HashingBusy):
+        return Response({'detail': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return views.exception_handler(exc, context)
+
+
+# /api/metrics/ ; per server process (every worker has its own caches).
+@extend_schema(exclude=True)
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """In-process metrics, for staff users."""
+    return Response({
+        'auth_token_cache': token_cache.stats(),
+        'password_hasher': hashers.metrics.snapshot(),
+        'compression': compression.stats.snapshot(),
+    })
+
+
+# /healthz: liveness; the process answers (no dependency is touched).
+@never_cache
+@require_GET
+def healthz(request):
+    return JsonResponse({'status': 'ok'})
+
+
+# /readyz: readiness; the database (`SELECT 1`), media storage & cache are usable.
+@never_cache
+@require_GET
+def readyz(request):
+    results = health.run_checks(timeout=settings.HEALTH_CHECK_TIMEOUT)
+    ready = all(result['ok'] for result in results.values())
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'checks': results},
+        status=200 if ready else 503,
+    )
+
+
+# /api/schema/: the OpenAPI schema, YAML by default, JSON with `?format=json` or an
+# `Accept` asking for JSON. Precomputed (see core/schema.py), gzipped if accepted.
+@require_GET
+def api_schema(request):
+    fmt = request.GET.get('format')
+    if fmt not in schema.FORMATS:
+        fmt = 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+    rendered = schema.get_schema(fmt)
+
+    response = HttpResponse(content_type=schema.FORMATS[fmt][0])
+    response['Content-Disposition'] = f'inline; filename="schema.{fmt}"'
+    # Revalidated on every use; answered with a 304 while the ETag matches.
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    if re_accepts_gzip.search(request.headers.get('Accept-Encoding', '')):
+        # Another representation => another ETag.
+        etag = rendered.etag[:-1] + '-gzip"'
+        response.content = rendered.gzipped
+        response['Content-Encoding'] = 'gzip'
+    else:
+        etag = rendered.etag
+        response.content = rendered.body
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
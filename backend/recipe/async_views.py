@@ -0,0 +1,99 @@
+"""
+Async (ASGI native) versions of the read endpoints of the *recipe* APIs.
+
+Same responses as the list/retrieve actions of `RecipeViewSet`, `TagViewSet` &
+`IngredientViewSet`, but DRF views are sync only: under ASGI each of their
+requests holds a thread. These run on the event loop & use the async ORM, so a
+request waiting for the database costs (almost) nothing.
+
+Mounted under /api/async/recipe/ (see `recipe/async_urls.py`).
+"""
+import functools
+
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+
+from rest_framework import exceptions
+
+from core.authentication import aauthenticate
+from core.models import Ingredient, Tag
+from core.renderers import ORJSONRenderer
+from recipe import serializers
+from recipe.views import get_user_recipes
+
+# Rows fetched per query by `aiterator()`.
+CHUNK_SIZE = 500
+
+renderer = ORJSONRenderer()
+
+
+def render(data, status=200, headers=None):
+    return HttpResponse(
+        renderer.render(data), status=status, content_type='application/json',
+        headers=headers,
+    )
+
+
+def read_only_api_view(view):
+    """Authenticate the request (like the viewsets do) & render DRF-like errors."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            detail = exceptions.MethodNotAllowed(request.method).detail
+            return render({'detail': detail}, status=405, headers={'Allow': 'GET, HEAD'})
+
+        try:
+            user = await aauthenticate(request)
+            if user is None:
+                raise exceptions.NotAuthenticated()
+        except exceptions.APIException as exc:
+            # Same header as the viewsets: from their first authentication class.
+            return render(
+                {'detail': exc.detail}, status=401, headers={'WWW-Authenticate': 'Token'}
+            )
+        request.user = user
+
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404 as exc:
+            return render({'detail': str(exc)}, status=404)
+    return wrapper
+
+
+def get_recipes(request):
+    # Tags & ingredients are rendered from the recipes' snapshots: no prefetch.
+    return get_user_recipes(request.user, request.GET)
+
+
+# /api/async/recipe/recipes/
+@read_only_api_view
+async def recipe_list(request):
+    recipes = [recipe async for recipe in get_recipes(request).aiterator(CHUNK_SIZE)]
+    serializer = serializers.RecipeSerializer(
+        recipes, many=True, context={'request': request}
+    )
+    return render(serializer.data)
+
+
+# /api/async/recipe/recipes/{id}/
+@read_only_api_view
+async def recipe_detail(request, pk):
+    recipe = await aget_object_or_404(get_recipes(request), pk=pk)
+    serializer = serializers.RecipeDetailSerializer(recipe, context={'request': request})
+    return render(serializer.data)
+
+
+# /api/async/recipe/tags/
+@read_only_api_view
+async def tag_list(request):
+    queryset = Tag.objects.filter(user=request.user).order_by('-name')
+    tags = [tag async for tag in queryset.aiterator()]
+    return render(serializers.TagSerializer(tags, many=True).data)
+
+
+# /api/async/recipe/ingredients/
+@read_only_api_view
+async def ingredient_list(request):
+    queryset = Ingredient.objects.filter(user=request.user).order_by('-name')
+    ingredients = [ingredient async for ingredient in queryset.aiterator()]
+    return render(serializers.IngredientSerializer(ingredients, many=True).data)
@@ -1,10 +1,21 @@
 """
 Serializers for *recipe* APIs.
 """
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.validators import validate_image_file_extension
+from django.db import transaction
 
 from rest_framework import serializers
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, Tag, Ingredient, UploadSession
+
+# Extracted at upload time; lets clients lay out & render a grid without the image.
+IMAGE_METADATA_FIELDS = [
+    'image_width', 'image_height', 'image_color', 'image_placeholder', 'image_taken_at'
+]
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -23,36 +34,51 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class SnapshotListSerializer(serializers.ListSerializer):
+    """
+    Renders the recipe's `<field>_snapshot` (see `core.snapshots`) instead of
+    querying the relation; validates the input like `many=True` does.
+    """
+
+    def get_attribute(self, instance):
+        return getattr(instance, f'{self.source}_snapshot')
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipes."""
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    tags = SnapshotListSerializer(child=TagSerializer(), required=False)
+    ingredients = SnapshotListSerializer(child=IngredientSerializer(), required=False)
 
     class Meta:
         model = Recipe
-        fields = ['id', 'title', 'time_minutes', 'cost', 'link', 'tags', 'ingredients']
-        read_only_fields = ['id']
+        fields = [
+            'id', 'title', 'time_minutes', 'cost', 'link', 'tags', 'ingredients'
+        ] + IMAGE_METADATA_FIELDS
+        read_only_fields = ['id'] + IMAGE_METADATA_FIELDS
 
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags."""
         # Get the user from the serializer object:
         user_authenticated = self.context['request'].user
-        # Now, create/add the tags:
-        for tag in tags:
-            # `.get_or_create()` won't create duplicate tags as the name suggests.
-            tag_obj, created = Tag.objects.get_or_create(user=user_authenticated, **tag)
-            recipe.tags.add(tag_obj)
+        # `.get_or_create()` won't create duplicate tags as the name suggests.
+        tag_objs = [
+            Tag.objects.get_or_create(user=user_authenticated, **tag)[0] for tag in tags
+        ]
+        # Now, add the tags (at once: the snapshot is refreshed once).
+        recipe.tags.add(*tag_objs)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         user_authenticated = self.context['request'].user
-        for ingredient in ingredients:
-            obj, is_created = Ingredient.objects.get_or_create(
-                user=user_authenticated, **ingredient
-            )
-            recipe.ingredients.add(obj)
+        objs = [
+            Ingredient.objects.get_or_create(user=user_authenticated, **ingredient)[0]
+            for ingredient in ingredients
+        ]
+        recipe.ingredients.add(*objs)
 
     # Add "write" functionality to our nested serializer.
     # By default, they'll be read-only.
+    # Atomic: the recipe, its relations & their snapshots are saved all together.
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe."""
         # Remove the `tag` key from the recipe payload.
@@ -64,6 +90,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(recipe_ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update the recipe."""
         recipe_tags = validated_data.pop('tags', None)
@@ -97,7 +124,36 @@ class RecipeImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'image_format'] + IMAGE_METADATA_FIELDS
+        read_only_fields = ['id', 'image_format'] + IMAGE_METADATA_FIELDS
         # The whole point of this serializer is to handle images. Hence required True.
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable (chunked) image uploads."""
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'recipe', 'filename', 'size', 'offset', 'received']
+        read_only_fields = ['id', 'offset', 'received']
+
+    def validate_recipe(self, recipe):
+        # Don't leak whether other users' recipes exist: same error as a bad id.
+        if recipe.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('Recipe not found.')
+        return recipe
+
+    def validate_filename(self, filename):
+        filename = os.path.basename(filename)
+        # Like `Recipe.image` does for the other uploads (the stored extension is
+        # then taken from the decoded format, see `UploadSessionViewSet.finalize`).
+        validate_image_file_extension(File(None, filename))
+        return filename
+
+    def validate_size(self, size):
+        if not 0 < size <= settings.UPLOAD_SESSION_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'size must be in [1, {settings.UPLOAD_SESSION_MAX_SIZE}] bytes.'
+            )
+        return size
@@ -0,0 +1,120 @@
+"""
+Tests for the async (read only) *recipe* APIs: same responses as the viewsets.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core import tokens
+from core.authentication import token_cache
+from core.models import Ingredient, Recipe, Tag
+
+ASYNC_RECIPES_URL = reverse('recipe-async:recipe-list')
+ASYNC_TAGS_URL = reverse('recipe-async:tag-list')
+ASYNC_INGREDIENTS_URL = reverse('recipe-async:ingredient-list')
+
+
+def get_async_detail_url(recipe_id):
+    return reverse('recipe-async:recipe-detail', args=[recipe_id])
+
+
+class AsyncRecipeViewsTests(TestCase):
+    """Test the async views against their DRF counterparts."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+        for title in ['Soup', 'Curry']:
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=10, cost=Decimal('4.50'),
+                image='uploads/recipe/x.jpg',
+            )
+            recipe.tags.add(Tag.objects.get_or_create(user=self.user, name='Vegan')[0])
+            recipe.ingredients.add(
+                Ingredient.objects.get_or_create(user=self.user, name='Salt')[0]
+            )
+        other = get_user_model().objects.create_user(email='other@example.com', password='x')
+        self.other_recipe = Recipe.objects.create(
+            user=other, title='Other', time_minutes=1, cost=Decimal('1.00')
+        )
+
+    def assertSameResponse(self, async_url, sync_url, **extra):
+        res = self.client.get(async_url, **extra)
+        expected = self.client.get(sync_url, **extra)
+
+        self.assertEqual(res.status_code, expected.status_code)
+        self.assertEqual(res.json(), expected.json())
+        return res
+
+    def test_recipe_list(self):
+        res = self.assertSameResponse(
+            ASYNC_RECIPES_URL, reverse('recipe:recipe-list'), **self.auth
+        )
+        self.assertEqual(len(res.json()), 2)
+        self.assertEqual(res.json()[0]['tags'][0]['name'], 'Vegan')
+
+    def test_recipe_list_ordering(self):
+        self.assertSameResponse(
+            ASYNC_RECIPES_URL + '?ordering=taken',
+            reverse('recipe:recipe-list') + '?ordering=taken', **self.auth
+        )
+
+    def test_recipe_detail(self):
+        recipe = Recipe.objects.filter(user=self.user).first()
+        self.assertSameResponse(
+            get_async_detail_url(recipe.id),
+            reverse('recipe:recipe-detail', args=[recipe.id]), **self.auth
+        )
+
+    def test_other_users_recipe_not_found(self):
+        res = self.assertSameResponse(
+            get_async_detail_url(self.other_recipe.id),
+            reverse('recipe:recipe-detail', args=[self.other_recipe.id]), **self.auth
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tag_and_ingredient_lists(self):
+        self.assertSameResponse(ASYNC_TAGS_URL, reverse('recipe:tag-list'), **self.auth)
+        self.assertSameResponse(
+            ASYNC_INGREDIENTS_URL, reverse('recipe:ingredient-list'), **self.auth
+        )
+
+    def test_signed_token(self):
+        access = tokens.issue_token(self.user, tokens.ACCESS)
+        self.assertSameResponse(
+            ASYNC_TAGS_URL, reverse('recipe:tag-list'), HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+
+    def test_auth_required(self):
+        res = self.assertSameResponse(ASYNC_RECIPES_URL, reverse('recipe:recipe-list'))
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+        self.assertSameResponse(
+            ASYNC_RECIPES_URL, reverse('recipe:recipe-list'), HTTP_AUTHORIZATION='Token bad'
+        )
+
+    def test_read_only(self):
+        res = self.client.post(ASYNC_RECIPES_URL, {}, **self.auth)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_async_client(self):
+        """Served on the event loop (ASGI) as well."""
+        res = await self.async_client.get(
+            ASYNC_TAGS_URL, headers={'Authorization': self.auth['HTTP_AUTHORIZATION']}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), [{'id': res.json()[0]['id'], 'name': 'Vegan'}])
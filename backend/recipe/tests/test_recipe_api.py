@@ -1,19 +1,25 @@
 """
 Tests for `recipe` APIs.
 """
+import io
+import json
 import os
+import shutil
 import tempfile
+import zipfile
 from PIL import Image
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core.hashindex import hash_fields
+from core.models import Job, Recipe, Tag, Ingredient
+from core.optimize import optimize_image
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
@@ -31,6 +37,19 @@ def get_img_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+DUPLICATES_URL = reverse('recipe:recipe-duplicates')
+BATCH_UPLOAD_URL = reverse('recipe:recipe-upload-images')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def get_similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def get_rendition_url(recipe_id, width):
+    return reverse('recipe:recipe-image', args=[recipe_id]) + f'?width={width}'
+
+
 # Helper function to create recipe
 def create_recipe(user, **params):
     defaults = {
@@ -46,6 +65,16 @@ def create_recipe(user, **params):
     return recipe
 
 
+def create_truncated_jpeg():
+    """A JPEG that passes `verify()`, but can't be decoded."""
+    buf = io.BytesIO()
+    Image.effect_noise((64, 64), 50).convert('RGB').save(buf, format='JPEG')
+    img_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+    img_file.write(buf.getvalue()[:buf.tell() // 2])
+    img_file.seek(0)
+    return img_file
+
+
 class PublicRecipeAPITests(TestCase):
     """Test unauthenticated API requests"""
 
@@ -104,6 +133,16 @@ class AuthorizedRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_recipes_ordered_by_capture_time(self):
+        """Test `?ordering=taken` lists the latest photos first; no photo => last."""
+        no_photo = create_recipe(user=self.user)
+        old = create_recipe(user=self.user, image_taken_at='2020-01-01T10:00:00Z')
+        new = create_recipe(user=self.user, image_taken_at='2024-01-01T10:00:00Z')
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'taken'})
+
+        self.assertEqual([r['id'] for r in res.data], [new.id, old.id, no_photo.id])
+
     def test_get_recipe_detail(self):
         recipe = create_recipe(user=self.user)
 
@@ -341,9 +380,294 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @override_settings(IMAGE_OPTIMIZE_ON_UPLOAD=True)
+    def test_upload_image_schedules_optimization(self):
+        """Test the uploaded image is queued for re-encoding, if enabled."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as img_file:
+            Image.new('RGB', (10, 10)).save(img_file, format='JPEG')
+            img_file.seek(0)
+            self.client.post(get_img_upload_url(self.recipe.id), {'image': img_file})
+
+        job = Job.objects.get()
+        self.assertEqual(job.name, optimize_image.job_name)
+        self.assertEqual(job.kwargs, {'recipe_id': self.recipe.id})
+
+        optimize_image(**job.kwargs)  # what the worker does
+        self.recipe.refresh_from_db()
+        self.assertIsNotNone(self.recipe.image_bytes_saved)
+
+    def test_upload_image_stores_metadata(self):
+        """Test image metadata is extracted once at upload & returned by the APIs."""
+        img_url = get_img_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as img_file:
+            img_obj = Image.new('RGB', (40, 30), (0, 0, 255))
+            img_obj.save(img_file, format='JPEG')
+            img_file.seek(0)
+            res = self.client.post(img_url, {'image': img_file}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((self.recipe.image_width, self.recipe.image_height), (40, 30))
+        self.assertEqual(self.recipe.image_format, 'JPEG')
+        self.assertTrue(self.recipe.image_color.startswith('#'))
+        self.assertTrue(self.recipe.image_placeholder)
+        self.assertIsNotNone(self.recipe.image_phash)
+        self.assertEqual(res.data['image_placeholder'], self.recipe.image_placeholder)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['image_width'], 40)
+        self.assertEqual(res.data[0]['image_color'], self.recipe.image_color)
+
     def test_upload_image_bad_request(self):
         """Test uploading invalid image."""
         img_url = get_img_upload_url(self.recipe.id)
         payload = {'image': 'not_an_image'}
         res = self.client.post(img_url, payload, format='multipart')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_undecodable(self):
+        """Test uploading an image that can't be decoded."""
+        with create_truncated_jpeg() as img_file:
+            res = self.client.post(
+                get_img_upload_url(self.recipe.id), {'image': img_file}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+
+class ImageRenditionTests(TestCase):
+    """Tests for serving resized recipe images."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as img_file:
+            Image.new('RGB', (400, 200)).save(img_file, format='JPEG')
+            img_file.seek(0)
+            self.client.post(get_img_upload_url(self.recipe.id), {'image': img_file})
+        self.recipe.refresh_from_db()
+
+        self.cache_root = tempfile.mkdtemp()
+        settings_override = override_settings(IMAGE_CACHE_ROOT=self.cache_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        self.recipe.image.delete()
+        shutil.rmtree(self.cache_root)
+
+    def test_resized_image(self):
+        url = get_rendition_url(self.recipe.id, 160)
+        res = self.client.get(url, HTTP_ACCEPT='image/webp')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('Accept', res['Vary'])
+        self.assertEqual(res['Cache-Control'], 'private, no-cache')
+        with Image.open(io.BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (160, 80)))
+
+        res = self.client.get(url, HTTP_ACCEPT='image/webp', HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_jpeg_fallback(self):
+        res = self.client.get(get_rendition_url(self.recipe.id, 320))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+
+    def test_width_not_allowed(self):
+        res = self.client.get(get_rendition_url(self.recipe.id, 333))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe(self):
+        other_user = get_user_model().objects.create_user(
+            email='user2@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(get_rendition_url(self.recipe.id, 160))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ExportTests(TestCase):
+    """Tests for the ZIP export of the recipes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user, title='With image')
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as img_file:
+            Image.new('RGB', (10, 10)).save(img_file, format='JPEG')
+            img_file.seek(0)
+            self.client.post(get_img_upload_url(self.recipe.id), {'image': img_file})
+        self.recipe.refresh_from_db()
+        self.no_image = create_recipe(user=self.user, title='No image')
+
+    def tearDown(self):
+        self.recipe.image.delete()
+
+    def test_export(self):
+        other_user = get_user_model().objects.create_user(
+            email='user2@example.com', password='Whatever!'
+        )
+        create_recipe(user=other_user)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertIsNone(archive.testzip())
+
+        image_entry = f'images/{self.recipe.id}.jpg'
+        self.assertEqual(archive.namelist(), ['manifest.json', image_entry])
+        self.assertEqual(archive.getinfo(image_entry).compress_type, zipfile.ZIP_STORED)
+        with self.recipe.image.open('rb') as f:
+            self.assertEqual(archive.read(image_entry), f.read())
+
+        manifest = {item['id']: item for item in json.loads(archive.read('manifest.json'))}
+        self.assertEqual(set(manifest), {self.recipe.id, self.no_image.id})
+        self.assertEqual(manifest[self.recipe.id]['image'], image_entry)
+        self.assertEqual(manifest[self.recipe.id]['tags'][0]['name'], 'Vegan')
+        self.assertEqual(manifest[self.recipe.id]['cost'], '3.49')
+        self.assertIsNone(manifest[self.no_image.id]['image'])
+
+
+class BatchImageUploadTests(TestCase):
+    """Tests for uploading images to many recipes at once."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+    def tearDown(self):
+        for recipe in Recipe.objects.all():
+            recipe.image.delete()
+
+    def get_image_file(self, size=(10, 10)):
+        img_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        Image.new('RGB', size).save(img_file, format='JPEG')
+        img_file.seek(0)
+        self.addCleanup(img_file.close)
+        return img_file
+
+    def test_upload_images(self):
+        other_user = get_user_model().objects.create_user(
+            email='user2@example.com', password='Whatever!'
+        )
+        other_recipe = create_recipe(user=other_user)
+        payload = {
+            str(self.recipes[0].id): self.get_image_file(size=(20, 10)),
+            str(self.recipes[1].id): self.get_image_file(size=(30, 10)),
+            str(self.recipes[2].id): tempfile.SpooledTemporaryFile(),  # not an image
+            str(other_recipe.id): self.get_image_file(),
+        }
+
+        with self.assertNumQueries(2):  # the ownership check + `bulk_update`
+            res = self.client.post(BATCH_UPLOAD_URL, payload, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = {item['id']: item for item in res.data}
+        self.assertEqual(results[self.recipes[0].id]['status'], 200)
+        self.assertEqual(results[self.recipes[0].id]['image_width'], 20)
+        self.assertEqual(results[self.recipes[2].id]['status'], 400)
+        self.assertEqual(results[other_recipe.id]['status'], 404)
+
+        for recipe, width in zip(self.recipes[:2], (20, 30)):
+            recipe.refresh_from_db()
+            self.assertTrue(os.path.exists(recipe.image.path))
+            self.assertEqual(recipe.image_width, width)
+        self.recipes[2].refresh_from_db()
+        self.assertFalse(self.recipes[2].image)
+        other_recipe.refresh_from_db()
+        self.assertFalse(other_recipe.image)
+
+    def test_upload_images_undecodable(self):
+        """Test an image that can't be decoded fails on its own."""
+        img_file = create_truncated_jpeg()
+        self.addCleanup(img_file.close)
+        payload = {
+            str(self.recipes[0].id): self.get_image_file(),
+            str(self.recipes[1].id): img_file,
+        }
+
+        res = self.client.post(BATCH_UPLOAD_URL, payload, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = {item['id']: item for item in res.data}
+        self.assertEqual(results[self.recipes[0].id]['status'], 200)
+        self.assertEqual(results[self.recipes[1].id]['status'], 400)
+        self.recipes[0].refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipes[0].image.path))
+        self.recipes[1].refresh_from_db()
+        self.assertFalse(self.recipes[1].image)
+
+    def test_upload_images_requires_files(self):
+        res = self.client.post(BATCH_UPLOAD_URL, {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NearDuplicateTests(TestCase):
+    """Tests for the near-duplicate image APIs."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(self.user)
+        base = 0xF0F0_F0F0_0F0F_0F0F
+        self.original = create_recipe(user=self.user, **hash_fields(base))
+        self.near = create_recipe(user=self.user, **hash_fields(base ^ 0b101))  # 2 bits
+        self.other = create_recipe(user=self.user, **hash_fields(~base & (2**64 - 1)))
+        create_recipe(user=self.user)  # no image => no hash
+
+        user2 = get_user_model().objects.create_user(
+            email='user2@example.com', password='Whatever!'
+        )
+        create_recipe(user=user2, **hash_fields(base))
+
+    def test_list_duplicates(self):
+        res = self.client.get(DUPLICATES_URL, {'distance': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, [{'recipes': [self.original.id, self.near.id], 'distance': 2}]
+        )
+
+    def test_list_duplicates_exact_only(self):
+        res = self.client.get(DUPLICATES_URL, {'distance': 0})
+
+        self.assertEqual(res.data, [])
+
+    def test_invalid_distance(self):
+        for distance in ('x', -1, 65):
+            res = self.client.get(DUPLICATES_URL, {'distance': distance})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar(self):
+        res = self.client.get(get_similar_url(self.original.id), {'distance': 5})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # Limited to the user's recipes.
+        self.assertEqual(res.data, [{'id': self.near.id, 'distance': 2}])
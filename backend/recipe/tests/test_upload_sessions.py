@@ -0,0 +1,273 @@
+"""
+Tests for the resumable (chunked) upload APIs.
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import UploadSession
+from core.tests.test_images import create_image_file
+from recipe import uploads
+from recipe.tests.test_recipe_api import create_recipe
+
+SESSIONS_URL = reverse('recipe:uploadsession-list')
+
+
+def get_session_url(session_id):
+    return reverse('recipe:uploadsession-detail', args=[session_id])
+
+
+def get_finalize_url(session_id):
+    return reverse('recipe:uploadsession-finalize', args=[session_id])
+
+
+class RangeHelperTests(SimpleTestCase):
+    """Test tracking the received byte ranges."""
+
+    def test_add_range(self):
+        ranges = uploads.add_range([], 10, 20)
+        ranges = uploads.add_range(ranges, 30, 40)
+        self.assertEqual(ranges, [[10, 20], [30, 40]])
+        self.assertEqual(uploads.get_offset(ranges), 0)
+
+        ranges = uploads.add_range(ranges, 0, 10)
+        self.assertEqual(ranges, [[0, 20], [30, 40]])
+        self.assertEqual(uploads.get_offset(ranges), 20)
+
+        # Overlapping (e.g. retried) chunks are fine.
+        ranges = uploads.add_range(ranges, 15, 35)
+        self.assertEqual(ranges, [[0, 40]])
+
+
+class UploadSessionTestsMixin:
+
+    def setUp(self):
+        self.upload_root = tempfile.mkdtemp()
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.upload_root, 'media'),
+            UPLOAD_SESSION_ROOT=os.path.join(self.upload_root, 'partial'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user1@example.com', password='Whatever!'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.content = create_image_file(size=(64, 48), img_format='PNG').read()
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_root)
+
+    def create_session(self, **params):
+        payload = {
+            'recipe': self.recipe.id, 'filename': 'photo.png', 'size': len(self.content)
+        }
+        payload.update(params)
+        return self.client.post(SESSIONS_URL, payload)
+
+    def expire(self, session_id):
+        UploadSession.objects.filter(pk=session_id).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+    def send_chunk(self, session_id, offset, data, client=None):
+        return (client or self.client).patch(
+            get_session_url(session_id), data,
+            content_type=uploads.CHUNK_CONTENT_TYPE, HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+
+class UploadSessionAPITests(UploadSessionTestsMixin, TestCase):
+    """Test the resumable upload protocol."""
+
+    def test_upload_in_chunks_and_finalize(self):
+        res = self.create_session()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        session_id = res.data['id']
+        self.assertEqual(res.data['offset'], 0)
+
+        # Out of order: the offset only moves once there's no gap anymore.
+        half = len(self.content) // 2
+        res = self.send_chunk(session_id, half, self.content[half:])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Upload-Offset'], '0')
+
+        res = self.client.get(get_session_url(session_id))
+        self.assertEqual(res.data['received'], [[half, len(self.content)]])
+
+        res = self.send_chunk(session_id, 0, self.content[:half])
+        self.assertEqual(res.data['offset'], len(self.content))
+
+        partial_path = UploadSession.objects.get(pk=session_id).partial_path
+        res = self.client.post(get_finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with self.recipe.image.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+        self.assertEqual((self.recipe.image_width, self.recipe.image_height), (64, 48))
+        # The partial file was moved in place & the session is gone.
+        self.assertFalse(os.path.exists(partial_path))
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_finalize_incomplete_upload(self):
+        session_id = self.create_session().data['id']
+        self.send_chunk(session_id, 0, self.content[:10])
+
+        res = self.client.post(get_finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 10)
+
+    def test_finalize_invalid_image(self):
+        session_id = self.create_session(size=4).data['id']
+        self.send_chunk(session_id, 0, b'nope')
+
+        res = self.client.post(get_finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_chunk_out_of_bounds(self):
+        session_id = self.create_session().data['id']
+
+        res = self.send_chunk(session_id, len(self.content) - 1, b'12')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_session_for_other_users_recipe(self):
+        other_user = get_user_model().objects.create_user(
+            email='user2@example.com', password='Whatever!'
+        )
+        other_recipe = create_recipe(user=other_user)
+
+        res = self.create_session(recipe=other_recipe.id)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_session_not_an_image_extension(self):
+        res = self.create_session(filename='evil.html')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('filename', res.data)
+
+    def test_finalize_stores_decoded_format_extension(self):
+        """The extension comes from the content (PNG), not from the file name."""
+        session_id = self.create_session(filename='photo.jpg').data['id']
+        self.send_chunk(session_id, 0, self.content)
+
+        res = self.client.post(get_finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+
+    @override_settings(UPLOAD_SESSION_MAX_SIZE=10)
+    def test_create_session_too_large(self):
+        res = self.create_session()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cancel_session(self):
+        session_id = self.create_session().data['id']
+        partial_path = UploadSession.objects.get(pk=session_id).partial_path
+
+        res = self.client.delete(get_session_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(partial_path))
+
+    def test_expired_session(self):
+        for url, send in [
+            ('chunk', lambda session_id: self.send_chunk(session_id, 0, self.content)),
+            ('finalize', lambda session_id: self.client.post(get_finalize_url(session_id))),
+        ]:
+            with self.subTest(url):
+                session_id = self.create_session().data['id']
+                partial_path = UploadSession.objects.get(pk=session_id).partial_path
+                self.expire(session_id)
+
+                res = send(session_id)
+
+                self.assertEqual(res.status_code, status.HTTP_410_GONE)
+                self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+                self.assertFalse(os.path.exists(partial_path))
+
+
+class ExpireUploadSessionsCommandTests(UploadSessionTestsMixin, TestCase):
+    """Test the `expire_upload_sessions` command."""
+
+    def test_expire_upload_sessions(self):
+        sessions = [self.create_session().data['id'] for _ in range(2)]
+        self.expire(sessions[0])
+        paths = [UploadSession.objects.get(pk=pk).partial_path for pk in sessions]
+        orphans = [
+            os.path.join(os.path.dirname(paths[0]), name)
+            for name in ['orphan.part', 'fresh.part']
+        ]
+        for path in orphans:
+            uploads.create_partial_file(path, 10)
+        os.utime(orphans[0], (0, 0))
+        os.utime(paths[1], (0, 0))  # old, but its session isn't
+        out = StringIO()
+
+        call_command('expire_upload_sessions', stdout=out)
+
+        self.assertIn('Deleted 1 expired upload sessions & 1 orphaned', out.getvalue())
+        self.assertEqual(
+            [str(pk) for pk in UploadSession.objects.values_list('pk', flat=True)],
+            [sessions[1]],
+        )
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(os.path.exists(paths[1]))
+        self.assertFalse(os.path.exists(orphans[0]))
+        self.assertTrue(os.path.exists(orphans[1]))
+
+
+# Relies on row locks; SQLite would just fail with "database table is locked".
+@skipUnlessDBFeature('has_select_for_update')
+class ParallelChunkTests(UploadSessionTestsMixin, TransactionTestCase):
+    """Test chunks of the same upload sent concurrently."""
+
+    def test_parallel_chunks(self):
+        session_id = self.create_session().data['id']
+        chunk_size = 64
+        offsets = range(0, len(self.content), chunk_size)
+
+        def send(offset):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            chunk = self.content[offset:offset + chunk_size]
+            return self.send_chunk(session_id, offset, chunk, client=client).status_code
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            codes = list(executor.map(send, reversed(offsets)))
+
+        self.assertEqual(set(codes), {status.HTTP_200_OK})
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertEqual(session.offset, len(self.content))
+        with open(session.partial_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
@@ -0,0 +1,107 @@
+"""
+Helpers for resumable, chunked & batch image uploads.
+
+Protocol:
+1. POST   /upload-sessions/                 {recipe, filename, size} => {id, offset}
+2. PATCH  /upload-sessions/{id}/            raw bytes + `Upload-Offset` header
+                                            (chunks may be sent in parallel)
+3. GET    /upload-sessions/{id}/            => current `offset` (to resume from)
+4. POST   /upload-sessions/{id}/finalize/   => attaches the file to `Recipe.image`
+
+Sessions expire `UPLOAD_SESSION_MAX_AGE` seconds after their creation (410 Gone);
+`manage.py expire_upload_sessions` deletes them & their partial files.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files import File
+
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+BLOCK_SIZE = 64 * 1024
+
+
+class PartialUploadFile(File):
+    """
+    An assembled upload, on local disk.
+
+    Exposing `temporary_file_path()` makes `FileSystemStorage` *move* the file
+    in place (like it does for `TemporaryUploadedFile`), instead of copying it
+    chunk by chunk.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def create_partial_file(path, size):
+    """Create the (sparse) file chunks are written into."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+
+
+def delete_session(session):
+    """Delete an upload session & its partial file."""
+    partial_path = session.partial_path
+    session.delete()
+    try:
+        os.remove(partial_path)
+    except FileNotFoundError:
+        pass
+
+
+def write_chunk(path, offset, stream, length):
+    """
+    Copy `length` bytes from `stream` into the file at `offset`.
+
+    `os.pwrite` doesn't use (nor move) a shared file position, so requests
+    writing different chunks of the same file in parallel can't interfere.
+    Returns the number of bytes actually written (the client may disconnect).
+    """
+    written = 0
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        while written < length:
+            data = stream.read(min(BLOCK_SIZE, length - written))
+            if not data:
+                break
+            os.pwrite(fd, data, offset + written)
+            written += len(data)
+        # Only acknowledge (=> record) data that made it to disk.
+        os.fdatasync(fd)
+    finally:
+        os.close(fd)
+    return written
+
+
+def add_range(ranges, start, end):
+    """Return the sorted, merged `[start, end)` ranges after adding a new one."""
+    merged = []
+    for range_start, range_end in sorted([*ranges, [start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def get_offset(ranges):
+    """Return how many bytes were received without a gap, from the start."""
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+@lru_cache(maxsize=None)
+def get_image_executor():
+    """
+    Thread pool processing the images of batch uploads.
+
+    It's shared by all requests (created lazily, i.e. after the server forked
+    its workers), so the number of images processed at once stays bounded.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_BATCH_WORKERS, thread_name_prefix='image-batch'
+    )
@@ -13,6 +13,7 @@ router = DefaultRouter()
 router.register('recipes', views.RecipeViewSet)
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
+router.register('upload-sessions', views.UploadSessionViewSet)
 
 app_name = 'recipe'
 urlpatterns = [
@@ -1,34 +1,78 @@
 """
 Views for the *recipe* APIs.
 """
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
 
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.fields import ImageField
 from rest_framework.response import Response
 
-from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core.hashindex import MultiIndexHash, hamming_distance, near_hash_q
+from core import renditions
+from core.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from core.images import IMAGE_ERRORS, METADATA_FIELDS, extract_image_metadata, get_extension
+from core.media import serve_file
+from core.optimize import schedule_optimization
+from core.models import Recipe, Tag, Ingredient, UploadSession
+from recipe import export, serializers, uploads
+
+# Max Hamming distance (out of 64 bits) accepted by the near-duplicate endpoints.
+MAX_DUPLICATE_DISTANCE = 10
+DEFAULT_DUPLICATE_DISTANCE = 4
+
+# Same error as for a file that isn't an image at all.
+INVALID_IMAGE_MESSAGE = ImageField.default_error_messages['invalid_image']
+
+
+def get_distance_param(request):
+    """Parse `?distance=k`; returns `None` if invalid."""
+    try:
+        distance = int(request.query_params.get('distance', DEFAULT_DUPLICATE_DISTANCE))
+    except ValueError:
+        return None
+    return distance if 0 <= distance <= MAX_DUPLICATE_DISTANCE else None
+
+
+def get_user_recipes(user, query_params):
+    """The user's recipes, ordered as asked for (shared with `recipe.async_views`)."""
+    queryset = Recipe.objects.filter(user=user)
+    # ?ordering=taken => gallery view: newest photos first (image_taken_at is indexed).
+    if query_params.get('ordering') == 'taken':
+        return queryset.order_by(F('image_taken_at').desc(nulls_last=True), '-id')
+    return queryset.order_by('-id')
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """View to manage *recipe* APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     # Filter the recipes based on who the user is:
     def get_queryset(self):
         """Retrieve recipes for the authenticated user."""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        return get_user_recipes(self.request.user, self.request.query_params)
+
+    def perform_content_negotiation(self, request, force=False):
+        # `image` & `export` answer with files, whatever renderers the `Accept` allows.
+        force = force or self.action in ('image', 'export')
+        return super().perform_content_negotiation(request, force=force)
 
     def get_serializer_class(self):
         """Return the appropriate serializer class for request."""
         if self.action == 'list':
             return serializers.RecipeSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'upload_images'):
             return serializers.RecipeImageSerializer
 
         return self.serializer_class
@@ -50,9 +94,176 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer.save()
+        # Extract the metadata once, here; serializers then never need to open the file.
+        try:
+            metadata = extract_image_metadata(serializer.validated_data['image'])
+        except IMAGE_ERRORS:  # passed `verify()`, but can't be decoded
+            return Response(
+                {'image': [INVALID_IMAGE_MESSAGE]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer.save(**metadata, image_bytes_saved=None)
+        schedule_optimization(recipe)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    # recipes/upload-images/ ; multipart: one image per recipe, the field name is its id.
+    @action(methods=['POST'], detail=False, url_path='upload-images')
+    def upload_images(self, request):
+        """Upload images to many recipes at once."""
+        if not request.FILES:
+            msg = 'Upload at least one image; use the recipe id as field name.'
+            return Response({'detail': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = {}
+        files = {}
+        for key, img_file in request.FILES.items():
+            if key.isdigit():
+                files[int(key)] = img_file
+            else:
+                results[key] = {'id': key, 'status': 400, 'errors': ['Invalid recipe id.']}
+
+        # Ownership of all of them, in a single query.
+        recipes = self.get_queryset().in_bulk(list(files))
+        for idx in files.keys() - recipes.keys():
+            results[idx] = {'id': idx, 'status': 404, 'errors': ['Recipe not found.']}
+
+        # Validate, extract the metadata & store the files concurrently (no DB access).
+        executor = uploads.get_image_executor()
+        futures = {
+            idx: executor.submit(self._process_image, recipe, files[idx])
+            for idx, recipe in recipes.items()
+        }
+        updated = []
+        for idx, future in futures.items():
+            metadata, errors = future.result()
+            if errors:
+                results[idx] = {'id': idx, 'status': 400, 'errors': errors}
+                continue
+            updated.append(recipes[idx])
+            serializer = self.get_serializer(recipes[idx])
+            results[idx] = {'id': idx, 'status': 200, **serializer.data}
+
+        if updated:
+            Recipe.objects.bulk_update(
+                updated, ['image', 'image_bytes_saved', *METADATA_FIELDS]
+            )
+            for recipe in updated:
+                schedule_optimization(recipe)
+
+        return Response(list(results.values()), status=status.HTTP_200_OK)
+
+    def _process_image(self, recipe, img_file):
+        """Validate & store `img_file` for `recipe`. Returns `(metadata, errors)`."""
+        serializer = self.get_serializer(recipe, data={'image': img_file})
+        if not serializer.is_valid():
+            return None, serializer.errors['image']
+
+        img_file = serializer.validated_data['image']
+        try:
+            metadata = extract_image_metadata(img_file)
+        except IMAGE_ERRORS:  # passed `verify()`, but can't be decoded
+            return None, [INVALID_IMAGE_MESSAGE]
+        # Assign without saving the model; `bulk_update` does that for all of them.
+        recipe.image.save(img_file.name, img_file, save=False)
+        recipe.image_bytes_saved = None
+        for attr, val in metadata.items():
+            setattr(recipe, attr, val)
+        return metadata, None
+
+    # recipes/{id}/image/?width=w ; the format is picked from the `Accept` header.
+    @action(methods=['GET'], detail=True)
+    def image(self, request, pk=None):
+        """Serve the recipe image resized to one of `IMAGE_RENDITION_WIDTHS`."""
+        recipe = self.get_object()
+        try:
+            width = int(request.query_params.get('width', ''))
+        except ValueError:
+            width = None
+        if width not in settings.IMAGE_RENDITION_WIDTHS:
+            msg = f'width must be one of {settings.IMAGE_RENDITION_WIDTHS}.'
+            return Response({'width': [msg]}, status=status.HTTP_400_BAD_REQUEST)
+        if not recipe.image:
+            raise Http404('The recipe has no image.')
+
+        fmt = renditions.negotiate_format(request.headers.get('Accept'))
+        try:
+            path = renditions.get_rendition(recipe.image.name, recipe.image.path, width, fmt)
+        except FileNotFoundError:
+            raise Http404('The image file does not exist.')
+
+        # Private (it's per user) & revalidated: the ETag changes with the source image.
+        response = serve_file(
+            request, path, cache_control='private, no-cache', content_type=fmt[0],
+            accel_path=self._get_accel_path(path),
+        )
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+    def _get_accel_path(self, path):
+        """Internal URL of a file under `MEDIA_ROOT` (for x-accel-redirect)."""
+        relative = os.path.relpath(path, settings.MEDIA_ROOT)
+        if relative.startswith('..'):
+            return None
+        return settings.MEDIA_ACCEL_REDIRECT_PREFIX + relative
+
+    # recipes/export/
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Download all the recipes of the user: a ZIP of their images + `manifest.json`."""
+        recipes = self.get_queryset()
+        context = self.get_serializer_context()
+
+        def serialize(recipe):
+            return serializers.RecipeDetailSerializer(recipe, context=context).data
+
+        response = StreamingHttpResponse(
+            export.generate_export(recipes, serialize), content_type='application/zip'
+        )
+        response['Content-Disposition'] = 'attachment; filename="recipes.zip"'
+        return response
+
+    # recipes/duplicates/?distance=k
+    @action(methods=['GET'], detail=False)
+    def duplicates(self, request):
+        """List the pairs of near-duplicate recipe images of the user."""
+        distance = get_distance_param(request)
+        if distance is None:
+            msg = f'distance must be an integer in [0, {MAX_DUPLICATE_DISTANCE}].'
+            return Response({'distance': [msg]}, status=status.HTTP_400_BAD_REQUEST)
+
+        hashes = self.get_queryset().filter(image_phash__isnull=False).values_list(
+            'id', 'image_phash'
+        )
+        # Candidate pairs share a (nearly) equal band => no pairwise scan.
+        index = MultiIndexHash(hashes)
+        pairs = sorted(index.pairs(distance), key=lambda pair: (pair[2], pair[0], pair[1]))
+        return Response([
+            {'recipes': [a, b], 'distance': d} for a, b, d in pairs
+        ])
+
+    # recipes/{id}/similar/?distance=k
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """List the recipes whose image is a near-duplicate of this recipe's image."""
+        recipe = self.get_object()
+        distance = get_distance_param(request)
+        if distance is None:
+            msg = f'distance must be an integer in [0, {MAX_DUPLICATE_DISTANCE}].'
+            return Response({'distance': [msg]}, status=status.HTTP_400_BAD_REQUEST)
+        if recipe.image_phash is None:
+            return Response([])
+
+        # Index lookups on the bands; only the candidates are compared.
+        candidates = self.get_queryset().filter(
+            near_hash_q(recipe.image_phash, distance)
+        ).exclude(id=recipe.id).values_list('id', 'image_phash')
+        matches = []
+        for idx, phash in candidates:
+            d = hamming_distance(recipe.image_phash, phash)
+            if d <= distance:
+                matches.append({'id': idx, 'distance': d})
+        matches.sort(key=lambda match: (match['distance'], match['id']))
+        return Response(matches)
+
 
 # N.B. make suer `GenericViewSet` comes aftre `**ModelMixin`.
 # `viewsets.GenericViewSet` class automatically maps HTTP methods
@@ -66,7 +277,8 @@ class TagViewSet(
     """Manage tags in the database."""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
-    authentication_classes = [TokenAuthentication]  # who is the user (authentication)
+    # who is the user (authentication)
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]  # is the user authorized?
 
     def get_queryset(self):
@@ -86,7 +298,7 @@ class IngredientViewSet(
     """Manage *ingredients* in the database."""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -94,6 +306,107 @@ class IngredientViewSet(
         return self.queryset.filter(user=self.request.user).order_by('-name')
 
 
+class UploadSessionViewSet(
+    mixins.CreateModelMixin,  # POST /api/upload-sessions/
+    mixins.RetrieveModelMixin,  # GET /api/upload-sessions/<id>/ => current offset
+    mixins.DestroyModelMixin,  # DELETE /api/upload-sessions/<id>/ => cancel
+    viewsets.GenericViewSet
+):
+    """Resumable, chunked upload of recipe images (see `recipe/uploads.py`)."""
+    serializer_class = serializers.UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        session = serializer.save(user=self.request.user)
+        uploads.create_partial_file(session.partial_path, session.size)
+
+    def perform_destroy(self, instance):
+        uploads.delete_session(instance)
+
+    def _reject_expired(self, session):
+        uploads.delete_session(session)
+        msg = 'The upload session expired.'
+        return Response({'detail': msg}, status=status.HTTP_410_GONE)
+
+    # PATCH /api/upload-sessions/<id>/ ; body: the chunk, header: `Upload-Offset`.
+    def partial_update(self, request, pk=None):
+        """Write a chunk of the upload."""
+        session = self.get_object()
+        if session.is_expired():
+            return self._reject_expired(session)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            msg = 'Upload-Offset & Content-Length headers are required.'
+            return Response({'detail': msg}, status=status.HTTP_400_BAD_REQUEST)
+        if offset < 0 or length < 0 or offset + length > session.size:
+            msg = f'The chunk must be within the upload size ({session.size} bytes).'
+            return Response({'detail': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Stream the body straight to disk; `request.data` would load it in memory.
+        written = uploads.write_chunk(session.partial_path, offset, request.stream, length)
+
+        # Other chunks may be recorded concurrently => lock the row.
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            if written:
+                session.received = uploads.add_range(
+                    session.received, offset, offset + written
+                )
+                session.offset = uploads.get_offset(session.received)
+                session.save(update_fields=['received', 'offset'])
+
+        serializer = self.get_serializer(session)
+        return Response(serializer.data, headers={'Upload-Offset': session.offset})
+
+    # upload-sessions/{id}/finalize/
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """Attach the fully uploaded image to the recipe."""
+        with transaction.atomic():
+            session = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            if session.is_expired():
+                return self._reject_expired(session)
+            if session.offset < session.size:
+                serializer = self.get_serializer(session)
+                return Response(serializer.data, status=status.HTTP_409_CONFLICT)
+
+            recipe = session.recipe
+            with open(session.partial_path, 'rb') as f:
+                try:
+                    metadata = extract_image_metadata(f)
+                except IMAGE_ERRORS:  # Not a (valid) image
+                    metadata = None
+                extension = metadata and get_extension(metadata['image_format'])
+                if not extension:
+                    uploads.delete_session(session)
+                    msg = 'Upload a valid image.'
+                    return Response({'image': [msg]}, status=status.HTTP_400_BAD_REQUEST)
+                # The extension of what was decoded, not of the client's file name:
+                # the media files are served with the type it implies.
+                filename = os.path.splitext(session.filename)[0] + extension
+                # Moved in place; never read into memory.
+                recipe.image.save(filename, uploads.PartialUploadFile(f), save=False)
+
+            for attr, val in metadata.items():
+                setattr(recipe, attr, val)
+            recipe.image_bytes_saved = None
+            recipe.save()
+            session.delete()
+            schedule_optimization(recipe)
+
+        serializer = serializers.RecipeImageSerializer(
+            recipe, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 """
 authentication_classes = [TokenAuthentication]
 
@@ -3,9 +3,12 @@ Serializers for the User API View.
 """
 
 from django.contrib.auth import get_user_model, authenticate
+from django.core import signing
 
 from rest_framework import serializers
 
+from core import tokens
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object."""
@@ -27,15 +30,21 @@ class UserSerializer(serializers.ModelSerializer):
         # If user didn't update the password, `validated_data` has no such key.
         # In this case, we return None (i.e., nothing further to handle in that regard.)
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only what was sent: the other fields of `instance` may be stale (e.g. a
+        # user cached by `CachedTokenAuthentication`) & mustn't be written back.
+        update_fields = list(validated_data)
 
         if password:
             # We ALWAYS keep the hash of passowrds only.
             # That's why we, above, popped the `password` from `validated_data`.
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+            update_fields.append('password')
 
-        return user
+        if update_fields:
+            instance.save(update_fields=update_fields)
+        return instance
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -60,3 +69,23 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for refreshing the signed tokens."""
+    refresh = serializers.CharField(trim_whitespace=False)
+    error_msg = 'Invalid or expired token.'
+
+    def validate(self, attrs):
+        try:
+            claims = tokens.verify_token(attrs['refresh'], tokens.REFRESH)
+        except signing.BadSignature:
+            raise serializers.ValidationError(self.error_msg, code='authorization')
+
+        # Unlike access tokens, refreshing checks the user is (still) active.
+        user = get_user_model().objects.filter(pk=claims['uid'], is_active=True).first()
+        if not user:
+            raise serializers.ValidationError(self.error_msg, code='authorization')
+
+        attrs.update(claims=claims, user=user)
+        return attrs
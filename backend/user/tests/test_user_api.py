@@ -8,12 +8,15 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import tokens
+
 
 # `user:create` should match the info in `user/urls.py`:
 # app_name = user;
 # `name` passed to `path` is `create`
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
+TOKEN_REFRESH_URL = reverse('user:token-refresh')
 PROFILE_URL = reverse('user:me')
 
 
@@ -87,6 +90,56 @@ class PublicUserAPITests(TestCase):
         # Make sure the request is success & `token` is returned.
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('token', res.data)
+        self.assertIn('access', res.data)
+        self.assertIn('refresh', res.data)
+
+    def test_refresh_token(self):
+        """Test a refresh token is exchanged (once) for new signed tokens."""
+        user_info = self._get_payload()
+        create_user(**user_info)
+        res = self.client.post(TOKEN_URL, {
+            'email': user_info['email'], 'password': user_info['password']
+        })
+        refresh = res.data['refresh']
+
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], refresh)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        self.assertEqual(self.client.get(PROFILE_URL).status_code, status.HTTP_200_OK)
+
+        # Single use.
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_token_single_use_across_processes(self):
+        """The refresh token is claimed in the DB, not only in memory."""
+        user_info = self._get_payload()
+        create_user(**user_info)
+        res = self.client.post(TOKEN_URL, {
+            'email': user_info['email'], 'password': user_info['password']
+        })
+        refresh = res.data['refresh']
+        self.client.post(TOKEN_REFRESH_URL, {'refresh': refresh})
+        # Another server process, whose revocations weren't reloaded yet.
+        tokens.revocations.load([])
+
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_token_inactive_user(self):
+        user_info = self._get_payload()
+        user = create_user(**user_info)
+        res = self.client.post(TOKEN_URL, {
+            'email': user_info['email'], 'password': user_info['password']
+        })
+        get_user_model().objects.filter(pk=user.pk).update(is_active=False)
+
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': res.data['refresh']})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_create_token_bad_credentials_fail(self):
         """Test invalid credentials fail."""
@@ -1,14 +1,21 @@
 """
 User API Views.
 """
+from django.contrib.auth import get_user_model
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, serializers
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import tokens
+from core.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+
 from user.serializers import (
     UserSerializer,  # our custom defined serializer
     AuthTokenSerializer,
+    RefreshTokenSerializer,
 )
 
 
@@ -24,13 +31,43 @@ class CreateTokenView(ObtainAuthToken):
     # visiting /api/user/token/ in the browser we get => 'Method "GET" not allowed.'
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        # `token`: DB token ("Token <key>"); `access` & `refresh`: signed tokens
+        # ("Bearer <access>"), for clients that want to skip the DB lookups.
+        return Response({'token': token.key, **tokens.issue_token_pair(user)})
+
+
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new pair of signed tokens."""
+    serializer_class = RefreshTokenSerializer
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Single use: a stolen refresh token only works until its owner uses it.
+        # Claimed in the DB: other processes may not know it's revoked yet.
+        if not tokens.revoke_token(serializer.validated_data['claims'], tokens.REFRESH):
+            raise serializers.ValidationError(
+                serializer.error_msg, code='authorization'
+            )
+        return Response(tokens.issue_token_pair(serializer.validated_data['user']))
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user: /api/me/"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]  # authentication
+    # authentication
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]  # authorization
 
     def get_object(self):
         """Retrieve & return the authenticated user."""
-        return self.request.user
+        # Fresh from the DB: `request.user` may be built from a token's claims
+        # or be cached; saving it would write stale values (`is_staff`, ...) back.
+        return get_user_model().objects.get(pk=self.request.user.pk)
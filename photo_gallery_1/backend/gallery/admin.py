@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from gallery.models import Photo, SpriteSheet
+
+
+@admin.register(Photo)
+class PhotoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'title', 'image', 'updated_at']
+
+
+@admin.register(SpriteSheet)
+class SpriteSheetAdmin(admin.ModelAdmin):
+    list_display = ['page', 'signature', 'stale', 'updated_at']
+    readonly_fields = ['tiles']
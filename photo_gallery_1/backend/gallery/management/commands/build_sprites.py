@@ -0,0 +1,39 @@
+"""
+Django command to (re)build the sprite sheets of the gallery pages.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gallery import sprites
+from gallery.models import Photo, SpriteSheet
+
+
+class Command(BaseCommand):
+    help = 'Build the missing & outdated sprite sheets of the gallery pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild all sheets.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        page_size = settings.GALLERY_PAGE_SIZE
+        sheets = {sheet.page: sheet for sheet in SpriteSheet.objects.all()}
+        photos = Photo.objects.order_by('id').only('id', 'image', 'updated_at')
+
+        built = page = 0
+        for page, start in enumerate(range(0, photos.count(), page_size), start=1):
+            page_photos = list(photos[start:start + page_size])
+            sheet = sheets.get(page)
+            signature = sprites.get_signature(page_photos)
+            if options['force'] or not sheet or sheet.stale or sheet.signature != signature:
+                sprites.build_sheet(
+                    page, page_photos, signature, previous=sheet, reuse=not options['force']
+                )
+                built += 1
+
+        # Pages that don't exist anymore (photos were deleted).
+        for sheet in SpriteSheet.objects.filter(page__gt=page):
+            sheet.image.delete(save=False)
+            sheet.delete()
+
+        self.stdout.write(self.style.SUCCESS(f'Built {built} sprite sheets ({page} pages).'))
@@ -0,0 +1,54 @@
+"""
+Database models for the gallery.
+"""
+import os
+import uuid
+
+from django.db import models
+
+
+def get_path_for_photo(instance, filename):
+    """'photos/<uuid>.<ext>': unique names, so files never need to be overwritten."""
+    ext = os.path.splitext(filename)[1]
+    return os.path.join('photos', f'{uuid.uuid4()}{ext}')
+
+
+class Photo(models.Model):
+    title = models.CharField(max_length=100, blank=True)
+    image = models.ImageField(upload_to=get_path_for_photo)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the sprite sheet signatures: changing a photo invalidates its sheet.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Gallery order. New photos are appended: only the last page changes.
+        ordering = ['id']
+
+    def __str__(self):
+        return self.title or self.image.name
+
+
+class SpriteSheet(models.Model):
+    """
+    The thumbnails of one gallery page, composed into a single image.
+
+    `tiles` maps the photos to their position in the sheet:
+    `[{"id": <photo id>, "version": <photo updated_at>, "x": .., "y": ..}, ...]`.
+    """
+    page = models.PositiveIntegerField(unique=True)
+    image = models.ImageField(upload_to='sprites/')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    tile_size = models.PositiveSmallIntegerField()
+    tiles = models.JSONField(default=list)
+    # Hash of the page's photo ids & versions, when the sheet was built.
+    signature = models.CharField(max_length=40)
+    # Set when a photo of the page changed; the sheet is rebuilt on next use.
+    stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['page']
+
+    def __str__(self):
+        return f'Sprite sheet, page {self.page}'
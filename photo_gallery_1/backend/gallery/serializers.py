@@ -0,0 +1,30 @@
+"""
+Serializers for the gallery APIs.
+"""
+from rest_framework import serializers
+
+from gallery.models import Photo, SpriteSheet
+
+
+class PhotoSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Photo
+        fields = ['id', 'title', 'image', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+
+class SpriteSheetSerializer(serializers.ModelSerializer):
+    """A gallery page: the sheet image & where each photo's thumbnail is in it."""
+    photos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SpriteSheet
+        fields = ['page', 'image', 'width', 'height', 'tile_size', 'photos']
+
+    def get_photos(self, sheet):
+        positions = {tile['id']: (tile['x'], tile['y']) for tile in sheet.tiles}
+        photos = PhotoSerializer(self.context['photos'], many=True, context=self.context).data
+        for photo in photos:
+            photo['x'], photo['y'] = positions[photo['id']]
+        return photos
@@ -0,0 +1,26 @@
+"""
+Keep the sprite sheets in sync with the photos (see `gallery.sprites`).
+
+Only flags the affected sheets as stale; they're rebuilt on their next request
+(or by `manage.py build_sprites`), not while saving the photo.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from gallery import sprites
+from gallery.models import Photo
+
+
+@receiver(post_save, sender=Photo)
+def photo_saved(sender, instance, **kwargs):
+    # New photos get the highest id: only their own (the last) page changes.
+    page = sprites.get_page_number(instance.id)
+    transaction.on_commit(lambda: sprites.mark_stale(page, page))
+
+
+@receiver(post_delete, sender=Photo)
+def photo_deleted(sender, instance, **kwargs):
+    # The following photos all move up by one: their pages change as well.
+    page = sprites.get_page_number(instance.id)
+    transaction.on_commit(lambda: sprites.mark_stale(page))
@@ -0,0 +1,118 @@
+"""
+Sprite sheets: the thumbnails of a whole gallery page in a single image.
+
+A page of N photos then costs the client one image request instead of N; the
+tiles are positioned with the coordinates of `SpriteSheet.tiles` (CSS
+`background-position`, or `drawImage` on a canvas).
+
+Sheets are rebuilt incrementally: a sheet whose signature (photo ids &
+versions) doesn't match its page anymore is rebuilt, reusing the tiles of the
+photos that didn't change (cropped from the old sheet, without decoding the
+originals again).
+"""
+import hashlib
+import io
+import math
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from gallery.models import Photo, SpriteSheet
+
+BACKGROUND = (238, 238, 238)
+
+
+def get_page_number(photo_id):
+    """Return the (1-based) gallery page showing the photo `photo_id`."""
+    rank = Photo.objects.filter(id__lt=photo_id).count()
+    return rank // settings.GALLERY_PAGE_SIZE + 1
+
+
+def get_signature(photos):
+    data = '\n'.join(f'{photo.id}:{photo.updated_at.isoformat()}' for photo in photos)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def get_sheet(page, photos):
+    """Return the up-to-date sprite sheet of `page`, (re)building it if needed."""
+    signature = get_signature(photos)
+    sheet = SpriteSheet.objects.filter(page=page).first()
+    if sheet and sheet.signature == signature and not sheet.stale:
+        return sheet
+    return build_sheet(page, photos, signature, previous=sheet)
+
+
+def make_tile(photo, size):
+    """Square, centre-cropped thumbnail of a photo (a blank tile if it can't be read)."""
+    try:
+        with photo.image.open('rb') as f, Image.open(f) as img:
+            # JPEG: let the decoder downscale; much cheaper than a full decode.
+            img.draft('RGB', (size, size))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            return ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+    except (OSError, ValueError):
+        return Image.new('RGB', (size, size), BACKGROUND)
+
+
+def build_sheet(page, photos, signature=None, previous=None, reuse=True):
+    """
+    Compose the sprite sheet of `page` (its `photos`, in gallery order).
+
+    `previous` is the current sheet of the page, if any: it's replaced & its
+    tiles are reused (unless `reuse` is false).
+    """
+    signature = signature or get_signature(photos)
+    size = settings.GALLERY_TILE_SIZE
+    columns = settings.GALLERY_SHEET_COLUMNS
+
+    # Tiles of unchanged photos are cropped from the previous sheet.
+    old_tiles, old_image = {}, None
+    if reuse and previous and previous.tile_size == size:
+        old_tiles = {(tile['id'], tile['version']): tile for tile in previous.tiles}
+        try:
+            with previous.image.open('rb') as f:
+                old_image = Image.open(io.BytesIO(f.read()))
+                old_image.load()
+        except (OSError, ValueError):
+            old_tiles = {}
+
+    width = min(len(photos), columns) * size or size
+    height = math.ceil(len(photos) / columns) * size or size
+    sheet_image = Image.new('RGB', (width, height), BACKGROUND)
+    tiles = []
+    for i, photo in enumerate(photos):
+        x, y = (i % columns) * size, (i // columns) * size
+        version = photo.updated_at.isoformat()
+        old = old_tiles.get((photo.id, version))
+        if old:
+            tile = old_image.crop((old['x'], old['y'], old['x'] + size, old['y'] + size))
+        else:
+            tile = make_tile(photo, size)
+        sheet_image.paste(tile, (x, y))
+        tiles.append({'id': photo.id, 'version': version, 'x': x, 'y': y})
+
+    output = io.BytesIO()
+    sheet_image.save(output, format='JPEG', quality=settings.GALLERY_SHEET_QUALITY,
+                     optimize=True, progressive=True)
+    # Named after the content: the sheet URLs can be cached forever by clients.
+    name = default_storage.save(
+        f'sprites/page-{page}-{signature[:16]}.jpg', ContentFile(output.getvalue())
+    )
+
+    sheet, _ = SpriteSheet.objects.update_or_create(page=page, defaults={
+        'image': name, 'width': width, 'height': height, 'tile_size': size,
+        'tiles': tiles, 'signature': signature, 'stale': False,
+    })
+    if previous and previous.image and previous.image.name != name:
+        previous.image.delete(save=False)
+    return sheet
+
+
+def mark_stale(first_page, last_page=None):
+    """Flag the sheets of pages `first_page` to `last_page` (or the last one) as stale."""
+    sheets = SpriteSheet.objects.filter(page__gte=first_page)
+    if last_page is not None:
+        sheets = sheets.filter(page__lte=last_page)
+    return sheets.update(stale=True)
@@ -0,0 +1,115 @@
+"""
+Tests for the gallery APIs & sprite sheets.
+"""
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from gallery import sprites
+from gallery.models import Photo, SpriteSheet
+
+GALLERY_URL = reverse('gallery:gallery')
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def create_photo(color=(255, 0, 0), title='Photo'):
+    img_file = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(img_file, format='JPEG')
+    photo = Photo(title=title)
+    photo.image.save('photo.jpg', ContentFile(img_file.getvalue()), save=False)
+    photo.save()
+    return photo
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, GALLERY_PAGE_SIZE=4, GALLERY_TILE_SIZE=16, GALLERY_SHEET_COLUMNS=2
+)
+class GalleryAPITests(TestCase):
+    """Test the paginated gallery backed by sprite sheets."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.photos = [create_photo(title=f'Photo {i}') for i in range(6)]
+
+    def get_page(self, page):
+        return self.client.get(GALLERY_URL, {'page': page})
+
+    def test_gallery_page(self):
+        res = self.get_page(1)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 6)
+        sheet = res.data['results']
+        self.assertEqual((sheet['width'], sheet['height']), (32, 32))
+        self.assertEqual([photo['id'] for photo in sheet['photos']],
+                         [photo.id for photo in self.photos[:4]])
+        self.assertEqual((sheet['photos'][3]['x'], sheet['photos'][3]['y']), (16, 16))
+
+        with SpriteSheet.objects.get(page=1).image.open('rb') as f:
+            with Image.open(f) as img:
+                self.assertEqual(img.size, (32, 32))
+                r, g, b = img.getpixel((24, 24))
+                self.assertGreater(r, 200)
+
+    def test_sheet_is_reused(self):
+        self.get_page(1)
+        sheet = SpriteSheet.objects.get(page=1)
+
+        self.get_page(1)
+
+        self.assertEqual(SpriteSheet.objects.get(page=1).image.name, sheet.image.name)
+
+    def test_changed_photo_rebuilds_only_its_tile(self):
+        self.get_page(1)
+        self.get_page(2)
+
+        photo = self.photos[1]
+        img_file = io.BytesIO()
+        Image.new('RGB', (64, 48), (0, 0, 255)).save(img_file, format='JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.image.save('blue.jpg', ContentFile(img_file.getvalue()))
+        self.assertTrue(SpriteSheet.objects.get(page=1).stale)
+        self.assertFalse(SpriteSheet.objects.get(page=2).stale)
+
+        with mock.patch('gallery.sprites.make_tile', wraps=sprites.make_tile) as make_tile:
+            self.get_page(1)
+
+        # The other tiles were cropped from the previous sheet.
+        self.assertEqual([call.args[0].id for call in make_tile.call_args_list], [photo.id])
+        with SpriteSheet.objects.get(page=1).image.open('rb') as f:
+            with Image.open(f) as img:
+                r, g, b = img.getpixel((24, 8))
+                self.assertGreater(b, 200)
+
+    def test_delete_marks_following_pages_stale(self):
+        self.get_page(1)
+        self.get_page(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photos[0].delete()
+
+        self.assertTrue(SpriteSheet.objects.get(page=1).stale)
+        self.assertTrue(SpriteSheet.objects.get(page=2).stale)
+
+    def test_build_sprites_command(self):
+        out = StringIO()
+        call_command('build_sprites', stdout=out)
+
+        self.assertEqual(SpriteSheet.objects.count(), 2)
+        self.assertIn('Built 2 sprite sheets (2 pages)', out.getvalue())
@@ -0,0 +1,11 @@
+"""
+URL mappings for the gallery app.
+"""
+from django.urls import path
+
+from gallery import views
+
+app_name = 'gallery'
+urlpatterns = [
+    path('', views.GalleryView.as_view(), name='gallery'),
+]
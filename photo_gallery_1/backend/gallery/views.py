@@ -0,0 +1,39 @@
+"""
+Views for the gallery APIs.
+"""
+from django.conf import settings
+
+from rest_framework import generics
+from rest_framework.pagination import PageNumberPagination
+
+from gallery import sprites
+from gallery.models import Photo
+from gallery.serializers import SpriteSheetSerializer
+
+
+class GalleryPagination(PageNumberPagination):
+
+    def get_page_size(self, request):
+        # One page == one sprite sheet: the page size is fixed.
+        return settings.GALLERY_PAGE_SIZE
+
+
+class GalleryView(generics.GenericAPIView):
+    """
+    GET /api/gallery/?page=n
+
+    A page of photos, along with the sprite sheet of their thumbnails.
+    """
+    queryset = Photo.objects.order_by('id')
+    pagination_class = GalleryPagination
+    serializer_class = SpriteSheetSerializer
+
+    def get(self, request):
+        photos = self.paginate_queryset(self.get_queryset())
+        if not photos:  # empty gallery
+            return self.get_paginated_response(None)
+        sheet = sprites.get_sheet(self.paginator.page.number, photos)
+        serializer = self.get_serializer(sheet, context={
+            **self.get_serializer_context(), 'photos': photos
+        })
+        return self.get_paginated_response(serializer.data)
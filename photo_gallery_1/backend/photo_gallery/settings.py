@@ -38,6 +38,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
+    'gallery',
 ]
 
 MIDDLEWARE = [
@@ -127,6 +129,16 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Gallery: every page of photos comes with a sprite sheet of their thumbnails
+# (see `gallery.sprites`); a page is 1 image request instead of GALLERY_PAGE_SIZE.
+GALLERY_PAGE_SIZE = 100
+GALLERY_TILE_SIZE = 128  # px (square tiles)
+GALLERY_SHEET_COLUMNS = 10
+GALLERY_SHEET_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 